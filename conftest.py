@@ -0,0 +1,76 @@
+import itertools
+import numpy as np
+import pytest
+
+
+def gen_random_tasks_results(rng, task_cnt, max_result_cnt=4, max_cost=20):
+    """
+    隨機的 micro_optimization 結果，只有 mckp 用到的 cost 跟 expected_revenue 。
+    """
+    tasks_results = list()
+    for _ in range(task_cnt):
+        results = list()
+        for _ in range(int(rng.integers(0, max_result_cnt + 1))):
+            results.append({
+                'level_comb': None,
+                'cost': int(rng.integers(1, max_cost + 1)),
+                'expected_revenue': float(rng.random() * 10)
+            })
+        tasks_results.append(results)
+    return tasks_results
+
+def gen_random_tasks(rng, task_cnt):
+    """
+    隨機的 task 跟回答，格式同 Exp-Data/task.json 跟 Exp-Data/answers.json 。
+    """
+    tasks = list()
+    tasks_answer_dict = dict()
+    for task_index in range(task_cnt):
+        task_id = "t%d" % task_index
+        answers = {
+            "level1": [{"option": bool(rng.random() < 0.7)} for _ in range(int(rng.integers(3, 12)))],
+            "level2": [{"option": bool(rng.random() < 0.85)} for _ in range(int(rng.integers(2, 8)))]
+        }
+        tasks.append({
+            "id": task_id,
+            "revenue": int(rng.integers(1, 20)),
+            "pre-answer": {"confidence": float(rng.random())},
+            "answers": answers
+        })
+        tasks_answer_dict[task_id] = answers
+    return tasks, tasks_answer_dict
+
+def brute_force_mckp(tasks_results, budget):
+    """
+    列舉每個 task 所有的選擇，回傳預算內最大的 expected_revenue 總和。
+    """
+    best_expected_revenue = 0.0
+    for chosen_results in itertools.product(*[[None] + results for results in tasks_results]):
+        chosen_results = [result for result in chosen_results if result is not None]
+        if sum([result['cost'] for result in chosen_results]) <= budget:
+            best_expected_revenue = max(best_expected_revenue, \
+                                        sum([result['expected_revenue'] for result in chosen_results]))
+    return best_expected_revenue
+
+def get_chosen_cost(chosen_results):
+    return sum([result['cost'] for result in chosen_results if result is not None])
+
+def get_chosen_expected_revenue(chosen_results):
+    return sum([result['expected_revenue'] for result in chosen_results if result is not None])
+
+@pytest.fixture
+def levels_dict():
+    return {"level1": {"quality": 0.7, "cost": 2}, "level2": {"quality": 0.9, "cost": 6}}
+
+@pytest.fixture
+def small_instances():
+    """
+    小到可以暴力解的 (tasks_results, budget, 最佳解) 。
+    """
+    rng = np.random.default_rng(0)
+    instances = list()
+    for _ in range(30):
+        tasks_results = gen_random_tasks_results(rng, int(rng.integers(1, 7)))
+        budget = int(rng.integers(0, 60))
+        instances.append((tasks_results, budget, brute_force_mckp(tasks_results, budget)))
+    return instances
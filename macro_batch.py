@@ -0,0 +1,245 @@
+import sys
+import json
+import time
+import numpy as np
+
+from pprint import pprint
+from micro_optimization import THRESHOLD, level_comb_from_names, level_comb_cost, \
+    gen_max_reachable_confidences, gen_drop_reason, get_answer_cnts, gen_difficulties, gen_true_confs, micro_optimization_batch, \
+    batch_to_tasks_results, prune_results
+from micro_mckp import get_cost_unit, mckp_curve, mckp_curve_results
+from micro_lp import mckp_heap, mckp_lp
+from micro_bnb import mckp_bnb
+from task_table import gen_task_table
+from macro_engine import SIMULATE_CNT, MAX_ROUND, keepup_policy, gte_threshold_policy, gen_macro_result, \
+    add_macro_result, average_macro_result
+from threshold_table import use_threshold_table
+
+
+def select_mckp(tasks_results, budget, levels_dict):
+    """
+    跟 micro_mckp 預設的 'dense' 一樣用 mckp_dp 選出最佳的組合。
+    """
+    return mckp_curve_results(mckp_curve(tasks_results, budget, get_cost_unit(levels_dict)), budget)
+
+def select_lp(tasks_results, budget, levels_dict):
+    """
+    跟 micro_lp 一樣用 mckp_lp 選組合。
+    """
+    return mckp_lp(tasks_results, budget)[0]
+
+def select_bnb(tasks_results, budget, levels_dict):
+    """
+    跟 micro_bnb 一樣用 mckp_bnb 選組合。
+    """
+    return mckp_bnb(tasks_results, budget)[0]
+
+def select_heap(tasks_results, budget, levels_dict):
+    """
+    用 mckp_heap 依照每單位 cost 增加的 expected_revenue 選組合。
+    """
+    return mckp_heap(tasks_results, budget)
+
+BATCH_SELECTIONS = {
+    'mckp': select_mckp,
+    'lp': select_lp,
+    'bnb': select_bnb,
+    'heap': select_heap
+}
+
+def macro_simulate_batch(selection, policy, task_table, levels_dict, answer_cnts, answer_true_cnts, \
+                         max_assign_cnt, budget, simulate_cnt, max_round=MAX_ROUND, rng=None, \
+                         prune='pareto', method=None, reuse_results=False):
+    """
+    把 simulate_cnt 次模擬當成陣列的第一維，一起做 macro_simulate 的每個回合：
+    confidence 、 is_active 都是 (模擬次數, task 數) 的陣列，抽 difficulty 、 micro_optimization_batch 、
+    抽 worker 回答 (gen_true_confs) 跟 policy 的 continues 都是所有模擬一起做一次，
+    只有從 micro_optimization 的結果選組合 (selection) 是每次模擬各做一次。
+    reuse_results 是 True 時跟 gen_tasks_results 的 cache 一樣， confidence 沒有變的 task 沿用上次的 difficulty 跟結果
+    (整次模擬的 prune 都一樣，所以存的是刪減後的結果)。
+
+    Args:
+        selection (function): BATCH_SELECTIONS 裡的函式 (tasks_results, budget, levels_dict) ，
+            回傳每個 task 選到的 micro_optimization 結果
+        policy (dict): keepup_policy 或 gte_threshold_policy 的結果
+        task_table (dict): gen_task_table 的結果
+        levels_dict (dict): worker 的等級，以及 quality ，可以參考 Exp-Data/levels.json
+        answer_cnts (numpy.ndarray): get_answer_cnts 算出來每個 task 每個等級的回答數
+        answer_true_cnts (numpy.ndarray): 每個 task 每個等級回答 true 的數量
+        max_assign_cnt (int): 最多能指派多少 worker
+        budget (int): 預算
+        simulate_cnt (int): 模擬次數
+        max_round (int): 回合數
+        rng (numpy.random.Generator): 亂數產生器，沒有給的話用 np.random 的全域狀態
+        prune (str): 傳給 prune_results ，預設只留下 Pareto frontier 上的 worker 組合
+        method (str): 傳給 micro_optimization_batch ，沒有給的話使用 MICRO_METHOD
+        reuse_results (bool): 同 run_macros ，預設每回合每個 task 都重新抽 difficulty
+
+    Return:
+        list: 每次模擬的 total_rev, total_correct, remaining_budget 以及每個回合的 rounds
+    """
+    task_cnt = len(task_table['ids'])
+    revenues = task_table['revenues']
+    level_max_assign_cnts = task_table['level_max_assign_cnts']
+    level_cnt = level_max_assign_cnts.shape[1]
+
+    pre_confidences = np.tile(task_table['pre_confidences'], (simulate_cnt, 1))
+    is_active = np.tile(task_table['is_active'], (simulate_cnt, 1))
+    remaining_budgets = np.full(simulate_cnt, budget, dtype=np.int64)
+    tasks_results = [[None] * task_cnt for _ in range(simulate_cnt)]
+    result_confidences = np.full((simulate_cnt, task_cnt), np.nan)
+    simulate_results = [gen_macro_result(max_round) for _ in range(simulate_cnt)]
+
+    for round_num in range(max_round):
+        is_round = is_active.copy()
+        assign_combs = np.zeros((simulate_cnt, task_cnt, level_cnt), dtype=np.int64)
+        spent_budgets = np.zeros(simulate_cnt, dtype=np.int64)
+        cache_hit_cnts = np.zeros(simulate_cnt, dtype=np.int64)
+        cache_miss_cnts = np.zeros(simulate_cnt, dtype=np.int64)
+        dropped_cnts = np.zeros(simulate_cnt, dtype=np.int64)
+        if round_num == 0 and policy['uniform_level_names'] is not None:
+            level_comb = level_comb_from_names(policy['uniform_level_names'], levels_dict)
+            round_budgets = level_comb_cost(level_comb, levels_dict) * is_round.sum(axis=1)
+            assign_combs[is_round] = level_comb
+            spent_budgets = round_budgets
+        else:
+            round_budgets = (remaining_budgets / (max_round - round_num)).astype(np.int64)
+
+            max_reachable_confidences = gen_max_reachable_confidences(pre_confidences.ravel(), \
+                np.tile(level_max_assign_cnts, (simulate_cnt, 1)), levels_dict, max_assign_cnt)
+            max_reachable_confidences = max_reachable_confidences.reshape(simulate_cnt, task_cnt)
+            is_reachable = max_reachable_confidences >= THRESHOLD - 1e-9
+            is_dropped = is_round & ~is_reachable
+            dropped_cnts = is_dropped.sum(axis=1)
+            for simulate_index, task_index in np.argwhere(is_dropped).tolist():
+                simulate_results[simulate_index]['rounds'][round_num]['dropped_tasks'][task_table['ids'][task_index]] = \
+                    [gen_drop_reason(max_reachable_confidences[simulate_index, task_index])]
+            is_round &= is_reachable
+
+            is_dirty = is_round
+            if reuse_results:
+                is_dirty = is_round & (pre_confidences != result_confidences)
+                cache_miss_cnts = is_dirty.sum(axis=1)
+                cache_hit_cnts = is_round.sum(axis=1) - cache_miss_cnts
+            simulate_indexes, task_indexes = np.nonzero(is_dirty)
+            dirty_pre_confidences = pre_confidences[is_dirty]
+            batch = micro_optimization_batch(dirty_pre_confidences, revenues[task_indexes], \
+                                             gen_difficulties(dirty_pre_confidences, rng), levels_dict, \
+                                             max_assign_cnt, level_max_assign_cnts[task_indexes], method, rng=rng)
+            for simulate_index, task_index, results in zip(simulate_indexes.tolist(), task_indexes.tolist(), \
+                                                           batch_to_tasks_results(batch)):
+                tasks_results[simulate_index][task_index] = prune_results(results, prune)
+            result_confidences[is_dirty] = dirty_pre_confidences
+
+            for simulate_index in range(simulate_cnt):
+                round_task_indexes = np.flatnonzero(is_round[simulate_index]).tolist()
+                chosen_results = selection([tasks_results[simulate_index][task_index] \
+                                            for task_index in round_task_indexes], \
+                                           int(round_budgets[simulate_index]), levels_dict)
+                for task_index, result in zip(round_task_indexes, chosen_results):
+                    if result is None:
+                        continue
+                    assign_combs[simulate_index, task_index] = result['level_comb']
+                    spent_budgets[simulate_index] += result['cost']
+
+        is_assigned = is_round & (assign_combs.sum(axis=2) > 0)
+        _, assigned_task_indexes = np.nonzero(is_assigned)
+        new_confidences = pre_confidences.copy()
+        new_confidences[is_assigned] = gen_true_confs(pre_confidences[is_assigned], assign_combs[is_assigned], \
+                                                      answer_cnts[assigned_task_indexes], \
+                                                      answer_true_cnts[assigned_task_indexes], levels_dict, rng)
+        is_solved = is_assigned & (new_confidences >= THRESHOLD)
+        round_revs = (is_solved * revenues[np.newaxis, :]).sum(axis=1)
+        round_corrects = is_solved.sum(axis=1)
+
+        is_active = is_round & policy['continues'](new_confidences, pre_confidences)
+        pre_confidences = new_confidences
+        remaining_budgets = remaining_budgets - spent_budgets
+
+        for simulate_index, simulate_result in enumerate(simulate_results):
+            simulate_result['total_rev'] += round_revs[simulate_index].item()
+            simulate_result['total_correct'] += round_corrects[simulate_index].item()
+            round_result = simulate_result['rounds'][round_num]
+            round_result['round_rev'] += round_revs[simulate_index].item()
+            round_result['round_correct'] += round_corrects[simulate_index].item()
+            round_result['round_remaining'] += remaining_budgets[simulate_index].item()
+            round_result['round_dropped'] += dropped_cnts[simulate_index].item()
+            round_result['round_cache_hit'] += cache_hit_cnts[simulate_index].item()
+            round_result['round_cache_miss'] += cache_miss_cnts[simulate_index].item()
+
+    for simulate_index, simulate_result in enumerate(simulate_results):
+        simulate_result['remaining_budget'] = remaining_budgets[simulate_index].item()
+    return simulate_results
+
+def run_macro_batch(selection, policy, tasks, levels_dict, tasks_answer_dict, max_assign_cnt, budget, \
+                    simulate_cnt=SIMULATE_CNT, max_round=MAX_ROUND, seed=None, prune='pareto', method=None, \
+                    reuse_results=False):
+    """
+    用 macro_simulate_batch 在一個 process 裡一起跑 simulate_cnt 次模擬，回傳跟 run_macro 相同格式的平均結果。
+    回答只留下 get_answer_cnts 的數量。亂數來自 numpy.random.default_rng(seed) ，
+    同一個 seed 的結果相同，但跟 run_macro 用同一個 seed 的結果不同。
+
+    Args:
+        selection (str): BATCH_SELECTIONS 的名稱， 'mckp' 、 'lp' 、 'bnb' 或 'heap'
+        policy (dict): keepup_policy 或 gte_threshold_policy 的結果
+        tasks (list): 有 task 資訊的 dictonary ，可參考 Exp-Data/task.json.
+        levels_dict (dict): worker 的等級，以及 quality ，可以參考 Exp-Data/levels.json
+        tasks_answer_dict (dict): 在真正的 Crowdsourcing 中， level1 及 level2 worker 的回答，可參考 Exp-Data/answers.json
+        max_assign_cnt (int): 最多能指派多少 worker
+        budget (int): 預算
+        simulate_cnt (int): 模擬次數
+        max_round (int): 回合數
+        seed (int): 亂數的 seed ， None 代表每次都不一樣
+        prune (str): 傳給 prune_results
+        method (str): 傳給 micro_optimization_batch ，沒有給的話使用 MICRO_METHOD
+        reuse_results (bool): 同 run_macros
+
+    Return:
+        dict: 平均的 total_rev, total_correct, remaining_budget 、每個回合的 rounds ，以及 seed
+    """
+    if selection not in BATCH_SELECTIONS:
+        raise ValueError("unknown selection %s" % selection)
+
+    seed_sequence = np.random.SeedSequence(seed)
+    task_table = gen_task_table(tasks, levels_dict)
+    answer_cnts, answer_true_cnts = get_answer_cnts(task_table['ids'], levels_dict, tasks_answer_dict)
+    simulate_results = macro_simulate_batch(BATCH_SELECTIONS[selection], policy, task_table, levels_dict, \
+                                            answer_cnts, answer_true_cnts, max_assign_cnt, budget, simulate_cnt, \
+                                            max_round, np.random.default_rng(seed_sequence), prune, method, \
+                                            reuse_results)
+
+    macro_result = gen_macro_result(max_round)
+    for simulate_result in simulate_results:
+        add_macro_result(macro_result, simulate_result)
+    average_macro_result(macro_result, simulate_cnt)
+    macro_result['seed'] = seed_sequence.entropy
+    return macro_result
+
+if __name__ == "__main__":
+    task_file_path = sys.argv[1]
+    worker_file_path = sys.argv[2]
+    answer_file_path = sys.argv[3]
+    max_assign_cnt = int(sys.argv[4])
+    budget = int(sys.argv[5])
+
+    with open(task_file_path, "r") as myfile:
+        tasks = json.load(myfile)
+
+    with open(worker_file_path, "r") as myfile:
+        levels_dict = json.load(myfile)
+
+    with open(answer_file_path, "r") as myfile:
+        tasks_answer_dict = json.load(myfile)
+
+    method = None
+    if len(sys.argv) > 6:
+        method = use_threshold_table(sys.argv[6], levels_dict, max_assign_cnt)
+
+    macro_results = dict()
+    start_time = time.time()
+    for policy_name, policy in [('keepup', keepup_policy()), ('gte_threshold', gte_threshold_policy())]:
+        macro_results['mckp_' + policy_name] = run_macro_batch('mckp', policy, tasks, levels_dict, \
+                                                               tasks_answer_dict, max_assign_cnt, budget, \
+                                                               method=method)
+    print(time.time() - start_time)
+    pprint(macro_results)
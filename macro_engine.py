@@ -0,0 +1,381 @@
+import gc
+import sys
+import json
+import time
+import functools
+import numpy as np
+from multiprocessing import Pool
+
+from pprint import pprint
+from micro_optimization import THRESHOLD, level_comb_from_names, level_comb_cost, drop_hopeless_tasks, \
+    gen_micro_cache, copy_micro_cache, pop_micro_cache_cnts, gen_tasks_results
+from macro_uniform import macro_uniform
+from task_table import gen_task_table, copy_task_table, task_table_to_tasks, update_task_table
+from micro_greedy import micro_greedy
+from micro_cp import micro_cp
+from micro_mckp import micro_mckp
+from threshold_table import use_threshold_table
+
+
+SIMULATE_CNT = 10
+MAX_ROUND = 5
+CONF_THRESHOLD = 0.4
+# run_macros 沒有給 seed 時用的 seed ， None 代表每次都不一樣
+SEED = None
+ROUND_RESULT_KEYS = ["round_rev", "round_correct", "round_remaining", "round_dropped", "round_cache_hit", \
+                     "round_cache_miss"]
+
+# Pool 的 worker 用 init_macro_worker 記住的資料
+_WORKER_DATASET = dict()
+
+
+def keepup_continues(new_confidence, pre_confidence):
+    """
+    keep-up ：還沒到 THRESHOLD ，而且 confidence 沒有下降的 task 下一回合繼續做。
+    new_confidence 跟 pre_confidence 可以是 numpy.ndarray ，一次決定所有 task 。
+    """
+    return (new_confidence < THRESHOLD) & ((new_confidence - pre_confidence) >= 0)
+
+def gte_threshold_continues(new_confidence, pre_confidence, conf_threshold):
+    """
+    還沒到 THRESHOLD ，但 confidence 至少有 conf_threshold 的 task 下一回合繼續做。
+    new_confidence 跟 pre_confidence 可以是 numpy.ndarray ，一次決定所有 task 。
+    """
+    return (new_confidence < THRESHOLD) & (new_confidence >= conf_threshold)
+
+def keepup_policy(uniform_level_names=None):
+    """
+    keep-up 的 policy 。
+
+    Args:
+        uniform_level_names (list): 第一回合每個 task 都用這個 worker 組合 (等級名稱) ，像是 ["level2", "level2"] ，
+            None 代表第一回合也用 alg
+
+    Return:
+        dict: continues 是決定 task 下一回合要不要繼續做的函式 (new_confidence, pre_confidence) ，回傳 bool 陣列，
+            uniform_level_names 是第一回合的 worker 組合
+    """
+    return {
+        'continues': keepup_continues,
+        'uniform_level_names': uniform_level_names
+    }
+
+def gte_threshold_policy(conf_threshold=CONF_THRESHOLD, uniform_level_names=None):
+    """
+    confidence 至少有 conf_threshold 就繼續做的 policy 。
+
+    Args:
+        conf_threshold (float): 下一回合繼續做的 confidence 下限
+        uniform_level_names (list): 同 keepup_policy
+
+    Return:
+        dict: 同 keepup_policy
+    """
+    return {
+        'continues': functools.partial(gte_threshold_continues, conf_threshold=conf_threshold),
+        'uniform_level_names': uniform_level_names
+    }
+
+def gen_macro_result(max_round):
+    """
+    全部是 0 的 macro 結果，模擬的結果會加總到這裡。
+
+    Args:
+        max_round (int): 回合數
+
+    Return:
+        dict: 包含 total_rev, total_correct, remaining_budget 以及每個回合的 rounds ，
+            每個回合除了 ROUND_RESULT_KEYS 之外還有 dropped_tasks ，被去掉的 task id 對應到每次被去掉的 drop_reason
+    """
+    return {
+        "total_rev": float(),
+        "total_correct": float(),
+        "remaining_budget": float(),
+        "rounds": [dict([(key, float()) for key in ROUND_RESULT_KEYS] + [("dropped_tasks", dict())]) \
+                   for _ in range(max_round)]
+    }
+
+def add_macro_result(macro_result, simulate_result):
+    """
+    把一次模擬的結果加到 macro_result 。 dropped_tasks 的 drop_reason 接在同一個 task id 後面。
+    """
+    macro_result['total_rev'] += simulate_result['total_rev']
+    macro_result['total_correct'] += simulate_result['total_correct']
+    macro_result['remaining_budget'] += simulate_result['remaining_budget']
+    for round_result, simulate_round_result in zip(macro_result['rounds'], simulate_result['rounds']):
+        for key in ROUND_RESULT_KEYS:
+            round_result[key] += simulate_round_result[key]
+        for task_id, drop_reasons in simulate_round_result['dropped_tasks'].items():
+            round_result['dropped_tasks'].setdefault(task_id, list()).extend(drop_reasons)
+
+def average_macro_result(macro_result, simulate_cnt):
+    """
+    把加總的 macro_result 除以模擬次數。 dropped_tasks 不變，每個 task id 的 drop_reason 數量就是被去掉的次數。
+    """
+    macro_result['total_rev'] = macro_result['total_rev'] / simulate_cnt
+    macro_result['total_correct'] = macro_result['total_correct'] / simulate_cnt
+    macro_result['remaining_budget'] = macro_result['remaining_budget'] / simulate_cnt
+    for round_result in macro_result['rounds']:
+        for key in ROUND_RESULT_KEYS:
+            round_result[key] = round_result[key] / simulate_cnt
+    return macro_result
+
+def macro_simulate(alg, policy, task_table, levels_dict, tasks_answer_dict, max_assign_cnt, budget, \
+                   max_round=MAX_ROUND, cache=None, rng=None, method=None):
+    """
+    模擬一次多回合的指派：每回合把剩下的預算平均分給剩下的回合，用 alg 指派 worker ，
+    再用 policy 的 continues 決定哪些 task 下一回合繼續做。
+    用 alg 的回合先用 drop_hopeless_tasks 去掉到不了 THRESHOLD 的 task (會記錄 drop_reason) ，
+    被去掉的 task 之後的回合也不會再做，每回合去掉的數量記在 round_dropped ，
+    task id 跟 drop_reason 記在 dropped_tasks 。
+    模擬的狀態放在 copy_task_table 複製的表，回合之間只更新 is_active 。
+    alg 的介面還是 task 的 list ，所以每次模擬開始時用 task_table_to_tasks 產生一次所有的 task ，
+    每回合只挑出 is_active 的 task 給 alg ， alg 改的 confidence 會被 update_task_table 寫回表，兩邊保持一致。
+
+    Args:
+        alg (function): micro 演算法，像是 micro_mckp
+        policy (dict): keepup_policy 或 gte_threshold_policy 的結果
+        task_table (dict): gen_task_table 的結果，不會被改變
+        levels_dict (dict): worker 的等級，以及 quality ，可以參考 Exp-Data/levels.json
+        tasks_answer_dict (dict): 在真正的 Crowdsourcing 中， level1 及 level2 worker 的回答，可參考 Exp-Data/answers.json
+        max_assign_cnt (int): 最多能指派多少 worker
+        budget (int): 預算
+        max_round (int): 回合數
+        cache (dict): 傳給 alg 的 gen_micro_cache ，有給的話 confidence 沒有變的 task 沿用上一回合的結果跟 difficulty ，
+            沒有給的話跟原本的模型一樣，每回合每個 task 都重新抽 difficulty
+        rng (numpy.random.Generator): 傳給 alg 跟 macro_uniform 的亂數產生器，沒有給的話用全域狀態
+        method (str): 傳給 alg ，像是 use_threshold_table 回傳的 'table' ，沒有給的話使用 MICRO_METHOD
+
+    Return:
+        dict: 這次模擬的 total_rev, total_correct, remaining_budget 以及每個回合的 rounds
+    """
+    simulate_result = gen_macro_result(max_round)
+    remaining_budget = budget
+
+    task_table = copy_task_table(task_table)
+    simulate_tasks = task_table_to_tasks(task_table, np.arange(len(task_table['ids'])))
+
+    for round_num in range(max_round):
+        task_indexes = np.flatnonzero(task_table['is_active'])
+        round_tasks = [simulate_tasks[task_index] for task_index in task_indexes.tolist()]
+        dropped_cnt = 0
+        if round_num == 0 and policy['uniform_level_names'] is not None:
+            level_comb = level_comb_from_names(policy['uniform_level_names'], levels_dict)
+            cost_sum = level_comb_cost(level_comb, levels_dict)
+            round_budget = cost_sum * len(task_indexes)
+            result_tasks, outcome_dict = macro_uniform(round_tasks, levels_dict, tasks_answer_dict, level_comb, rng)
+        else:
+            round_budget = int(remaining_budget/(max_round - round_num))
+
+            reachable_tasks = drop_hopeless_tasks(round_tasks, levels_dict, max_assign_cnt, \
+                                                  task_table['level_max_assign_cnts'][task_indexes])
+            dropped_cnt = len(round_tasks) - len(reachable_tasks)
+            if dropped_cnt > 0:
+                simulate_result['rounds'][round_num]['dropped_tasks'] = dict( \
+                    [(task['id'], [task['drop_reason']]) for task in round_tasks if 'drop_reason' in task])
+            result_tasks, outcome_dict = alg(reachable_tasks, levels_dict, \
+                        tasks_answer_dict, max_assign_cnt, round_budget, method=method, cache=cache, rng=rng)
+
+        result_task_indexes, pre_confidences, new_confidences = update_task_table(task_table, result_tasks)
+        task_table['is_active'][:] = False
+        task_table['is_active'][result_task_indexes] = policy['continues'](new_confidences, pre_confidences)
+
+        simulate_result['total_rev'] += outcome_dict['revenue_sum']
+        simulate_result['total_correct'] += outcome_dict['correct_cnt']
+        remaining_budget = remaining_budget - round_budget + outcome_dict['remaining_budget']
+
+        round_result = simulate_result['rounds'][round_num]
+        round_result['round_rev'] += outcome_dict['revenue_sum']
+        round_result['round_correct'] += outcome_dict['correct_cnt']
+        round_result['round_remaining'] += remaining_budget
+        round_result['round_dropped'] += dropped_cnt
+        if cache is not None:
+            round_result['round_cache_hit'], round_result['round_cache_miss'] = pop_micro_cache_cnts(cache)
+
+    simulate_result['remaining_budget'] = remaining_budget
+    return simulate_result
+
+def macro_simulate_experiments(experiments, task_table, levels_dict, tasks_answer_dict, max_assign_cnt, budget, \
+                               max_round=MAX_ROUND, seed_sequence=None, reuse_results=False, method=None):
+    """
+    同一次模擬裡依序跑每個 experiment 。 reuse_results 是 True 時每個 experiment 各用一份 gen_micro_cache ，
+    而且第一回合就用 alg 的 experiment 看到的 task 都一樣，有兩個以上時先用一份 cache 算好所有 task 的
+    micro_optimization 結果 (抽一次 difficulty) ，再用 copy_micro_cache 給每個 experiment ，
+    第一回合不用重算，而且比較的是同一組 difficulty 。
+    有給 seed_sequence 時，共用的第一回合跟每個 experiment 各用一個 spawn 出來的 numpy.random.Generator ，
+    結果只跟 seed_sequence 有關，跟在哪個 process 執行無關。
+
+    Args:
+        experiments (dict): 名稱對應到 (alg, policy)
+        seed_sequence (numpy.random.SeedSequence): 這次模擬的 seed ，沒有給的話用全域狀態
+        reuse_results (bool): 是否給 macro_simulate cache ，沿用 confidence 沒有變的 task 的結果跟 difficulty
+        其他參數同 macro_simulate
+
+    Return:
+        dict: 名稱對應到 macro_simulate 的結果
+    """
+    rngs = [None] * (len(experiments) + 1)
+    if seed_sequence is not None:
+        rngs = [np.random.default_rng(child_seed_sequence) \
+                for child_seed_sequence in seed_sequence.spawn(len(experiments) + 1)]
+
+    shared_cache = None
+    if reuse_results and \
+            len([policy for _, policy in experiments.values() if policy['uniform_level_names'] is None]) > 1:
+        shared_cache = gen_micro_cache()
+        all_task_indexes = np.arange(len(task_table['ids']))
+        gen_tasks_results(task_table_to_tasks(task_table, all_task_indexes), levels_dict, max_assign_cnt, \
+                          method=method, cache=shared_cache, rng=rngs[0])
+
+    simulate_results = dict()
+    for experiment_index, (name, (alg, policy)) in enumerate(experiments.items()):
+        cache = None
+        if shared_cache is not None:
+            cache = copy_micro_cache(shared_cache)
+        elif reuse_results:
+            cache = gen_micro_cache()
+        simulate_results[name] = macro_simulate(alg, policy, task_table, levels_dict, tasks_answer_dict, \
+                                                max_assign_cnt, budget, max_round, cache, rngs[experiment_index+1], \
+                                                method)
+    return simulate_results
+
+def init_macro_worker(task_table, levels_dict, tasks_answer_dict):
+    """
+    Pool 的 initializer ，每個 worker 只執行一次，把資料記在 _WORKER_DATASET 。
+    fork 的時候 initargs 直接被子 process 繼承，不用 pickle ，每個工作也只要傳參數，不用再傳整份資料。
+
+    Args:
+        task_table (dict): gen_task_table 的結果
+        levels_dict (dict): worker 的等級，以及 quality ，可以參考 Exp-Data/levels.json
+        tasks_answer_dict (dict): 在真正的 Crowdsourcing 中， level1 及 level2 worker 的回答，可參考 Exp-Data/answers.json
+    """
+    _WORKER_DATASET['task_table'] = task_table
+    _WORKER_DATASET['levels_dict'] = levels_dict
+    _WORKER_DATASET['tasks_answer_dict'] = tasks_answer_dict
+
+def macro_simulate_worker(experiments, max_assign_cnt, budget, max_round, seed_sequence, reuse_results, method):
+    """
+    在 Pool 的 worker 裡用 init_macro_worker 記住的資料跑 macro_simulate_experiments 。
+
+    Return:
+        dict: 名稱對應到 macro_simulate 的結果
+    """
+    return macro_simulate_experiments(experiments, _WORKER_DATASET['task_table'], _WORKER_DATASET['levels_dict'], \
+                                      _WORKER_DATASET['tasks_answer_dict'], max_assign_cnt, budget, max_round, \
+                                      seed_sequence, reuse_results, method)
+
+def run_macros(experiments, tasks, levels_dict, tasks_answer_dict, max_assign_cnt, budget, \
+               simulate_cnt=SIMULATE_CNT, max_round=MAX_ROUND, processes=None, seed=None, reuse_results=False, \
+               method=None):
+    """
+    資料只讀一次，轉成 gen_task_table 的表，模擬 simulate_cnt 次，每次都跑所有的 experiment ，
+    回傳每個 experiment 的平均結果。
+    每次模擬的亂數由 numpy.random.SeedSequence(seed) spawn 出來，彼此獨立，
+    同一個 seed 不管用不用 Pool 、用幾個 process ，結果都完全相同。
+    processes 是 None 時在這個 process 依序模擬，否則用 Pool(processes) 同時跑多次模擬，
+    資料在建立 Pool 時用 init_macro_worker 交給每個 worker 一次。
+    建立 Pool 之前先 gc.freeze() ，讓 worker 的 garbage collector 不會去碰繼承來的物件，
+    這些記憶體才會一直跟主 process 共用，不會因為 copy-on-write 被複製。
+    Pool 結束或是模擬出錯時都會 gc.unfreeze() 。
+
+    Args:
+        experiments (dict): 名稱對應到 (alg, policy)
+        tasks (list): 有 task 資訊的 dictonary ，可參考 Exp-Data/task.json.
+        levels_dict (dict): worker 的等級，以及 quality ，可以參考 Exp-Data/levels.json
+        tasks_answer_dict (dict): 在真正的 Crowdsourcing 中， level1 及 level2 worker 的回答，可參考 Exp-Data/answers.json
+        max_assign_cnt (int): 最多能指派多少 worker
+        budget (int): 預算
+        simulate_cnt (int): 模擬次數
+        max_round (int): 回合數
+        processes (int): Pool 的 process 數， None 代表不用 Pool
+        seed (int): SeedSequence 的 entropy ，沒有給的話使用 SEED
+        reuse_results (bool): True 的話 confidence 沒有變的 task 沿用上一回合的結果跟 difficulty ，
+            把 difficulty 當成 task 固定的性質，會改變模型；預設跟原本一樣每回合都重新抽 difficulty
+        method (str): 傳給每個 experiment 的 alg ，沒有給的話使用 MICRO_METHOD
+
+    Return:
+        dict: 名稱對應到平均的 total_rev, total_correct, remaining_budget 、每個回合的 rounds ，
+            以及可以用來重現結果的 seed
+    """
+    if seed is None:
+        seed = SEED
+    seed_sequence = np.random.SeedSequence(seed)
+    simulate_seed_sequences = seed_sequence.spawn(simulate_cnt)
+
+    macro_results = dict([(name, gen_macro_result(max_round)) for name in experiments])
+    task_table = gen_task_table(tasks, levels_dict)
+
+    if processes is None:
+        simulate_results_list = list()
+        for i in range(simulate_cnt):
+            print(i)
+            simulate_results_list.append(macro_simulate_experiments(experiments, task_table, levels_dict, \
+                                         tasks_answer_dict, max_assign_cnt, budget, max_round, \
+                                         simulate_seed_sequences[i], reuse_results, method))
+    else:
+        gc.freeze()
+        try:
+            with Pool(processes=processes, initializer=init_macro_worker, \
+                      initargs=(task_table, levels_dict, tasks_answer_dict)) as pool:
+                simulate_processes = list()
+                for i in range(simulate_cnt):
+                    print(i)
+                    simulate_processes.append(pool.apply_async(macro_simulate_worker, \
+                                                               (experiments, max_assign_cnt, budget, max_round, \
+                                                                simulate_seed_sequences[i], reuse_results, method)))
+                pool.close()
+                pool.join()
+                simulate_results_list = [simulate_process.get() for simulate_process in simulate_processes]
+        finally:
+            gc.unfreeze()
+
+    for simulate_results in simulate_results_list:
+        for name, simulate_result in simulate_results.items():
+            add_macro_result(macro_results[name], simulate_result)
+    for name in macro_results:
+        average_macro_result(macro_results[name], simulate_cnt)
+        macro_results[name]['seed'] = seed_sequence.entropy
+    return macro_results
+
+def run_macro(alg, policy, tasks, levels_dict, tasks_answer_dict, max_assign_cnt, budget, \
+              simulate_cnt=SIMULATE_CNT, max_round=MAX_ROUND, processes=None, seed=None, reuse_results=False, \
+              method=None):
+    """
+    只有一個 experiment 的 run_macros 。
+
+    Return:
+        dict: 平均的 total_rev, total_correct, remaining_budget 、每個回合的 rounds ，以及 seed
+    """
+    return run_macros({'macro': (alg, policy)}, tasks, levels_dict, tasks_answer_dict, max_assign_cnt, budget, \
+                      simulate_cnt, max_round, processes, seed, reuse_results, method)['macro']
+
+if __name__ == "__main__":
+    task_file_path = sys.argv[1]
+    worker_file_path = sys.argv[2]
+    answer_file_path = sys.argv[3]
+    max_assign_cnt = int(sys.argv[4])
+    budget = int(sys.argv[5])
+
+    with open(task_file_path, "r") as myfile:
+        tasks = json.load(myfile)
+
+    with open(worker_file_path, "r") as myfile:
+        levels_dict = json.load(myfile)
+
+    with open(answer_file_path, "r") as myfile:
+        tasks_answer_dict = json.load(myfile)
+
+    method = None
+    if len(sys.argv) > 6:
+        method = use_threshold_table(sys.argv[6], levels_dict, max_assign_cnt)
+
+    experiments = dict()
+    for alg in [micro_mckp, micro_greedy, micro_cp]:
+        experiments[alg.__name__ + "_keepup"] = (alg, keepup_policy())
+        experiments[alg.__name__ + "_gte_threshold"] = (alg, gte_threshold_policy())
+
+    start_time = time.time()
+    macro_results = run_macros(experiments, tasks, levels_dict, tasks_answer_dict, max_assign_cnt, budget, \
+                               method=method)
+    print(time.time() - start_time)
+    pprint(macro_results)
@@ -1,93 +1,28 @@
-import os
 import sys
-import copy
 import json
 import time
 
 from pprint import pprint
-from micro_optimization import THRESHOLD
-from macro_uniform import macro_uniform
+from macro_engine import gte_threshold_policy, run_macro
 from micro_greedy import micro_greedy
 from micro_cp import micro_cp
 from micro_mckp import micro_mckp
+from threshold_table import use_threshold_table
+
 
 SIMULATE_CNT = 10
 MAX_ROUND = 5
 CONF_THRESHOLD = 0.4
+UNIFORM_LEVEL_NAMES = ["level1", "level1"]
 
-def macro_gte_threshold_uniform(alg, tasks, levels_dict, tasks_answer_dict, max_assign_cnt, budget):
-    macro_result = {
-        "total_rev": float(),
-        "total_correct": float(),
-        "remaining_budget": float(),
-        "rounds": list()
-    }
-    for round_num in range(MAX_ROUND):
-        macro_result['rounds'].append({
-            "round_rev": float(),
-            "round_correct": float(),
-            "round_remaining": float()
-        })
-
-    for i in range(SIMULATE_CNT):
-        print(i)
-        total_rev = float()
-        total_correct = float()
-        remaining_budget = budget
-
-        round_tasks = copy.deepcopy(tasks)
-        tasks_dict = dict()
-        for task in tasks:
-            tasks_dict[task['id']] = copy.deepcopy(task)
-            tasks_dict[task['id']]['is_solved'] = False
-
-        for round_num in range(MAX_ROUND):
-            if round_num == 0:
-                level_comb = ["level1", "level1"]
-                cost_sum = int()
-                for level_name in level_comb:
-                    cost_sum += levels_dict[level_name]['cost']
-                round_budget = cost_sum * len(round_tasks)
-                result_tasks, outcome_dict = macro_uniform(round_tasks, levels_dict, \
-                                        tasks_answer_dict, level_comb)
-            else:
-                round_budget = int(remaining_budget/(MAX_ROUND - round_num))
-
-                result_tasks, outcome_dict = alg(round_tasks, levels_dict, \
-                            tasks_answer_dict, max_assign_cnt, round_budget)
-            next_round_tasks = list()
-            for result_task in result_tasks:
-                new_confidence = result_task['pre-answer']['confidence']
-                pre_confidence = tasks_dict[result_task['id']]['pre-answer']['confidence']
-                tasks_dict[result_task['id']]['pre-answer']['confidence'] = new_confidence
-                tasks_dict[result_task['id']]['is_solved'] = result_task['is_solved']
-                if new_confidence < THRESHOLD and new_confidence >= CONF_THRESHOLD:
-                    next_round_tasks.append(result_task)
-            round_tasks = next_round_tasks
 
-            total_rev += outcome_dict['revenue_sum']
-            total_correct += outcome_dict['correct_cnt']
-            remaining_budget = remaining_budget - round_budget + outcome_dict['remaining_budget']
-
-            macro_result['rounds'][round_num]['round_rev'] += outcome_dict['revenue_sum']
-            macro_result['rounds'][round_num]['round_correct'] += outcome_dict['correct_cnt']
-            macro_result['rounds'][round_num]['round_remaining'] += remaining_budget
-
-        macro_result['total_rev'] += total_rev
-        macro_result['total_correct'] += total_correct
-        macro_result['remaining_budget'] += remaining_budget
-
-    macro_result['total_rev'] = macro_result['total_rev'] / SIMULATE_CNT
-    macro_result['total_correct'] = macro_result['total_correct'] / SIMULATE_CNT
-    macro_result['remaining_budget'] = macro_result['remaining_budget'] / SIMULATE_CNT
-    for round_num in range(MAX_ROUND):
-        macro_result['rounds'][round_num]['round_rev'] = \
-            macro_result['rounds'][round_num]['round_rev'] / SIMULATE_CNT
-        macro_result['rounds'][round_num]['round_correct'] = \
-            macro_result['rounds'][round_num]['round_correct'] / SIMULATE_CNT
-        macro_result['rounds'][round_num]['round_remaining'] = \
-            macro_result['rounds'][round_num]['round_remaining'] / SIMULATE_CNT
-    return macro_result
+def macro_gte_threshold_uniform(alg, tasks, levels_dict, tasks_answer_dict, max_assign_cnt, budget, method=None):
+    """
+    跟 macro_gte_threshold 一樣，但第一回合每個 task 都用同一個 worker 組合。
+    """
+    policy = gte_threshold_policy(CONF_THRESHOLD, UNIFORM_LEVEL_NAMES)
+    return run_macro(alg, policy, tasks, levels_dict, tasks_answer_dict, max_assign_cnt, budget, \
+                     SIMULATE_CNT, MAX_ROUND, method=method)
 
 if __name__ == "__main__":
     task_file_path = sys.argv[1]
@@ -105,7 +40,12 @@ if __name__ == "__main__":
     with open(answer_file_path, "r") as myfile:
         tasks_answer_dict = json.load(myfile)
 
+    method = None
+    if len(sys.argv) > 6:
+        method = use_threshold_table(sys.argv[6], levels_dict, max_assign_cnt)
+
     start_time = time.time()
-    macro_result = macro_gte_threshold_uniform(micro_mckp, tasks, levels_dict, tasks_answer_dict, max_assign_cnt, budget)
+    macro_result = macro_gte_threshold_uniform(micro_mckp, tasks, levels_dict, tasks_answer_dict, max_assign_cnt, budget, \
+                                               method=method)
     print(time.time() - start_time)
     pprint(macro_result)
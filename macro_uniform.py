@@ -2,10 +2,10 @@ import sys
 import json
 from pprint import pprint
 
-from micro_optimization import THRESHOLD, micro_optimization, gen_true_conf
+from micro_optimization import THRESHOLD, gen_true_conf, level_comb_from_names
 
 
-def macro_uniform(tasks, levels_dict, tasks_answer_dict, level_comb):
+def macro_uniform(tasks, levels_dict, tasks_answer_dict, level_comb, rng=None):
     """
     將每一個 task 都分配一樣的 worker 組合
 
@@ -13,7 +13,8 @@ def macro_uniform(tasks, levels_dict, tasks_answer_dict, level_comb):
         tasks (list): 有 task 資訊的 dictonary ，可參考 Exp-Data/task.json.
         levels_dict (dict): worker 的等級，以及 quality ，可以參考 Exp-Data/levels.json
         tasks_answer_dict (dict): 在真正的 Crowdsourcing 中， level1 及 level2 worker 的回答，可參考 Exp-Data/answers.json
-        level_comb (list): worker 的組合，像是 ['level1', 'level1', 'level2'] 代表兩個 level 1 的 worker ，以及一個 level 2 的 worker
+        level_comb (tuple): 每個等級各有幾個 worker ，像是 (2, 1) 代表兩個 level 1 的 worker ，以及一個 level 2 的 worker
+        rng (numpy.random.Generator): 抽 worker 回答用的亂數產生器，沒有給的話用 random 模組
     Return:
         tasks (list): 會將每個 task 新增一個 is_solved 的值，如果已經被解掉的 task ， is_solved=True
         output_dict (dict): 包含 revenue_sum, correct_cnt 以及 remaining_budget
@@ -32,7 +33,7 @@ def macro_uniform(tasks, levels_dict, tasks_answer_dict, level_comb):
         pre_confidence = task['pre-answer']['confidence']
 
         true_conf = gen_true_conf(pre_confidence, level_comb, \
-                            levels_dict, tasks_answer_dict[task_id])
+                            levels_dict, tasks_answer_dict[task_id], rng)
         task['pre-answer']['confidence'] = true_conf
 
         if true_conf >= THRESHOLD:
@@ -62,7 +63,7 @@ if __name__ == '__main__':
     with open(answer_file_path, "r") as myfile:
         tasks_answer_dict = json.load(myfile)
 
-    level_comb = ["level1"]
+    level_comb = level_comb_from_names(["level1"], levels_dict)
 
     new_tasks, outcome_dict = macro_uniform(tasks, levels_dict, \
                                 tasks_answer_dict, level_comb)
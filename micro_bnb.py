@@ -0,0 +1,294 @@
+import sys
+import json
+import time
+import numpy as np
+from pprint import pprint
+
+from micro_optimization import THRESHOLD, gen_true_conf, gen_tasks_results
+from threshold_table import use_threshold_table
+from micro_lp import get_task_hull_increments, get_hull_increments, mckp_lp
+
+TIME_LIMIT = 10
+# 上界跟目前最好的解差距小於 GAP_TOLERANCE * 根節點上界時就停止
+GAP_TOLERANCE = 1e-6
+# core problem 一開始包含 break item 前後各幾個增量，證明不了最佳時加倍
+CORE_INCREMENT_CNT = 16
+
+
+def get_break_index(increments, budget):
+    """
+    線性鬆弛中第一個買不起的增量 (break item) 的位置，全部都買得起的話是 len(increments) 。
+
+    Args:
+        increments (list): get_hull_increments 的結果
+        budget (int): 預算
+
+    Return:
+        int: break item 在 increments 中的位置
+    """
+    remaining_budget = budget
+    for increment_index, (_, _, cost, _) in enumerate(increments):
+        if cost > remaining_budget:
+            return increment_index
+        remaining_budget -= cost
+    return len(increments)
+
+def gen_lp_bound_curves(core_increments, depth_cnt):
+    """
+    每個深度 depth 還沒決定的 core task (深度 >= depth) 的線性鬆弛曲線：依照效率由高到低買增量，
+    累積的 cost 跟 expected_revenue 就是曲線的轉折點，剩下的預算代入 np.interp 就是線性鬆弛的最佳值。
+
+    Args:
+        core_increments (list): core task 的 (深度, cost, expected_revenue) 增量，效率由高到低
+        depth_cnt (int): core task 數
+
+    Return:
+        list of tuple: 每個深度 (含 depth_cnt) 的 (累積 cost, 累積 expected_revenue) ，開頭都是 0
+    """
+    depths = np.array([increment[0] for increment in core_increments], dtype=np.int64)
+    costs = np.array([increment[1] for increment in core_increments], dtype=np.int64)
+    expected_revenues = np.array([increment[2] for increment in core_increments], dtype=float)
+    curves = list()
+    for depth in range(depth_cnt + 1):
+        is_remaining = depths >= depth
+        curves.append((np.concatenate(([0], np.cumsum(costs[is_remaining]))), \
+                       np.concatenate(([0.0], np.cumsum(expected_revenues[is_remaining])))))
+    return curves
+
+def mckp_bnb(tasks_results, budget, time_limit=TIME_LIMIT, gap_tolerance=GAP_TOLERANCE):
+    """
+    分組背包問題的 branch and bound ，用的記憶體只跟 task 數以及組合數有關，跟預算無關。
+    core problem ：把 get_hull_increments 依照效率排好，只有 break item 前後 core_increment_cnt 個增量的 task
+    (core task) 要搜尋，其他的 task 固定成線性鬆弛的選擇。以 break item 的效率當 Lagrange 乘數，
+    每個組合的 reduced revenue 是 expected_revenue - 乘數 * cost ，固定的 task 改選其他組合時，
+    上界最多是根節點的上界減掉它最大跟第二大的 reduced revenue 的差，所有固定的 task 中這個值最大的就是
+    固定錯誤時的上界 deviation_bound 。
+    core task 依照最大跟第二大的 reduced revenue 差距由小到大一層一層分支，同一層的節點跟 mckp_frontier 一樣
+    只留下 (cost, expected_revenue) 不被支配的，每個節點用 gen_lp_bound_curves 重新算還沒決定的 core task
+    在剩下的預算下的線性鬆弛當上界，上界 <= incumbent + 容許誤差的節點剪掉。
+    用 mckp_lp 的整數解當初始的 incumbent ，上界跟 incumbent 的差距一開始就在容許誤差內時直接回傳；
+    搜尋完後差距還太大 (通常是 deviation_bound 太大) 就把 core_increment_cnt 加倍再搜尋一次。
+
+    Args:
+        tasks_results (list): 每個 task 的 micro_optimization 結果
+        budget (int): 預算
+        time_limit (float): 最多搜尋幾秒， None 代表直到證明最佳為止
+        gap_tolerance (float): 上界跟 incumbent 的差距小於 gap_tolerance * 根節點上界就停止
+
+    Return:
+        chosen_results (list): 每個 task 選到的 micro_optimization 結果，沒有選的話是 None
+        upper_bound (float): 最佳解的上界，在時間內搜尋完時跟 chosen_results 的 expected_revenue
+            差距不超過 gap_tolerance * 根節點上界
+    """
+    start_time = time.time()
+    chosen_results, root_upper_bound = mckp_lp(tasks_results, budget)
+    incumbent_expected_revenue = sum([result['expected_revenue'] for result in chosen_results if result is not None])
+    tolerance = gap_tolerance * root_upper_bound
+    if root_upper_bound - incumbent_expected_revenue <= tolerance:
+        return chosen_results, max(root_upper_bound, incumbent_expected_revenue)
+
+    increments = get_hull_increments(tasks_results, budget)
+    break_index = get_break_index(increments, budget)
+    if break_index == len(increments):
+        return chosen_results, incumbent_expected_revenue
+    _, _, break_cost, break_expected_revenue = increments[break_index]
+    break_efficiency = break_expected_revenue / break_cost
+
+    # 線性鬆弛在 break item 之前的選擇，以及每個 task 最大跟第二大的 reduced revenue 差距
+    lp_results = [None] * len(tasks_results)
+    for task_index, result, _, _ in increments[:break_index]:
+        lp_results[task_index] = result
+    reduced_gaps = list()
+    for results in tasks_results:
+        reduced_revenues = [0.0] + [result['expected_revenue'] - break_efficiency * result['cost'] \
+                                    for result in results if 0 < result['cost'] <= budget]
+        reduced_revenues.sort(reverse=True)
+        reduced_gaps.append(reduced_revenues[0] - reduced_revenues[1] if len(reduced_revenues) > 1 else None)
+
+    core_increment_cnt = CORE_INCREMENT_CNT
+    while True:
+        core_task_indexes = set([task_index for task_index, _, _, _ in \
+            increments[max(0, break_index - core_increment_cnt):break_index + core_increment_cnt]])
+        fixed_expected_revenue = 0.0
+        core_budget = budget
+        deviation_bound = -float('inf')
+        for task_index, result in enumerate(lp_results):
+            if task_index in core_task_indexes:
+                continue
+            if result is not None:
+                fixed_expected_revenue += result['expected_revenue']
+                core_budget -= result['cost']
+            if reduced_gaps[task_index] is not None:
+                deviation_bound = max(deviation_bound, root_upper_bound - reduced_gaps[task_index])
+
+        core_tasks = sorted(core_task_indexes, key=lambda task_index: reduced_gaps[task_index])
+        core_increments = list()
+        for depth, task_index in enumerate(core_tasks):
+            for _, cost, expected_revenue in get_task_hull_increments(tasks_results[task_index], core_budget):
+                core_increments.append((depth, cost, expected_revenue))
+        core_increments.sort(key=lambda k: k[2] / k[1], reverse=True)
+        lp_bound_curves = gen_lp_bound_curves(core_increments, len(core_tasks))
+
+        # 一層是同一個深度的所有節點 (cost, expected_revenue) ，被同一層 cost 不比較高、 expected_revenue 不比較低的
+        # 節點支配的節點直接刪掉；每個節點的上界是 fixed_expected_revenue + expected_revenue + 還沒決定的 core task 在
+        # 剩下的預算下的線性鬆弛，上界 <= incumbent + tolerance 的節點剪掉。 search_upper_bound 是被剪掉的節點中最大的上界
+        costs = np.zeros(1, dtype=np.int64)
+        expected_revenues = np.zeros(1)
+        layers = list()
+        search_upper_bound = -float('inf')
+        is_timeout = False
+        for depth, task_index in enumerate(core_tasks):
+            if time_limit is not None and time.time() - start_time > time_limit:
+                is_timeout = True
+                break
+
+            results = tasks_results[task_index]
+            candidate_costs = [costs]
+            candidate_expected_revenues = [expected_revenues]
+            candidate_parents = [np.arange(len(costs))]
+            candidate_choices = [np.full(len(costs), -1)]
+            for result_index, result in enumerate(results):
+                if not (0 < result['cost'] <= core_budget and result['expected_revenue'] > 0):
+                    continue
+                is_affordable = costs + result['cost'] <= core_budget
+                candidate_costs.append(costs[is_affordable] + result['cost'])
+                candidate_expected_revenues.append(expected_revenues[is_affordable] + result['expected_revenue'])
+                candidate_parents.append(np.flatnonzero(is_affordable))
+                candidate_choices.append(np.full(int(is_affordable.sum()), result_index))
+
+            costs = np.concatenate(candidate_costs)
+            expected_revenues = np.concatenate(candidate_expected_revenues)
+            parents = np.concatenate(candidate_parents)
+            choices = np.concatenate(candidate_choices)
+
+            order = np.lexsort((-expected_revenues, costs))
+            sorted_expected_revenues = expected_revenues[order]
+            is_frontier = np.empty(len(order), dtype=bool)
+            is_frontier[0] = True
+            is_frontier[1:] = sorted_expected_revenues[1:] > np.maximum.accumulate(sorted_expected_revenues)[:-1]
+            order = order[is_frontier]
+            costs = costs[order]
+            expected_revenues = expected_revenues[order]
+            layers.append((parents[order], choices[order]))
+
+            # 後面的 core task 都不選就是一個可行解
+            best_state_index = int(np.argmax(expected_revenues))
+            if fixed_expected_revenue + expected_revenues[best_state_index] > incumbent_expected_revenue:
+                incumbent_expected_revenue = fixed_expected_revenue + float(expected_revenues[best_state_index])
+                chosen_results = [result if task_index not in core_task_indexes else None \
+                                  for task_index, result in enumerate(lp_results)]
+                state_index = best_state_index
+                for layer_depth in range(depth, -1, -1):
+                    layer_parents, layer_choices = layers[layer_depth]
+                    if layer_choices[state_index] >= 0:
+                        chosen_results[core_tasks[layer_depth]] = \
+                            tasks_results[core_tasks[layer_depth]][layer_choices[state_index]]
+                    state_index = layer_parents[state_index]
+
+            cumulative_costs, cumulative_expected_revenues = lp_bound_curves[depth+1]
+            upper_bounds = fixed_expected_revenue + expected_revenues + \
+                np.interp(core_budget - costs, cumulative_costs, cumulative_expected_revenues)
+            is_open = upper_bounds > incumbent_expected_revenue + tolerance
+            if not is_open.all():
+                search_upper_bound = max(search_upper_bound, float(upper_bounds[~is_open].max()))
+            costs = costs[is_open]
+            expected_revenues = expected_revenues[is_open]
+            layers[-1] = (layers[-1][0][is_open], layers[-1][1][is_open])
+            if len(costs) == 0:
+                break
+
+        if is_timeout and len(costs) > 0:
+            cumulative_costs, cumulative_expected_revenues = lp_bound_curves[len(layers)]
+            search_upper_bound = max(search_upper_bound, float((fixed_expected_revenue + expected_revenues + \
+                np.interp(core_budget - costs, cumulative_costs, cumulative_expected_revenues)).max()))
+
+        upper_bound = max(search_upper_bound, deviation_bound, incumbent_expected_revenue)
+        if is_timeout or upper_bound - incumbent_expected_revenue <= tolerance or \
+                core_increment_cnt >= max(break_index, len(increments) - break_index):
+            break
+        core_increment_cnt *= 2
+
+    return chosen_results, min(upper_bound, root_upper_bound)
+
+def micro_bnb(tasks, levels_dict, tasks_answer_dict, max_assign_cnt, budget, prune='pareto', method=None, \
+              time_limit=TIME_LIMIT, cache=None, rng=None):
+    """
+    跟 micro_mckp 一樣求分組背包問題的最佳解，但是用 mckp_bnb ，預算很大 (例如上百萬) 時也能用。
+    超過 time_limit 時回傳目前最好的解，以及證明過的最佳解上界。
+
+    Args:
+        tasks (list): 有 task 資訊的 dictonary ，可參考 Exp-Data/task.json.
+        levels_dict (dict): worker 的等級，以及 quality ，可以參考 Exp-Data/levels.json
+        tasks_answer_dict (dict): 在真正的 Crowdsourcing 中， level1 及 level2 worker 的回答，可參考 Exp-Data/answers.json
+        max_assign_cnt (int): 最多能指派多少 worker
+        budget (int): 預算
+        prune (str): 傳給 prune_results ，預設只留下 Pareto frontier 上的 worker 組合
+        method (str): 傳給 micro_optimization_batch ，沒有給的話使用 MICRO_METHOD
+        time_limit (float): 最多搜尋幾秒， None 代表直到證明最佳為止
+        cache (dict): 傳給 gen_tasks_results ，讓 confidence 沒有變的 task 沿用上一次的結果
+        rng (numpy.random.Generator): 抽 difficulty 、 Monte Carlo 跟 worker 回答用的亂數產生器，沒有給的話用全域狀態
+
+    Return:
+        tasks (list): 會將每個 task 新增一個 is_solved 的值，如果已經被解掉的 task ， is_solved=True
+        output_dict (dict): 包含 revenue_sum, correct_cnt, remaining_budget ，以及選到的組合的 revenue 期望值
+            expected_revenue 、最佳解的上界 expected_revenue_upper_bound ，以及兩者的差距 gap
+    """
+    for task in tasks:
+        task['is_solved'] = False
+
+    tasks_results = gen_tasks_results(tasks, levels_dict, max_assign_cnt, prune, method, cache, rng)
+    chosen_results, expected_revenue_upper_bound = mckp_bnb(tasks_results, budget, time_limit)
+
+    remaining_budget = budget
+    revenue_sum = int()
+    correct_cnt = int()
+    expected_revenue = float()
+    for task, result in zip(tasks, chosen_results):
+        if result is None:
+            continue
+        task_id = task['id']
+        pre_confidence = task['pre-answer']['confidence']
+        true_conf = gen_true_conf(pre_confidence, result['level_comb'], \
+                        levels_dict, tasks_answer_dict[task_id], rng)
+        task['pre-answer']['confidence'] = true_conf
+        if true_conf >= THRESHOLD:
+            revenue_sum += task['revenue']
+            correct_cnt += 1
+            task['is_solved'] = True
+
+        remaining_budget -= result['cost']
+        expected_revenue += result['expected_revenue']
+
+    outcome_dict = {
+        'revenue_sum': revenue_sum,
+        'correct_cnt': correct_cnt,
+        'remaining_budget': remaining_budget,
+        'expected_revenue': expected_revenue,
+        'expected_revenue_upper_bound': max(expected_revenue_upper_bound, expected_revenue),
+        'gap': max(expected_revenue_upper_bound - expected_revenue, 0.0)
+    }
+    return tasks, outcome_dict
+
+if __name__ == '__main__':
+    task_file_path = sys.argv[1]
+    worker_file_path = sys.argv[2]
+    answer_file_path = sys.argv[3]
+    max_assign_cnt = int(sys.argv[4])
+    budget = int(sys.argv[5])
+
+    with open(task_file_path, "r") as myfile:
+        tasks = json.load(myfile)
+
+    with open(worker_file_path, "r") as myfile:
+        levels_dict = json.load(myfile)
+
+    with open(answer_file_path, "r") as myfile:
+        tasks_answer_dict = json.load(myfile)
+
+    method = None
+    if len(sys.argv) > 6:
+        method = use_threshold_table(sys.argv[6], levels_dict, max_assign_cnt)
+
+    tasks, outcome_dict = micro_bnb(tasks, levels_dict, \
+                                tasks_answer_dict, max_assign_cnt, budget, method=method)
+    pprint(outcome_dict)
@@ -2,10 +2,14 @@ import sys
 import json
 from pprint import pprint
 
-from micro_optimization import THRESHOLD, micro_optimization, gen_true_conf
+from micro_optimization import THRESHOLD, gen_true_conf, gen_difficulties, get_level_max_assign_cnts, \
+    gen_tasks_results, gen_lazy_table, lazy_task_results, order_results_by_expected_revenue
+from threshold_table import use_threshold_table
+from micro_lp import mckp_heap
 
 
-def micro_cp(tasks, levels_dict, tasks_answer_dict, max_assign_cnt, budget):
+def micro_cp(tasks, levels_dict, tasks_answer_dict, max_assign_cnt, budget, prune='pareto', method=None, \
+             selection='order', cache=None, rng=None):
     """
     先將 task 的 revenue 及 pre_confidence 相成，再由高而低的排列，從最大的 task 開始解。
 
@@ -15,6 +19,15 @@ def micro_cp(tasks, levels_dict, tasks_answer_dict, max_assign_cnt, budget):
         tasks_answer_dict (dict): 在真正的 Crowdsourcing 中， level1 及 level2 worker 的回答，可參考 Exp-Data/answers.json
         max_assign_cnt (int): 最多能指派多少 worker
         budget (int): 預算
+        prune (str): 傳給 prune_results ，預設只留下 Pareto frontier 上的 worker 組合
+        method (str): 傳給 micro_optimization_batch ，沒有給的話使用 MICRO_METHOD
+        selection (str): 'order' 照順序一個一個 task 選 expected_revenue 最大且買得起的組合
+            (順序見 order_results_by_expected_revenue)；
+            'heap' 用 mckp_heap 依照每單位 cost 增加的 expected_revenue 選，效率相同時照這裡的順序；
+            'lazy' 選的組合跟 prune='pareto' 的 'order' 一樣，但用 lazy_task_results 只模擬需要的組合，
+            買不起的組合不模擬 ('exact' 時 gte_threshold_prob 一定不超過上界，選的組合跟 'order' 完全相同)
+        cache (dict): 傳給 gen_tasks_results ，讓 confidence 沒有變的 task 沿用上一次的結果 ('lazy' 不使用)
+        rng (numpy.random.Generator): 抽 difficulty 、 Monte Carlo 跟 worker 回答用的亂數產生器，沒有給的話用全域狀態
 
     Return:
         tasks (list): 會將每個 task 新增一個 is_solved 的值，如果已經被解掉的 task ， is_solved=True
@@ -30,14 +43,29 @@ def micro_cp(tasks, levels_dict, tasks_answer_dict, max_assign_cnt, budget):
 
     tasks_order_by_origin_exp_revenue = sorted(tasks, \
                             key=lambda k: k['origin_exp_revenue'], reverse=True)
-    for task in tasks_order_by_origin_exp_revenue:
+    if selection == 'lazy':
+        pre_confidences = [task['pre-answer']['confidence'] for task in tasks_order_by_origin_exp_revenue]
+        lazy_table = gen_lazy_table(pre_confidences, [task['revenue'] for task in tasks_order_by_origin_exp_revenue], \
+                                    gen_difficulties(pre_confidences, rng), levels_dict, max_assign_cnt, \
+                                    get_level_max_assign_cnts(tasks_order_by_origin_exp_revenue, levels_dict))
+        tasks_results = None
+    else:
+        tasks_results = gen_tasks_results(tasks_order_by_origin_exp_revenue, levels_dict, max_assign_cnt, prune, method, cache, rng)
+    if selection == 'heap':
+        tasks_results = [[result] if result is not None else [] \
+                         for result in mckp_heap(tasks_results, budget)]
+    elif selection not in ('order', 'lazy'):
+        raise ValueError("unknown selection %s" % selection)
+
+    for task_index, task in enumerate(tasks_order_by_origin_exp_revenue):
         task_id = task['id']
         pre_confidence = task['pre-answer']['confidence']
 
-        results = micro_optimization(task, levels_dict, max_assign_cnt)
-        results_order_by_cost = sorted(results, key=lambda k: k['cost'])
-        results_order_by_expected_revenue = sorted(results_order_by_cost, \
-                                                key=lambda k: k['expected_revenue'], reverse=True)
+        if selection == 'lazy':
+            results_order_by_expected_revenue = lazy_task_results(lazy_table, task_index, remaining_budget, \
+                                                                  method, rng)
+        else:
+            results_order_by_expected_revenue = order_results_by_expected_revenue(tasks_results[task_index])
         for result in results_order_by_expected_revenue:
             if (remaining_budget - result['cost']) < 0:
                 continue
@@ -46,7 +74,7 @@ def micro_cp(tasks, levels_dict, tasks_answer_dict, max_assign_cnt, budget):
                 continue
 
             true_conf = gen_true_conf(pre_confidence, result['level_comb'], \
-                            levels_dict, tasks_answer_dict[task_id])
+                            levels_dict, tasks_answer_dict[task_id], rng)
             task['pre-answer']['confidence'] = true_conf
 
             if true_conf >= THRESHOLD:
@@ -81,7 +109,11 @@ if __name__ == '__main__':
     with open(answer_file_path, "r") as myfile:
         tasks_answer_dict = json.load(myfile)
 
+    method = None
+    if len(sys.argv) > 6:
+        method = use_threshold_table(sys.argv[6], levels_dict, max_assign_cnt)
+
     new_tasks, outcome_dict = micro_cp(tasks, levels_dict, \
-                                tasks_answer_dict, max_assign_cnt, budget)
+                                tasks_answer_dict, max_assign_cnt, budget, method=method)
 
     pprint(outcome_dict)
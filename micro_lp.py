@@ -0,0 +1,230 @@
+import sys
+import json
+import heapq
+from pprint import pprint
+
+from micro_optimization import THRESHOLD, gen_true_conf, gen_tasks_results, prune_results
+from threshold_table import use_threshold_table
+
+
+def get_task_hull_increments(results, budget):
+    """
+    一個 task 只留下買得起的組合的上凸包，把相鄰兩個組合的差 (多花的 cost ，多得的 expected_revenue) 當成一個增量，
+    效率 (expected_revenue / cost) 由高到低。
+
+    Args:
+        results (list): 一個 task 的 micro_optimization 結果
+        budget (int): 預算
+
+    Return:
+        list of tuple: (增量後的 micro_optimization 結果, 多花的 cost, 多得的 expected_revenue)
+    """
+    increments = list()
+    affordable_results = [result for result in results if 0 < result['cost'] <= budget]
+    prev_cost = 0
+    prev_expected_revenue = 0
+    for result in prune_results(affordable_results, 'hull'):
+        increments.append((result, result['cost'] - prev_cost, result['expected_revenue'] - prev_expected_revenue))
+        prev_cost = result['cost']
+        prev_expected_revenue = result['expected_revenue']
+    return increments
+
+def get_hull_increments(tasks_results, budget):
+    """
+    所有 task 的 get_task_hull_increments 依照效率由高到低排列。同一個 task 的增量效率遞減，
+    所以排完後還是依照 cost 由低到高的順序。
+
+    Args:
+        tasks_results (list): 每個 task 的 micro_optimization 結果
+        budget (int): 預算
+
+    Return:
+        list of tuple: (task_index, 增量後的 micro_optimization 結果, 多花的 cost, 多得的 expected_revenue)
+    """
+    increments = list()
+    for task_index, results in enumerate(tasks_results):
+        for result, cost, expected_revenue in get_task_hull_increments(results, budget):
+            increments.append((task_index, result, cost, expected_revenue))
+    increments.sort(key=lambda k: k[3] / k[2], reverse=True)
+    return increments
+
+def mckp_heap(tasks_results, budget):
+    """
+    用一個 heap 放每個 task 下一個增量，每次拿出效率最高的，買得起就升級那個 task 並放入它的下一個增量，
+    買不起的話那個 task 就停在目前的組合。效率相同時 tasks_results 前面的 task 先拿，
+    所以呼叫前先依照優先順序排好 task 。預算用完就停，不用排序所有的增量。
+
+    Args:
+        tasks_results (list): 每個 task 的 micro_optimization 結果，依照優先順序排列
+        budget (int): 預算
+
+    Return:
+        list: 每個 task 選到的 micro_optimization 結果，沒有選的話是 None
+    """
+    chosen_results = [None] * len(tasks_results)
+    tasks_increments = [get_task_hull_increments(results, budget) for results in tasks_results]
+    heap = [(-expected_revenue / cost, task_index, 0) \
+            for task_index, increments in enumerate(tasks_increments) \
+            for _, cost, expected_revenue in increments[:1]]
+    heapq.heapify(heap)
+    remaining_budget = budget
+    while len(heap) > 0 and remaining_budget > 0:
+        _, task_index, increment_index = heapq.heappop(heap)
+        result, cost, _ = tasks_increments[task_index][increment_index]
+        if cost > remaining_budget:
+            continue
+
+        chosen_results[task_index] = result
+        remaining_budget -= cost
+        if increment_index + 1 < len(tasks_increments[task_index]):
+            _, next_cost, next_expected_revenue = tasks_increments[task_index][increment_index+1]
+            heapq.heappush(heap, (-next_expected_revenue / next_cost, task_index, increment_index+1))
+    return chosen_results
+
+def mckp_lp(tasks_results, budget):
+    """
+    分組背包問題的線性鬆弛 (Sinha–Zoltners) ：依照效率由高到低買增量，第一個買不起的增量只買一部分就是線性鬆弛的最佳解，
+    它的值是最佳解的上界。整數解則是繼續往下買，買不起某個增量的 task 之後的增量也都不買。
+    線性鬆弛最多只有一個 task 選了分數，所以最佳解 <= 整數解 + 單一組合最大的 expected_revenue ，
+    兩者取較大的就至少是最佳解的一半。
+
+    Args:
+        tasks_results (list): 每個 task 的 micro_optimization 結果
+        budget (int): 預算
+
+    Return:
+        chosen_results (list): 每個 task 選到的 micro_optimization 結果，沒有選的話是 None
+        upper_bound (float): 線性鬆弛的最佳值，整數解不會超過它
+    """
+    chosen_results = [None] * len(tasks_results)
+    is_blocked = [False] * len(tasks_results)
+    remaining_budget = budget
+    upper_bound = 0
+    is_fractional = False
+    for task_index, result, cost, expected_revenue in get_hull_increments(tasks_results, budget):
+        if cost > remaining_budget:
+            if not is_fractional:
+                upper_bound += expected_revenue * remaining_budget / cost
+                is_fractional = True
+            is_blocked[task_index] = True
+            continue
+
+        if is_blocked[task_index]:
+            continue
+
+        chosen_results[task_index] = result
+        remaining_budget -= cost
+        if not is_fractional:
+            upper_bound += expected_revenue
+
+    best_task_index = None
+    best_result = None
+    for task_index, results in enumerate(tasks_results):
+        for result in results:
+            if 0 < result['cost'] <= budget and \
+                    (best_result is None or result['expected_revenue'] > best_result['expected_revenue']):
+                best_task_index = task_index
+                best_result = result
+
+    expected_revenue = sum([result['expected_revenue'] for result in chosen_results if result is not None])
+    if best_result is not None and best_result['expected_revenue'] > expected_revenue:
+        chosen_results = [None] * len(tasks_results)
+        chosen_results[best_task_index] = best_result
+    return chosen_results, upper_bound
+
+def mckp_lp_bound(tasks_results, budget):
+    """
+    用 mckp_lp 算最佳解的上下界。
+
+    Args:
+        tasks_results (list): 每個 task 的 micro_optimization 結果
+        budget (int): 預算
+
+    Return:
+        lower_bound (float): mckp_lp 整數解的 expected_revenue
+        upper_bound (float): 線性鬆弛的最佳值
+    """
+    chosen_results, upper_bound = mckp_lp(tasks_results, budget)
+    lower_bound = sum([result['expected_revenue'] for result in chosen_results if result is not None])
+    return lower_bound, max(upper_bound, lower_bound)
+
+def micro_lp(tasks, levels_dict, tasks_answer_dict, max_assign_cnt, budget, prune='pareto', method=None, \
+             cache=None, rng=None):
+    """
+    每個 task 只留下上凸包上的 worker 組合，再依照每多花一單位 cost 增加的 expected_revenue 由高到低分配預算，
+    只需要排序，不用 micro_mckp 的 (task 數, 預算) 表，同時回報最佳解的上界，可以拿來檢查其他演算法離最佳解多遠。
+
+    Args:
+        tasks (list): 有 task 資訊的 dictonary ，可參考 Exp-Data/task.json.
+        levels_dict (dict): worker 的等級，以及 quality ，可以參考 Exp-Data/levels.json
+        tasks_answer_dict (dict): 在真正的 Crowdsourcing 中， level1 及 level2 worker 的回答，可參考 Exp-Data/answers.json
+        max_assign_cnt (int): 最多能指派多少 worker
+        budget (int): 預算
+        prune (str): 傳給 prune_results ，預設只留下 Pareto frontier 上的 worker 組合
+        method (str): 傳給 micro_optimization_batch ，沒有給的話使用 MICRO_METHOD
+        cache (dict): 傳給 gen_tasks_results ，讓 confidence 沒有變的 task 沿用上一次的結果
+        rng (numpy.random.Generator): 抽 difficulty 、 Monte Carlo 跟 worker 回答用的亂數產生器，沒有給的話用全域狀態
+
+    Return:
+        tasks (list): 會將每個 task 新增一個 is_solved 的值，如果已經被解掉的 task ， is_solved=True
+        output_dict (dict): 包含 revenue_sum, correct_cnt, remaining_budget ，以及選到的組合的 revenue 期望值
+            expected_revenue 跟最佳解的上界 expected_revenue_upper_bound
+    """
+    for task in tasks:
+        task['is_solved'] = False
+
+    tasks_results = gen_tasks_results(tasks, levels_dict, max_assign_cnt, prune, method, cache, rng)
+    chosen_results, expected_revenue_upper_bound = mckp_lp(tasks_results, budget)
+
+    remaining_budget = budget
+    revenue_sum = int()
+    correct_cnt = int()
+    expected_revenue = float()
+    for task, result in zip(tasks, chosen_results):
+        if result is None:
+            continue
+        task_id = task['id']
+        pre_confidence = task['pre-answer']['confidence']
+        true_conf = gen_true_conf(pre_confidence, result['level_comb'], \
+                        levels_dict, tasks_answer_dict[task_id], rng)
+        task['pre-answer']['confidence'] = true_conf
+        if true_conf >= THRESHOLD:
+            revenue_sum += task['revenue']
+            correct_cnt += 1
+            task['is_solved'] = True
+
+        remaining_budget -= result['cost']
+        expected_revenue += result['expected_revenue']
+
+    outcome_dict = {
+        'revenue_sum': revenue_sum,
+        'correct_cnt': correct_cnt,
+        'remaining_budget': remaining_budget,
+        'expected_revenue': expected_revenue,
+        'expected_revenue_upper_bound': max(expected_revenue_upper_bound, expected_revenue)
+    }
+    return tasks, outcome_dict
+
+if __name__ == '__main__':
+    task_file_path = sys.argv[1]
+    worker_file_path = sys.argv[2]
+    answer_file_path = sys.argv[3]
+    max_assign_cnt = int(sys.argv[4])
+    budget = int(sys.argv[5])
+
+    with open(task_file_path, "r") as myfile:
+        tasks = json.load(myfile)
+
+    with open(worker_file_path, "r") as myfile:
+        levels_dict = json.load(myfile)
+
+    with open(answer_file_path, "r") as myfile:
+        tasks_answer_dict = json.load(myfile)
+
+    method = None
+    if len(sys.argv) > 6:
+        method = use_threshold_table(sys.argv[6], levels_dict, max_assign_cnt)
+
+    tasks, outcome_dict = micro_lp(tasks, levels_dict, \
+                                tasks_answer_dict, max_assign_cnt, budget, method=method)
+    pprint(outcome_dict)
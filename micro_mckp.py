@@ -1,76 +1,403 @@
 import sys
-import copy
 import json
+import math
+import numpy as np
 from pprint import pprint
 
-from micro_optimization import THRESHOLD, micro_optimization, gen_true_conf
+from micro_optimization import THRESHOLD, gen_true_conf, gen_tasks_results
+from threshold_table import use_threshold_table
+from micro_lp import mckp_lp_bound
 
+LINEAR_DP_BASE_TASK_CNT = 64
 
-def micro_mckp(tasks, levels_dict, tasks_answer_dict, max_assign_cnt, budget):
+
+def get_cost_unit(levels_dict):
     """
-    將我們的問題套用到多背背問題後的解法，可以參考 http://www2.lssh.tp.edu.tw/~hlf/class-1/lang-c/DP.pdf ，裡面的「P06: 分組的背包問題」。
+    每個 worker 組合的 cost 都是 levels.json 裡 cost 的和，所以都是這些 cost 最大公因數的倍數，
+    動態規劃的預算只需要以最大公因數為一格。
+
+    Args:
+        levels_dict (dict): worker 的等級，以及 quality ，可以參考 Exp-Data/levels.json
+
+    Return:
+        int: 所有等級 cost 的最大公因數，沒有正的 cost 時是 1
+    """
+    cost_unit = 0
+    for level_name in levels_dict:
+        cost_unit = math.gcd(cost_unit, int(levels_dict[level_name]['cost']))
+    return max(cost_unit, 1)
+
+def mckp_dp(tasks_results, budget, cost_unit=1, record_choices=True):
+    """
+    分組背包問題的動態規劃，一次處理一個 task ，新的一列是前一列跟「前一列往右移 cost 格再加上 expected_revenue」
+    逐格取最大值，每一個組合移一次，所以每個 task 最多只會選一個組合。
+    預算以 cost_unit 為一格，第 b 格代表預算 b * cost_unit ，所有組合的 cost 都必須是 cost_unit 的倍數。
+
+    Args:
+        tasks_results (list): 每個 task 的 micro_optimization 結果
+        budget (int): 預算
+        cost_unit (int): 一格的預算，可以用 get_cost_unit 算
+        record_choices (bool): False 的話不建 budget_choices ，只用兩列的記憶體
+
+    Return:
+        budget_expected_revenue (numpy.ndarray): 每一格預算 (0 ~ budget // cost_unit) 能得到最大的 revenue 期望值
+        budget_choices (numpy.ndarray): (task 數, budget // cost_unit + 1) ，做完第 task_index 個 task 時，
+            第 tmp_budget 格預算的最佳解選了 tasks_results[task_index] 的第幾個組合， -1 代表沒有選，
+            record_choices=False 時是 None
+    """
+    budget_cells = budget // cost_unit
+    budget_choices = None
+    if record_choices:
+        max_result_cnt = max([len(results) for results in tasks_results] + [1])
+        budget_choices = np.full((len(tasks_results), budget_cells+1), -1, dtype=np.min_scalar_type(-max_result_cnt))
+    budget_expected_revenue = np.zeros(budget_cells+1)
+    for task_index, results in enumerate(tasks_results):
+        next_expected_revenue = budget_expected_revenue.copy()
+        for result_index, result in enumerate(results):
+            cost = result['cost'] // cost_unit
+            expected_revenue = result['expected_revenue']
+            if cost > budget_cells or cost <= 0 or expected_revenue == 0:
+                continue
+
+            shifted_expected_revenue = budget_expected_revenue[:budget_cells+1-cost] + expected_revenue
+            is_better = shifted_expected_revenue > next_expected_revenue[cost:]
+            np.copyto(next_expected_revenue[cost:], shifted_expected_revenue, where=is_better)
+            if record_choices:
+                np.copyto(budget_choices[task_index, cost:], result_index, where=is_better)
+        budget_expected_revenue = next_expected_revenue
+    return budget_expected_revenue, budget_choices
+
+def mckp_backtrack(tasks_results, budget_choices, tmp_budget, cost_unit=1):
+    """
+    從最後一個 task 往回找出第 tmp_budget 格預算時，每個 task 選了哪一個組合。
+
+    Args:
+        tasks_results (list): 每個 task 的 micro_optimization 結果
+        budget_choices (numpy.ndarray): mckp_dp 的 budget_choices
+        tmp_budget (int): 第幾格預算
+        cost_unit (int): 跟 mckp_dp 相同的 cost_unit
+
+    Return:
+        list: 每個 task 選到的 micro_optimization 結果，沒有選的話是 None
+    """
+    chosen_results = [None] * len(tasks_results)
+    for task_index in range(len(tasks_results) - 1, -1, -1):
+        result_index = budget_choices[task_index, tmp_budget]
+        if result_index < 0:
+            continue
+        chosen_results[task_index] = tasks_results[task_index][result_index]
+        tmp_budget -= chosen_results[task_index]['cost'] // cost_unit
+    return chosen_results
+
+def mckp_linear(tasks_results, budget, cost_unit=1):
+    """
+    只用 O(預算) 記憶體的 mckp_dp (Hirschberg) ：先只算最後一列找出最佳的預算，再把 task 切成前後兩半，
+    前半段從前面算、後半段從後面算，各得到一列，找出讓兩列加起來最大的預算分法後，兩半各自遞迴。
+    每一層遞迴的預算加起來不超過 budget ， task 數每層減半，所以總共的計算量大約是 mckp_dp 的三倍。
+    task 數不超過 LINEAR_DP_BASE_TASK_CNT 時直接用 mckp_dp 跟 mckp_backtrack 。
+
+    Args:
+        tasks_results (list): 每個 task 的 micro_optimization 結果
+        budget (int): 預算
+        cost_unit (int): 一格的預算，可以用 get_cost_unit 算
+
+    Return:
+        chosen_results (list): 每個 task 選到的 micro_optimization 結果，沒有選的話是 None
+        expected_revenue (float): chosen_results 的 revenue 期望值總和
+    """
+    def solve(task_start, task_end, tmp_budget):
+        sub_tasks_results = tasks_results[task_start:task_end]
+        if task_end - task_start <= LINEAR_DP_BASE_TASK_CNT:
+            _, budget_choices = mckp_dp(sub_tasks_results, tmp_budget * cost_unit, cost_unit)
+            chosen_results[task_start:task_end] = mckp_backtrack(sub_tasks_results, budget_choices, \
+                                                                 tmp_budget, cost_unit)
+            return
+
+        task_mid = (task_start + task_end) // 2
+        front_expected_revenue, _ = mckp_dp(tasks_results[task_start:task_mid], tmp_budget * cost_unit, \
+                                            cost_unit, record_choices=False)
+        back_expected_revenue, _ = mckp_dp(tasks_results[task_mid:task_end], tmp_budget * cost_unit, \
+                                           cost_unit, record_choices=False)
+        front_budget = int(np.argmax(front_expected_revenue + back_expected_revenue[::-1]))
+        solve(task_start, task_mid, front_budget)
+        solve(task_mid, task_end, tmp_budget - front_budget)
+
+    budget_expected_revenue, _ = mckp_dp(tasks_results, budget, cost_unit, record_choices=False)
+    best_budget = int(np.argmax(budget_expected_revenue))
+    chosen_results = [None] * len(tasks_results)
+    solve(0, len(tasks_results), best_budget)
+    return chosen_results, float(budget_expected_revenue[best_budget])
+
+def mckp_fptas(tasks_results, budget, epsilon):
+    """
+    預算很大時用的近似解：把 expected_revenue 除以 scale 後無條件捨去成整數，
+    改成對「捨去後的 revenue 總和」做動態規劃，記錄每個 revenue 總和 (至少) 最少要花多少 cost 。
+    scale = epsilon * lower_bound / task 數，每個 task 最多損失 scale ，所以得到的解 >= (1 - epsilon) * 最佳解，
+    表的大小約為 task 數 * (2 * task 數 / epsilon) ，跟預算的大小無關。
+
+    Args:
+        tasks_results (list): 每個 task 的 micro_optimization 結果
+        budget (int): 預算
+        epsilon (float): 可以接受的相對誤差， 0 < epsilon < 1
+
+    Return:
+        chosen_results (list): 每個 task 選到的 micro_optimization 結果，沒有選的話是 None
+        upper_bound (float): 最佳解的上界
+    """
+    lower_bound, upper_bound = mckp_lp_bound(tasks_results, budget)
+    chosen_results = [None] * len(tasks_results)
+    if lower_bound <= 0:
+        return chosen_results, 0.0
+
+    scale = epsilon * lower_bound / len(tasks_results)
+    max_profit = int(upper_bound / scale)
+    max_result_cnt = max([len(results) for results in tasks_results] + [1])
+    profit_choices = np.full((len(tasks_results), max_profit+1), -1, dtype=np.min_scalar_type(-max_result_cnt))
+    profit_min_cost = np.full(max_profit+1, np.inf)
+    profit_min_cost[0] = 0
+    for task_index, results in enumerate(tasks_results):
+        next_min_cost = profit_min_cost.copy()
+        for result_index, result in enumerate(results):
+            cost = result['cost']
+            profit = min(int(result['expected_revenue'] / scale), max_profit)
+            if cost > budget or cost <= 0 or profit == 0:
+                continue
+
+            # 至少 tmp_profit 時，選這個組合後前面的 task 只需要至少 max(tmp_profit - profit, 0)
+            shifted_min_cost = np.empty(max_profit+1)
+            shifted_min_cost[:profit] = profit_min_cost[0] + cost
+            shifted_min_cost[profit:] = profit_min_cost[:max_profit+1-profit] + cost
+            is_better = shifted_min_cost < next_min_cost
+            np.copyto(next_min_cost, shifted_min_cost, where=is_better)
+            np.copyto(profit_choices[task_index], result_index, where=is_better)
+        profit_min_cost = next_min_cost
+
+    tmp_profit = int(np.flatnonzero(profit_min_cost <= budget)[-1])
+    for task_index in range(len(tasks_results) - 1, -1, -1):
+        result_index = profit_choices[task_index, tmp_profit]
+        if result_index < 0:
+            continue
+        chosen_results[task_index] = tasks_results[task_index][result_index]
+        tmp_profit = max(tmp_profit - min(int(chosen_results[task_index]['expected_revenue'] / scale), max_profit), 0)
+
+    expected_revenue = sum([result['expected_revenue'] for result in chosen_results if result is not None])
+    return chosen_results, min(upper_bound, expected_revenue + scale * len(tasks_results))
+
+def mckp_frontier(tasks_results, budget, epsilon=None):
+    """
+    稀疏版的分組背包動態規劃：不用每一個預算一格，每做完一個 task 只留下 (cost, expected_revenue) 的 Pareto frontier ，
+    也就是 cost 由低到高排列時 expected_revenue 嚴格遞增的狀態。下一個 task 的候選狀態是
+    「不選」以及「每個組合加上目前的 frontier」，排序後掃一次留下新的 frontier 。
+    每個狀態記得是從上一層的哪個狀態、選了哪個組合來的，最後從 expected_revenue 最大的狀態往回找。
+    frontier 的大小不超過能花到的不同 cost 的個數，levels 的 cost 很大但最大公因數很小 (mckp_dp 要切很多格) 時，
+    這個數字遠小於預算的格數：cost 是 9701 跟 30103 、 300 個 task 、預算 10^7 時 mckp_dp 要 90 幾秒，
+    這裡不到 1 秒，而且一樣是最佳解。反過來 cost 的最大公因數大、 task 很多時 frontier 會接近預算的格數，
+    每一層還要排序，比 mckp_dp 慢很多，這時應該用 'dense' 。
+
+    epsilon 有給的話，跟 mckp_fptas 一樣取 mckp_lp_bound 的 lower_bound ，把 expected_revenue 切成寬度
+    epsilon * lower_bound / task 數的區間，每一層每個區間只留下 cost 最低的狀態。
+    最佳解每經過一層，留下來的狀態中都有一個 cost 不比它高、 expected_revenue 最多少一個區間寬度的狀態，
+    所以得到的解 >= 最佳解 - epsilon * lower_bound >= (1 - epsilon) * 最佳解，
+    而 frontier 最多只有 task 數 * upper_bound / (epsilon * lower_bound) + 1 個狀態，跟預算的大小無關。
+
+    Args:
+        tasks_results (list): 每個 task 的 micro_optimization 結果
+        budget (int): 預算
+        epsilon (float): 可以接受的相對誤差， 0 < epsilon < 1 ， None 代表求最佳解
+
+    Return:
+        chosen_results (list): 每個 task 選到的 micro_optimization 結果，沒有選的話是 None
+        upper_bound (float): 最佳解的上界，沒有給 epsilon 時就是 chosen_results 的 revenue 期望值總和
+    """
+    bucket_width = None
+    if epsilon is not None:
+        lower_bound, upper_bound = mckp_lp_bound(tasks_results, budget)
+        if lower_bound <= 0:
+            return [None] * len(tasks_results), 0.0
+        bucket_width = epsilon * lower_bound / len(tasks_results)
+
+    max_result_cnt = max([len(results) for results in tasks_results] + [1])
+    costs = np.zeros(1, dtype=np.int64)
+    expected_revenues = np.zeros(1)
+    layers = list()
+    for results in tasks_results:
+        candidate_costs = [costs]
+        candidate_expected_revenues = [expected_revenues]
+        candidate_parents = [np.arange(len(costs))]
+        candidate_choices = [np.full(len(costs), -1)]
+        for result_index, result in enumerate(results):
+            cost = result['cost']
+            expected_revenue = result['expected_revenue']
+            if cost > budget or cost <= 0 or expected_revenue == 0:
+                continue
+
+            # costs 由低到高，所以買得起的狀態是前面一段
+            affordable_cnt = int(np.searchsorted(costs, budget - cost, side='right'))
+            candidate_costs.append(costs[:affordable_cnt] + cost)
+            candidate_expected_revenues.append(expected_revenues[:affordable_cnt] + expected_revenue)
+            candidate_parents.append(np.arange(affordable_cnt))
+            candidate_choices.append(np.full(affordable_cnt, result_index))
+
+        costs = np.concatenate(candidate_costs)
+        expected_revenues = np.concatenate(candidate_expected_revenues)
+        parents = np.concatenate(candidate_parents)
+        choices = np.concatenate(candidate_choices)
+
+        # cost 由低到高，cost 相同時 expected_revenue 高的在前面，只留下比前面所有狀態的 expected_revenue 都高的
+        order = np.lexsort((-expected_revenues, costs))
+        sorted_expected_revenues = expected_revenues[order]
+        is_frontier = np.empty(len(order), dtype=bool)
+        is_frontier[0] = True
+        is_frontier[1:] = sorted_expected_revenues[1:] > np.maximum.accumulate(sorted_expected_revenues)[:-1]
+        order = order[is_frontier]
+
+        if bucket_width is not None:
+            # frontier 的 expected_revenue 跟 cost 一起遞增，每個區間的第一個狀態就是 cost 最低的
+            _, bucket_firsts = np.unique(np.floor(expected_revenues[order] / bucket_width), return_index=True)
+            order = order[bucket_firsts]
+
+        costs = costs[order]
+        expected_revenues = expected_revenues[order]
+        layers.append((parents[order].astype(np.min_scalar_type(len(parents))), \
+                       choices[order].astype(np.min_scalar_type(-max_result_cnt))))
+
+    chosen_results = [None] * len(tasks_results)
+    state_index = len(costs) - 1
+    for task_index in range(len(tasks_results) - 1, -1, -1):
+        parents, choices = layers[task_index]
+        if choices[state_index] >= 0:
+            chosen_results[task_index] = tasks_results[task_index][choices[state_index]]
+        state_index = parents[state_index]
+
+    expected_revenue = float(expected_revenues[-1])
+    if bucket_width is None:
+        return chosen_results, expected_revenue
+    return chosen_results, min(upper_bound, expected_revenue + bucket_width * len(tasks_results))
+
+def mckp_curve(tasks_results, budget, cost_unit=1):
+    """
+    用 mckp_dp 算出 0 ~ budget 每一個預算的最佳 revenue 期望值，跟 back-pointer 表一起存成曲線。
+
+    Args:
+        tasks_results (list): 每個 task 的 micro_optimization 結果
+        budget (int): 曲線最大的預算
+        cost_unit (int): 一格的預算，可以用 get_cost_unit 算
+
+    Return:
+        dict: 同 gen_mckp_curve
+    """
+    budget_expected_revenue, budget_choices = mckp_dp(tasks_results, budget, cost_unit)
+    return {
+        'tasks_results': tasks_results,
+        'cost_unit': cost_unit,
+        'budget_choices': budget_choices,
+        'expected_revenues': budget_expected_revenue[np.arange(budget+1) // cost_unit]
+    }
+
+def gen_mckp_curve(tasks, levels_dict, max_assign_cnt, budget, prune='pareto', method=None, cache=None, rng=None):
+    """
+    mckp_dp 做一次就有 0 ~ budget 每一個預算的最佳 revenue 期望值，把整條曲線跟 back-pointer 表一起留下來，
+    之後用 mckp_curve_results 就能拿到任何預算的最佳指派，不用再解一次，可以用來分析預算的敏感度或規劃每一輪的預算。
 
     Args:
         tasks (list): 有 task 資訊的 dictonary ，可參考 Exp-Data/task.json.
         levels_dict (dict): worker 的等級，以及 quality ，可以參考 Exp-Data/levels.json
-        tasks_answer_dict (dict): 在真正的 Crowdsourcing 中， level1 及 level2 worker 的回答，可參考 Exp-Data/answers.json
         max_assign_cnt (int): 最多能指派多少 worker
-        budget (int): 預算
+        budget (int): 曲線最大的預算
+        prune (str): 傳給 prune_results ，預設只留下 Pareto frontier 上的 worker 組合
+        method (str): 傳給 micro_optimization_batch ，沒有給的話使用 MICRO_METHOD
+        cache (dict): 傳給 gen_tasks_results
+        rng (numpy.random.Generator): 傳給 gen_tasks_results
 
     Return:
-        tasks (list): 會將每個 task 新增一個 is_solved 的值，如果已經被解掉的 task ， is_solved=True
-        output_dict (dict): 包含 revenue_sum, correct_cnt 以及 remaining_budget
+        dict: tasks_results, cost_unit, budget_choices ，以及 expected_revenues ，
+            expected_revenues[tmp_budget] 是預算 tmp_budget (0 ~ budget) 能得到最大的 revenue 期望值
     """
-    for task in tasks:
-        task['is_solved'] = False
+    tasks_results = gen_tasks_results(tasks, levels_dict, max_assign_cnt, prune, method, cache, rng)
+    return mckp_curve(tasks_results, budget, get_cost_unit(levels_dict))
 
-    budget_expected_revenue = [0] * (budget+1)
-    budget_expected_correct = [0] * (budget+1)
-    budget_do_tasks = list()
-    for tmp_budget in range(budget+1):
-        budget_do_tasks.append(dict())
+def mckp_curve_results(curve, budget):
+    """
+    從 gen_mckp_curve 的曲線找出預算 budget 的最佳指派，revenue 期望值相同時選花費最少的。
 
-    for task in tasks:
-        task_id = task['id']
-        results = micro_optimization(task, levels_dict, max_assign_cnt)
-        # task['results'] = results
+    Args:
+        curve (dict): gen_mckp_curve 的結果
+        budget (int): 預算，不能超過建立曲線時的預算
 
-        for tmp_budget in range(budget, 0, -1):
-            for result in results:
-                cost = result['cost']
-                expected_revenue = result['expected_revenue']
+    Return:
+        list: 每個 task 選到的 micro_optimization 結果，沒有選的話是 None
+    """
+    if budget < 0 or budget >= len(curve['expected_revenues']):
+        raise ValueError("budget %d is not on the curve (0 ~ %d)" % (budget, len(curve['expected_revenues']) - 1))
 
-                if tmp_budget - cost < 0:
-                    continue
+    cost_unit = curve['cost_unit']
+    best_budget = int(np.argmax(curve['expected_revenues'][:budget+1])) // cost_unit
+    return mckp_backtrack(curve['tasks_results'], curve['budget_choices'], best_budget, cost_unit)
 
-                if expected_revenue == 0:
-                    continue
+def micro_mckp(tasks, levels_dict, tasks_answer_dict, max_assign_cnt, budget, prune='pareto', method=None, \
+               epsilon=None, dp='dense', cache=None, rng=None):
+    """
+    將我們的問題套用到多背背問題後的解法，可以參考 http://www2.lssh.tp.edu.tw/~hlf/class-1/lang-c/DP.pdf ，裡面的「P06: 分組的背包問題」。
 
-                if budget_expected_revenue[tmp_budget - cost] + expected_revenue > \
-                        budget_expected_revenue[tmp_budget]:
+    Args:
+        tasks (list): 有 task 資訊的 dictonary ，可參考 Exp-Data/task.json.
+        levels_dict (dict): worker 的等級，以及 quality ，可以參考 Exp-Data/levels.json
+        tasks_answer_dict (dict): 在真正的 Crowdsourcing 中， level1 及 level2 worker 的回答，可參考 Exp-Data/answers.json
+        max_assign_cnt (int): 最多能指派多少 worker
+        budget (int): 預算
+        prune (str): 傳給 prune_results ，預設只留下 Pareto frontier 上的 worker 組合
+        method (str): 傳給 micro_optimization_batch ，沒有給的話使用 MICRO_METHOD
+        epsilon (float): 有給的話解的 revenue 期望值至少是最佳解的 (1 - epsilon) 倍，
+            dp 是 'frontier' 時傳給 mckp_frontier ，其他時候改用 mckp_fptas
+        dp (str): 用哪一種動態規劃， 'dense' 用 mckp_dp ， 'frontier' 用 mckp_frontier ，
+            'linear' 用 mckp_linear
+        cache (dict): 傳給 gen_tasks_results ，讓 confidence 沒有變的 task 沿用上一次的結果
+        rng (numpy.random.Generator): 抽 difficulty 、 Monte Carlo 跟 worker 回答用的亂數產生器，沒有給的話用全域狀態
 
-                    budget_expected_revenue[tmp_budget] = \
-                        budget_expected_revenue[tmp_budget - cost] + expected_revenue
-                    budget_expected_correct[tmp_budget] = \
-                        budget_expected_correct[tmp_budget - cost] + 1
+    Return:
+        tasks (list): 會將每個 task 新增一個 is_solved 的值，如果已經被解掉的 task ， is_solved=True
+        output_dict (dict): 包含 revenue_sum, correct_cnt, remaining_budget ，以及選到的組合的 revenue 期望值
+            expected_revenue 跟最佳解的上界 expected_revenue_upper_bound (沒有用 epsilon 時兩者相同)
+    """
+    for task in tasks:
+        task['is_solved'] = False
 
-                    budget_do_tasks[tmp_budget - cost][task_id] = {
-                        "level_comb": result['level_comb']
-                    }
-                    budget_do_tasks[tmp_budget] = copy.deepcopy(budget_do_tasks[tmp_budget - cost])
+    if dp == 'frontier':
+        tasks_results = gen_tasks_results(tasks, levels_dict, max_assign_cnt, prune, method, cache, rng)
+        chosen_results, expected_revenue_upper_bound = mckp_frontier(tasks_results, budget, epsilon)
+    elif epsilon is not None:
+        tasks_results = gen_tasks_results(tasks, levels_dict, max_assign_cnt, prune, method, cache, rng)
+        chosen_results, expected_revenue_upper_bound = mckp_fptas(tasks_results, budget, epsilon)
+    elif dp == 'linear':
+        tasks_results = gen_tasks_results(tasks, levels_dict, max_assign_cnt, prune, method, cache, rng)
+        chosen_results, expected_revenue_upper_bound = mckp_linear(tasks_results, budget, \
+                                                                   get_cost_unit(levels_dict))
+    elif dp == 'dense':
+        curve = gen_mckp_curve(tasks, levels_dict, max_assign_cnt, budget, prune, method, cache, rng)
+        chosen_results = mckp_curve_results(curve, budget)
+        expected_revenue_upper_bound = float(curve['expected_revenues'][budget])
+    else:
+        raise ValueError("unknown dp %s" % dp)
 
+    budget_do_tasks = dict()
+    spent_budget = int()
+    expected_revenue = float()
+    for task, result in zip(tasks, chosen_results):
+        if result is not None:
+            budget_do_tasks[task['id']] = result['level_comb']
+            spent_budget += result['cost']
+            expected_revenue += result['expected_revenue']
 
     revenue_sum = int()
     correct_cnt = int()
-    best_budget = budget_expected_revenue.index(max(budget_expected_revenue))
     for task in tasks:
-        if budget_do_tasks[best_budget].get(task['id']) is None:
+        if budget_do_tasks.get(task['id']) is None:
             continue
         task_id = task['id']
         pre_confidence = task['pre-answer']['confidence']
-        level_comb = budget_do_tasks[best_budget][task['id']]['level_comb']
+        level_comb = budget_do_tasks[task['id']]
         true_conf = gen_true_conf(pre_confidence, level_comb, \
-                        levels_dict, tasks_answer_dict[task_id])
+                        levels_dict, tasks_answer_dict[task_id], rng)
         task['pre-answer']['confidence'] = true_conf
         if true_conf >= THRESHOLD:
             revenue_sum += task['revenue']
@@ -80,7 +407,9 @@ def micro_mckp(tasks, levels_dict, tasks_answer_dict, max_assign_cnt, budget):
     outcome_dict = {
         'revenue_sum': revenue_sum,
         'correct_cnt': correct_cnt,
-        'remaining_budget': budget - best_budget
+        'remaining_budget': budget - spent_budget,
+        'expected_revenue': expected_revenue,
+        'expected_revenue_upper_bound': max(expected_revenue_upper_bound, expected_revenue)
     }
     return tasks, outcome_dict
 
@@ -100,7 +429,11 @@ if __name__ == '__main__':
     with open(answer_file_path, "r") as myfile:
         tasks_answer_dict = json.load(myfile)
 
+    method = None
+    if len(sys.argv) > 6:
+        method = use_threshold_table(sys.argv[6], levels_dict, max_assign_cnt)
+
     tasks, outcome_dict = micro_mckp(tasks, levels_dict, \
-                                tasks_answer_dict, max_assign_cnt, budget)
+                                tasks_answer_dict, max_assign_cnt, budget, method=method)
     pprint(outcome_dict)
     # pprint (tasks)
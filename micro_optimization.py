@@ -1,6 +1,7 @@
 import os
 import sys
 import json
+import heapq
 import random
 import numpy as np
 
@@ -8,135 +9,1411 @@ import numpy as np
 ALPHA = 0.8
 MAX_ITERATION = 100
 THRESHOLD = 0.75
+CHUNK_SIZE = 2 ** 22
 
-def gen_difficulty(task):
+# For adaptive Monte Carlo
+ADAPTIVE_BLOCK_SIZE = 25
+ADAPTIVE_MAX_ITERATION = 1000
+ADAPTIVE_MIN_DOMINATED_ITERATION = 100
+ADAPTIVE_TOLERANCE = 0.08
+ADAPTIVE_Z = 1.96
+
+# For gen_lazy_table
+LAZY_BLOCK_SIZE = 4
+LAZY_TASK_BLOCK_SIZE = 256
+
+def gen_difficulties(pre_confidences, rng=None):
+    """
+    一次幫所有 task 決定 difficulty ，結果的分布跟原本 gen_difficulty 的做法相同：
+    把 pre-confidence 的左邊跟右邊個切三段，當作標準差，各有一半的機率在右邊或左邊取值。
+    右邊取的是 pre-confidence + 標準差 * |Z| ，左邊是 pre-confidence - 標準差 * |Z| ，
+    其中 Z 是標準常態分布，且因為標準差是切三段的長度， |Z| 只能落在 3 以內才會在 0 ~ 1 之間，
+    超出的部分重新抽過，所以不會像原本一樣因為抽不滿 100 個數值而出錯。
+
+    Args:
+        pre_confidences (numpy.ndarray): 每個 task 的 pre-confidence
+        rng (numpy.random.Generator): 亂數產生器，沒有給的話用 np.random 的全域狀態
+
+    Return:
+        numpy.ndarray: 每個 task 的 difficulty ， 0 ~ 1 之間的浮點數。
+    """
+    if rng is None:
+        rng = np.random
+    pre_confidences = np.asarray(pre_confidences, dtype=float)
+    half_normals = np.abs(rng.standard_normal(pre_confidences.shape))
+    is_out_of_range = half_normals > 3
+    while np.any(is_out_of_range):
+        half_normals[is_out_of_range] = np.abs(rng.standard_normal(np.count_nonzero(is_out_of_range)))
+        is_out_of_range = half_normals > 3
+
+    is_right = rng.uniform(0, 1, pre_confidences.shape) < 0.5
+    difficulty_stds = np.where(is_right, 1 - pre_confidences, pre_confidences) / 3
+    difficulties = pre_confidences + np.where(is_right, 1, -1) * difficulty_stds * half_normals
+    return np.clip(difficulties, 0, 1)
+
+def gen_difficulty(task, rng=None):
     """
-    利用機率的方法決定 difficulty，把 pre-confidence 的左邊跟右邊個切三段，當作標準差，
-    並在左右邊各用不同的標準差隨機 Random 出 200 個數值，在 pre-confidence 的左右邊各取 50 個數值，
-    最後在 100 個數值內隨機挑選出一個當作 difficulty。
+    利用機率的方法決定 difficulty ，做法請見 gen_difficulties 。
     Args:
         task (dict): 有 task 資訊的 dictonary ，可參考 Exp-Data/task.json
+        rng (numpy.random.Generator): 亂數產生器，沒有給的話用 np.random 的全域狀態
 
     Return:
         float: 0 ~ 1 之間的浮點數。
     """
-    pre_confidence = task['pre-answer']['confidence']
-    difficulty_std_r = (1 - pre_confidence) / 3
-    difficulty_std_l = pre_confidence / 3
-    difficulty_list = list()
+    return float(gen_difficulties([task['pre-answer']['confidence']], rng)[0])
 
-    difficulty_2d_r = (pre_confidence + difficulty_std_r * np.random.randn(1, 200))
-    difficulty_2d_l = (pre_confidence + difficulty_std_l * np.random.randn(1, 200))
-    for difficulty in difficulty_2d_r[0]:
-        if difficulty >= pre_confidence and difficulty <= 1:
-            difficulty_list.append(difficulty)
+def get_level_names(levels_dict):
+    """
+    worker 等級的順序，也就是 level_comb 中每一個數字代表的等級，順序跟 levels.json 相同。
 
-        if len(difficulty_list) == 50:
-            break
+    Args:
+        levels_dict (dict): worker 的等級，以及 quality ，可以參考 Exp-Data/levels.json
 
-    for difficulty in difficulty_2d_l[0]:
-        if difficulty >= 0 and difficulty <= pre_confidence:
-            difficulty_list.append(difficulty)
+    Return:
+        list of str: 像是 ['level1', 'level2']
+    """
+    return list(levels_dict)
 
-        if len(difficulty_list) == 100:
-            break
+def level_comb_from_names(level_name_list, levels_dict):
+    """
+    把用字串表示的 worker 組合，轉成每個等級各有幾個 worker 的 level_comb 。
 
-    difficulty = difficulty_list[random.randint(0, 99)]
-    return difficulty
+    Args:
+        level_name_list (list): 像是 ['level1', 'level1', 'level2']
+        levels_dict (dict): worker 的等級，以及 quality ，可以參考 Exp-Data/levels.json
+
+    Return:
+        tuple of int: 像是 (2, 1) 代表兩個 level 1 的 worker ，以及一個 level 2 的 worker
+    """
+    return tuple(level_name_list.count(level_name) for level_name in get_level_names(levels_dict))
 
-def gen_true_conf(pre_confidence, level_comb, levels_dict, answer_dict):
+def level_comb_to_dict(level_comb, levels_dict):
+    """
+    輸出結果時使用，把 level_comb 轉成 {等級: worker 數} 的 dictionary 。
+
+    Args:
+        level_comb (tuple): 每個等級各有幾個 worker ，像是 (2, 1)
+        levels_dict (dict): worker 的等級，以及 quality ，可以參考 Exp-Data/levels.json
+
+    Return:
+        dict: 像是 {'level1': 2, 'level2': 1}
+    """
+    return dict(zip(get_level_names(levels_dict), (int(n) for n in level_comb)))
+
+def level_comb_cost(level_comb, levels_dict):
+    """
+    Args:
+        level_comb (tuple): 每個等級各有幾個 worker ，像是 (2, 1)
+        levels_dict (dict): worker 的等級，以及 quality ，可以參考 Exp-Data/levels.json
+
+    Return:
+        int: 這個 worker 組合的總花費
+    """
+    cost_sum = int()
+    for level_name, assign_cnt in zip(get_level_names(levels_dict), level_comb):
+        cost_sum += levels_dict[level_name]['cost'] * assign_cnt
+    return cost_sum
+
+def gen_true_conf(pre_confidence, level_comb, levels_dict, answer_dict, rng=None):
     """
     利用 pre_confidence 以及 level_comb ，計算出在 level_comb 的組合下，
     最後得到的 confidence 會是多少。
 
     Args:
         pre_confidence (float): 0 ~ 1 之間的浮點數
-        level_comb (list): worker 的組合，像是 ['level1', 'level1', 'level2'] 代表兩個 level 1 的 worker ，以及一個 level 2 的 worker
+        level_comb (tuple): 每個等級各有幾個 worker ，像是 (2, 1) 代表兩個 level 1 的 worker ，以及一個 level 2 的 worker
         levels_dict (dict): worker 的等級，以及 quality ，可以參考 Exp-Data/levels.json
         answer_dict (dict): 在真正的 Crowdsourcing 中， level1 及 level2 worker 的回答，可參考 Exp-Data/answers.json
+        rng (numpy.random.Generator): 亂數產生器，一次抽出一個等級所有 worker 的回答，
+            沒有給的話用 random 模組一個一個抽
 
     Return:
         float: 0 ~ 1 之間的浮點數
     """
     true_conf_direct = pre_confidence
     false_conf_direct = 1 - true_conf_direct
-    for level_name in level_comb:
-        random_answer_index = random.randint(0, len(answer_dict[level_name])-1)
-        answer = answer_dict[level_name][random_answer_index]
-        if answer['option'] is True:
-            true_conf_direct = true_conf_direct * levels_dict[level_name]['quality']
-            false_conf_direct = false_conf_direct * (1 - levels_dict[level_name]['quality'])
+    for level_name, assign_cnt in zip(get_level_names(levels_dict), level_comb):
+        if assign_cnt == 0:
+            continue
+        if rng is None:
+            random_answer_indexes = [random.randint(0, len(answer_dict[level_name])-1) for _ in range(assign_cnt)]
         else:
-            true_conf_direct = true_conf_direct * (1 - levels_dict[level_name]['quality'])
-            false_conf_direct = false_conf_direct * levels_dict[level_name]['quality']
+            random_answer_indexes = rng.integers(0, len(answer_dict[level_name]), assign_cnt).tolist()
+        for random_answer_index in random_answer_indexes:
+            answer = answer_dict[level_name][random_answer_index]
+            if answer['option'] is True:
+                true_conf_direct = true_conf_direct * levels_dict[level_name]['quality']
+                false_conf_direct = false_conf_direct * (1 - levels_dict[level_name]['quality'])
+            else:
+                true_conf_direct = true_conf_direct * (1 - levels_dict[level_name]['quality'])
+                false_conf_direct = false_conf_direct * levels_dict[level_name]['quality']
     true_conf = true_conf_direct / (true_conf_direct + false_conf_direct)
     return true_conf
 
-def micro_optimization(task, levels_dict, max_assign_cnt):
+def gen_true_confs(pre_confidences, level_combs, answer_cnts, answer_true_cnts, levels_dict, rng=None):
     """
-    計算 task 在有作多能指派多少 worker 的數量限制下，每一種 worker 組合能得到的 revenue 期望值各是多少。
+    一次算出很多 task 的 gen_true_conf 。 gen_true_conf 從回答中隨機抽 (可以重複) ，
+    所以每個 worker 回答 true 的機率是該等級回答 true 的比例，每個等級回答 true 的人數是二項分布，
+    抽出人數後直接用 quality 的次方算出 confidence 。
+
+    Args:
+        pre_confidences (numpy.ndarray): 每個 task 的 pre-confidence
+        level_combs (numpy.ndarray): (task 數, 等級數) ，每個 task 的 worker 組合
+        answer_cnts (numpy.ndarray): (task 數, 等級數) ， get_answer_cnts 算出來每個等級的回答數
+        answer_true_cnts (numpy.ndarray): (task 數, 等級數) ，每個等級回答 true 的數量
+        levels_dict (dict): worker 的等級，以及 quality ，可以參考 Exp-Data/levels.json
+        rng (numpy.random.Generator): 亂數產生器，沒有給的話用 np.random 的全域狀態
+
+    Return:
+        numpy.ndarray: 每個 task 0 ~ 1 之間的 confidence
+    """
+    if rng is None:
+        rng = np.random
+    level_qualities = np.array([levels_dict[level_name]['quality'] for level_name in get_level_names(levels_dict)])
+    level_combs = np.asarray(level_combs, dtype=np.int64).reshape(-1, len(level_qualities))
+    true_ratios = np.asarray(answer_true_cnts, dtype=float) / np.maximum(answer_cnts, 1)
+    true_cnts = rng.binomial(level_combs, true_ratios)
+    false_cnts = level_combs - true_cnts
+    pre_confidences = np.asarray(pre_confidences, dtype=float)
+    true_conf_direct = pre_confidences * \
+        np.prod(level_qualities ** true_cnts * (1 - level_qualities) ** false_cnts, axis=1)
+    false_conf_direct = (1 - pre_confidences) * \
+        np.prod((1 - level_qualities) ** true_cnts * level_qualities ** false_cnts, axis=1)
+    return true_conf_direct / (true_conf_direct + false_conf_direct)
+
+_LEVEL_COMB_TABLES = dict()
+_OUTCOME_TABLES = dict()
+
+def gen_level_comb_table(levels_dict, max_assign_cnt):
+    """
+    列出最多能指派 max_assign_cnt 個 worker 時，所有可能的 worker 組合以及各自的總花費。
+    同一個 levels_dict 跟 max_assign_cnt 只會算一次，之後直接回傳同一份結果，所以回傳的陣列不能修改。
 
     Args:
-        task (dict): 有 task 資訊的 dictonary ，可參考 Exp-Data/task.json.
         levels_dict (dict): worker 的等級，以及 quality ，可以參考 Exp-Data/levels.json
         max_assign_cnt (int): 最多能指派多少 worker
 
     Return:
-        list of dictionary: 每一個 dictionary 都包含 level_comb, gte_threshold_cnt, expected_revenue 以及 cost
+        level_combs (numpy.ndarray): (組合數, 等級數) 的整數陣列，每一列是一種 level_comb ，像是 (2, 1)
+        costs (numpy.ndarray): 每一種 level_comb 的總花費
     """
-    difficulty = gen_difficulty(task)
-    levels_dict['level1']['true_ratio'] = \
-        ALPHA * levels_dict['level1']['quality'] + (1 - ALPHA) * difficulty
-    levels_dict['level2']['true_ratio'] = \
-        ALPHA * levels_dict['level2']['quality'] + (1 - ALPHA) * difficulty
+    level_names = get_level_names(levels_dict)
+    key = (tuple((level_name, levels_dict[level_name]['cost']) for level_name in level_names), max_assign_cnt)
+    if key in _LEVEL_COMB_TABLES:
+        return _LEVEL_COMB_TABLES[key]
+
+    def gen_partial_combs(level_index, remaining_assign_cnt):
+        if level_index == len(level_names) - 1:
+            yield (remaining_assign_cnt, )
+            return
+        for assign_cnt in range(remaining_assign_cnt + 1):
+            for partial_comb in gen_partial_combs(level_index + 1, remaining_assign_cnt - assign_cnt):
+                yield (assign_cnt, ) + partial_comb
 
-    level1_max_assign_cnt = len(task['answers']['level1'])
-    level2_max_assign_cnt = len(task['answers']['level2'])
     level_combs = list()
     for total_assign_cnt in range(1, max_assign_cnt + 1):
-        for level1_assign_cnt in range(total_assign_cnt+1):
-            level2_assign_cnt = total_assign_cnt - level1_assign_cnt
-            if level1_assign_cnt > level1_max_assign_cnt or \
-                level2_assign_cnt > level2_max_assign_cnt:
+        level_combs.extend(gen_partial_combs(0, total_assign_cnt))
+    level_combs = np.array(level_combs, dtype=np.int64).reshape(-1, len(level_names))
+    level_costs = np.array([levels_dict[level_name]['cost'] for level_name in level_names])
+    costs = level_combs.dot(level_costs)
+    level_combs.flags.writeable = False
+    costs.flags.writeable = False
+    _LEVEL_COMB_TABLES[key] = (level_combs, costs)
+    return level_combs, costs
+
+def get_level_max_assign_cnts(tasks, levels_dict):
+    """
+    Args:
+        tasks (list): 有 task 資訊的 dictonary ，可參考 Exp-Data/task.json.
+        levels_dict (dict): worker 的等級，以及 quality ，可以參考 Exp-Data/levels.json
+
+    Return:
+        numpy.ndarray: (task 數, 等級數) 的整數陣列，每個 task 在每個等級最多能指派幾個 worker ，也就是該等級的回答數
+    """
+    level_names = get_level_names(levels_dict)
+    return np.array([[len(task['answers'].get(level_name, list())) for level_name in level_names]
+                     for task in tasks], dtype=np.int64).reshape(-1, len(level_names))
+
+def get_answer_cnts(task_ids, levels_dict, tasks_answer_dict):
+    """
+    gen_true_confs 只需要每個等級的回答數跟回答 true 的數量，不需要整份回答。
+
+    Args:
+        task_ids (list): task id
+        levels_dict (dict): worker 的等級，以及 quality ，可以參考 Exp-Data/levels.json
+        tasks_answer_dict (dict): 在真正的 Crowdsourcing 中， level1 及 level2 worker 的回答，可參考 Exp-Data/answers.json
+
+    Return:
+        answer_cnts (numpy.ndarray): (task 數, 等級數) ，每個等級的回答數
+        answer_true_cnts (numpy.ndarray): (task 數, 等級數) ，每個等級回答 true 的數量
+    """
+    level_names = get_level_names(levels_dict)
+    answer_cnts = np.zeros((len(task_ids), len(level_names)), dtype=np.int64)
+    answer_true_cnts = np.zeros((len(task_ids), len(level_names)), dtype=np.int64)
+    for task_index, task_id in enumerate(task_ids):
+        for level_index, level_name in enumerate(level_names):
+            answers = tasks_answer_dict[task_id].get(level_name, list())
+            answer_cnts[task_index, level_index] = len(answers)
+            answer_true_cnts[task_index, level_index] = len([answer for answer in answers if answer['option'] is True])
+    return answer_cnts, answer_true_cnts
+
+def gen_max_reachable_confidences(pre_confidences, level_max_assign_cnts, levels_dict, max_assign_cnt):
+    """
+    每個 task 最多能到達的 confidence ：所有 worker 都回答 true 時， quality 越高的 worker 讓 confidence 上升越多，
+    所以從 quality 最高的等級開始，在每個等級的回答數限制下指派到 max_assign_cnt 個 worker 。
+    等級的排序只跟 levels_dict 有關，每個 task 只要依序走過每個等級一次。
+
+    Args:
+        pre_confidences (numpy.ndarray): 每個 task 的 pre-confidence
+        level_max_assign_cnts (numpy.ndarray): get_level_max_assign_cnts 算出來每個 task 在每個等級最多能指派幾個 worker
+        levels_dict (dict): worker 的等級，以及 quality ，可以參考 Exp-Data/levels.json
+        max_assign_cnt (int): 最多能指派多少 worker
+
+    Return:
+        numpy.ndarray: 每個 task 最多能到達的 confidence
+    """
+    level_qualities = np.array([levels_dict[level_name]['quality'] for level_name in get_level_names(levels_dict)])
+    level_qualities = np.clip(level_qualities, 1e-12, 1 - 1e-12)
+    level_weights = np.log(level_qualities / (1 - level_qualities))
+    level_max_assign_cnts = np.asarray(level_max_assign_cnts).reshape(-1, len(level_weights))
+
+    max_log_odds_gains = np.zeros(len(level_max_assign_cnts))
+    remaining_cnts = np.full(len(level_max_assign_cnts), max_assign_cnt)
+    for level_index in np.argsort(-level_weights, kind='stable'):
+        if level_weights[level_index] <= 0:
+            break
+        assign_cnts = np.minimum(remaining_cnts, level_max_assign_cnts[:, level_index])
+        max_log_odds_gains += assign_cnts * level_weights[level_index]
+        remaining_cnts -= assign_cnts
+
+    true_conf_direct = np.asarray(pre_confidences, dtype=float)
+    false_conf_direct = (1 - true_conf_direct) * np.exp(-max_log_odds_gains)
+    return true_conf_direct / (true_conf_direct + false_conf_direct)
+
+def gen_drop_reason(max_reachable_confidence):
+    """
+    drop_hopeless_tasks 去掉 task 的原因。
+
+    Args:
+        max_reachable_confidence (float): gen_max_reachable_confidences 的結果
+
+    Return:
+        str: drop_reason
+    """
+    return "max reachable confidence %f < THRESHOLD" % max_reachable_confidence
+
+def drop_hopeless_tasks(tasks, levels_dict, max_assign_cnt, level_max_assign_cnts=None):
+    """
+    把不管怎麼指派 worker 都到不了 THRESHOLD 的 task 去掉 (gen_max_reachable_confidences 小於 THRESHOLD)，
+    這些 task 的每一種 worker 組合 revenue 期望值都是 0 ，不會被任何 micro 演算法選到，
+    confidence 也不會再改變，所以之後的回合也不用再算。被去掉的 task 會記錄 drop_reason 。
+
+    Args:
+        tasks (list): 有 task 資訊的 dictonary ，可參考 Exp-Data/task.json.
+        levels_dict (dict): worker 的等級，以及 quality ，可以參考 Exp-Data/levels.json
+        max_assign_cnt (int): 最多能指派多少 worker
+        level_max_assign_cnts (numpy.ndarray): get_level_max_assign_cnts 的結果，已經算好的話 (像是 task 表裡的欄位)
+            可以直接給，沒有給的話用 tasks 的 answers 算
+
+    Return:
+        list: 還有機會到達 THRESHOLD 的 task
+    """
+    if level_max_assign_cnts is None:
+        level_max_assign_cnts = get_level_max_assign_cnts(tasks, levels_dict)
+    max_reachable_confidences = gen_max_reachable_confidences( \
+        [task['pre-answer']['confidence'] for task in tasks], level_max_assign_cnts, levels_dict, max_assign_cnt)
+    reachable_tasks = list()
+    for task, max_reachable_confidence in zip(tasks, max_reachable_confidences.tolist()):
+        if max_reachable_confidence < THRESHOLD - 1e-9:
+            task['is_solved'] = False
+            task['drop_reason'] = gen_drop_reason(max_reachable_confidence)
+        else:
+            reachable_tasks.append(task)
+    return reachable_tasks
+
+def gen_true_ratios(difficulties, levels_dict):
+    """
+    Args:
+        difficulties (numpy.ndarray): 每個 task 的 difficulty
+        levels_dict (dict): worker 的等級，以及 quality ，可以參考 Exp-Data/levels.json
+
+    Return:
+        numpy.ndarray: (task 數, 等級數) 的陣列，每個等級的 worker 在每個 task 回答 true 的機率
+    """
+    level_qualities = np.array([levels_dict[level_name]['quality'] for level_name in get_level_names(levels_dict)])
+    difficulties = np.asarray(difficulties, dtype=float)
+    return ALPHA * level_qualities[np.newaxis, :] + (1 - ALPHA) * difficulties[:, np.newaxis]
+
+def gte_threshold_cnts_python(pre_confidences, true_ratios, level_combs, levels_dict, is_available=None, rng=None):
+    """
+    用 Python 迴圈做 Monte Carlo ，每一個 worker 的回答都各自呼叫一次 random.uniform (有給 rng 時是 rng.random) 。
+    速度很慢，保留下來當作 gte_threshold_cnts_numpy 的對照組。
+
+    Args:
+        pre_confidences (numpy.ndarray): 每個 task 的 pre-confidence
+        true_ratios (numpy.ndarray): gen_true_ratios 算出來的每個等級回答 true 的機率
+        level_combs (numpy.ndarray): gen_level_comb_table 產生的 worker 組合
+        levels_dict (dict): worker 的等級，以及 quality ，可以參考 Exp-Data/levels.json
+        is_available (numpy.ndarray): (task 數, 組合數) ，只模擬為 True 的組合，沒有給的話全部都模擬
+        rng (numpy.random.Generator): 亂數產生器，沒有給的話用 random 模組
+
+    Return:
+        numpy.ndarray: (task 數, 組合數) 的陣列，每一種 worker 組合在 MAX_ITERATION 次模擬中， confidence 大於等於 THRESHOLD 的次數
+    """
+    random_float_func = (lambda: random.uniform(0, 1)) if rng is None else rng.random
+    level_names = get_level_names(levels_dict)
+    gte_threshold_cnts = np.zeros((len(pre_confidences), len(level_combs)), dtype=np.int64)
+    for task_index, pre_confidence in enumerate(pre_confidences):
+        for comb_index, level_comb in enumerate(level_combs):
+            if is_available is not None and not is_available[task_index, comb_index]:
                 continue
-            level_comb = level1_assign_cnt * ['level1'] + level2_assign_cnt * ['level2']
-            level_combs.append(level_comb)
 
-    results = list()
+            gte_threshold_cnt = int()
+            for i in range(MAX_ITERATION):
+                true_conf_direct = pre_confidence
+                false_conf_direct = 1 - true_conf_direct
+
+                for level_index, (level_name, assign_cnt) in enumerate(zip(level_names, level_comb)):
+                    true_ratio = true_ratios[task_index, level_index]
+                    for _ in range(assign_cnt):
+                        random_float = random_float_func()
+                        if random_float <= true_ratio:
+                            true_conf_direct = true_conf_direct * levels_dict[level_name]['quality']
+                            false_conf_direct = false_conf_direct * (1 - levels_dict[level_name]['quality'])
+                        else:
+                            true_conf_direct = true_conf_direct * (1 - levels_dict[level_name]['quality'])
+                            false_conf_direct = false_conf_direct * levels_dict[level_name]['quality']
+
+                true_conf = true_conf_direct / (true_conf_direct + false_conf_direct)
+                if true_conf >= THRESHOLD:
+                    gte_threshold_cnt += 1
+            gte_threshold_cnts[task_index, comb_index] = gte_threshold_cnt
+    return gte_threshold_cnts
+
+def sample_gte_threshold_cnts(pre_confidences, true_ratios, level_combs, levels_dict, iteration, rng=None):
+    """
+    Monte Carlo 的核心，第 i 個 pre_confidences 、 true_ratios 、 level_combs 是同一組要模擬的 (task, worker 組合)。
+    一次用 NumPy 抽出 (組數, iteration, 最多 worker 數) 個亂數，當作所有模擬中每一個 worker 的回答，
+    再用陣列運算算出 confidence ，最後一次加總大於等於 THRESHOLD 的次數。
+    組合中不足最多 worker 數的位置，乘上的係數固定為 1 。組數太多時會分批計算，每批最多 CHUNK_SIZE 個亂數。
+
+    Args:
+        pre_confidences (numpy.ndarray): 每一組的 pre-confidence
+        true_ratios (numpy.ndarray): (組數, 等級數) ，每一組每個等級回答 true 的機率
+        level_combs (numpy.ndarray): (組數, 等級數) ，每一組的 worker 組合
+        levels_dict (dict): worker 的等級，以及 quality ，可以參考 Exp-Data/levels.json
+        iteration (int): 每一組模擬幾次
+        rng (numpy.random.Generator): 亂數產生器，沒有給的話用 np.random 的全域狀態
+
+    Return:
+        numpy.ndarray: 每一組在 iteration 次模擬中， confidence 大於等於 THRESHOLD 的次數
+    """
+    if rng is None:
+        rng = np.random
+    gte_threshold_cnts = np.zeros(len(pre_confidences), dtype=np.int64)
+    if len(pre_confidences) == 0:
+        return gte_threshold_cnts
+
+    level_names = get_level_names(levels_dict)
+    level_qualities = np.array([levels_dict[level_name]['quality'] for level_name in level_names])
+
+    # 第 worker_index 個 worker 屬於哪一個等級：前 level_combs[:, 0] 個是第一個等級，以此類推
+    max_comb_len = max(1, int(level_combs.sum(axis=1).max()))
+    worker_indexes = np.arange(max_comb_len)
+    level_ends = np.cumsum(level_combs, axis=1)
+    chunk_size = max(1, CHUNK_SIZE // (iteration * max_comb_len))
+    for start in range(0, len(pre_confidences), chunk_size):
+        end = min(start + chunk_size, len(pre_confidences))
+        worker_levels = np.count_nonzero(worker_indexes[np.newaxis, :, np.newaxis] >= \
+                                         level_ends[start:end, np.newaxis, :], axis=2)
+        is_assigned = (worker_indexes[np.newaxis, :] < level_ends[start:end, -1:])[:, np.newaxis, :]
+        worker_levels = np.minimum(worker_levels, len(level_names) - 1)
+        qualities = level_qualities[worker_levels][:, np.newaxis, :]
+        worker_true_ratios = np.take_along_axis(true_ratios[start:end], worker_levels, axis=1)[:, np.newaxis, :]
+        pre_confidence = np.asarray(pre_confidences[start:end], dtype=float)[:, np.newaxis]
+
+        random_floats = rng.uniform(0, 1, (end - start, iteration, max_comb_len))
+        is_true = random_floats <= worker_true_ratios
+        true_factors = np.where(is_true, qualities, 1 - qualities)
+        false_factors = np.where(is_true, 1 - qualities, qualities)
+        true_conf_direct = pre_confidence * np.prod(np.where(is_assigned, true_factors, 1), axis=2)
+        false_conf_direct = (1 - pre_confidence) * np.prod(np.where(is_assigned, false_factors, 1), axis=2)
+        true_conf = true_conf_direct / (true_conf_direct + false_conf_direct)
+        gte_threshold_cnts[start:end] = np.count_nonzero(true_conf >= THRESHOLD, axis=1)
+    return gte_threshold_cnts
+
+def gte_threshold_cnts_numpy(pre_confidences, true_ratios, level_combs, levels_dict, is_available=None, rng=None):
+    """
+    跟 gte_threshold_cnts_python 一樣的 Monte Carlo ，但是用 sample_gte_threshold_cnts
+    一次模擬所有 task 、所有組合的 MAX_ITERATION 次結果。
+
+    Args:
+        pre_confidences (numpy.ndarray): 每個 task 的 pre-confidence
+        true_ratios (numpy.ndarray): gen_true_ratios 算出來的每個等級回答 true 的機率
+        level_combs (numpy.ndarray): gen_level_comb_table 產生的 worker 組合
+        levels_dict (dict): worker 的等級，以及 quality ，可以參考 Exp-Data/levels.json
+        is_available (numpy.ndarray): (task 數, 組合數) ，只模擬為 True 的組合，沒有給的話全部都模擬
+        rng (numpy.random.Generator): 亂數產生器，沒有給的話用 np.random 的全域狀態
+
+    Return:
+        numpy.ndarray: (task 數, 組合數) 的陣列，每一種 worker 組合在 MAX_ITERATION 次模擬中， confidence 大於等於 THRESHOLD 的次數
+    """
+    gte_threshold_cnts = np.zeros((len(pre_confidences), len(level_combs)), dtype=np.int64)
+    if is_available is None:
+        is_available = np.ones(gte_threshold_cnts.shape, dtype=bool)
+    task_indexes, comb_indexes = np.nonzero(is_available)
+    gte_threshold_cnts[task_indexes, comb_indexes] = sample_gte_threshold_cnts(
+        np.asarray(pre_confidences, dtype=float)[task_indexes], true_ratios[task_indexes], \
+        level_combs[comb_indexes], levels_dict, MAX_ITERATION, rng)
+    return gte_threshold_cnts
+
+def gte_threshold_cnts_adaptive(pre_confidences, true_ratios, level_combs, levels_dict, is_available=None, rng=None):
+    """
+    會自己決定模擬次數的 Monte Carlo 。每一回合對還沒停下來的 (task, worker 組合) 多模擬 ADAPTIVE_BLOCK_SIZE 次，
+    用 Wilson 信賴區間估計 confidence 大於等於 THRESHOLD 的機率，符合下面任一個條件就停止：
+    1. 信賴區間的半寬小於等於 ADAPTIVE_TOLERANCE
+    2. 已經模擬了至少 ADAPTIVE_MIN_DOMINATED_ITERATION 次 (跟一般的 Monte Carlo 一樣多) ，而且信賴區間的上界，
+       比同一個 task 中 cost 不比較高的其他組合的下界還低，這個組合不可能被選到。
+       只模擬一兩個 block 時信賴區間還很寬，估計值可能差很多，不能當成已經收斂
+    3. 已經模擬了 ADAPTIVE_MAX_ITERATION 次
+    幾乎一定會 (或一定不會) 大於等於 THRESHOLD 的組合很快就會停下來，接近的組合則會模擬比較多次。
+
+    Args:
+        pre_confidences (numpy.ndarray): 每個 task 的 pre-confidence
+        true_ratios (numpy.ndarray): gen_true_ratios 算出來的每個等級回答 true 的機率
+        level_combs (numpy.ndarray): gen_level_comb_table 產生的 worker 組合
+        levels_dict (dict): worker 的等級，以及 quality ，可以參考 Exp-Data/levels.json
+        is_available (numpy.ndarray): (task 數, 組合數) ，只模擬為 True 的組合，沒有給的話全部都模擬
+        rng (numpy.random.Generator): 亂數產生器，沒有給的話用 np.random 的全域狀態
+
+    Return:
+        gte_threshold_cnts (numpy.ndarray): (task 數, 組合數) ， confidence 大於等於 THRESHOLD 的次數
+        sample_cnts (numpy.ndarray): (task 數, 組合數) ，每一種 worker 組合模擬了幾次
+    """
+    pre_confidences = np.asarray(pre_confidences, dtype=float)
+    gte_threshold_cnts = np.zeros((len(pre_confidences), len(level_combs)), dtype=np.int64)
+    sample_cnts = np.zeros((len(pre_confidences), len(level_combs)), dtype=np.int64)
+    if is_available is None:
+        is_available = np.ones(gte_threshold_cnts.shape, dtype=bool)
+
+    level_costs = np.array([levels_dict[level_name]['cost'] for level_name in get_level_names(levels_dict)])
+    comb_order_by_cost = np.argsort(level_combs.dot(level_costs), kind='stable')
+    is_active = is_available.copy()
+    while np.any(is_active):
+        task_indexes, comb_indexes = np.nonzero(is_active)
+        gte_threshold_cnts[task_indexes, comb_indexes] += sample_gte_threshold_cnts(
+            pre_confidences[task_indexes], true_ratios[task_indexes], \
+            level_combs[comb_indexes], levels_dict, ADAPTIVE_BLOCK_SIZE, rng)
+        sample_cnts[task_indexes, comb_indexes] += ADAPTIVE_BLOCK_SIZE
+
+        n = np.maximum(sample_cnts, 1)
+        probs = gte_threshold_cnts / n
+        z2 = ADAPTIVE_Z ** 2
+        centers = (probs + z2 / (2 * n)) / (1 + z2 / n)
+        half_widths = ADAPTIVE_Z / (1 + z2 / n) * np.sqrt(probs * (1 - probs) / n + z2 / (4 * n ** 2))
+        lower_bounds = np.where(is_available, centers - half_widths, 0)
+        upper_bounds = centers + half_widths
+
+        # 依 cost 排序後，排在前面 (cost 不比較高) 的組合中最大的下界
+        cheaper_lower_bounds = np.zeros(lower_bounds.shape)
+        cheaper_lower_bounds[:, comb_order_by_cost[1:]] = \
+            np.maximum.accumulate(lower_bounds[:, comb_order_by_cost], axis=1)[:, :-1]
+
+        is_active = is_available & \
+            (half_widths > ADAPTIVE_TOLERANCE) & \
+            ((upper_bounds >= cheaper_lower_bounds) | (sample_cnts < ADAPTIVE_MIN_DOMINATED_ITERATION)) & \
+            (sample_cnts < ADAPTIVE_MAX_ITERATION)
+    return gte_threshold_cnts, sample_cnts
+
+def gen_outcome_table(levels_dict, max_assign_cnt):
+    """
+    列出 gen_level_comb_table 的每一種 worker 組合所有可能的回答結果，也就是每個等級各有幾個 worker 回答 true 。
+    同一個組合的結果排在一起，同一個 levels_dict 跟 max_assign_cnt 只會算一次，
+    只要其中幾個組合時用 select_outcome_table 取出來，所以 cache 的大小不會隨著要算的組合而增加。
+
+    Args:
+        levels_dict (dict): worker 的等級，以及 quality ，可以參考 Exp-Data/levels.json
+        max_assign_cnt (int): 最多能指派多少 worker
+
+    Return:
+        dict: 包含
+            comb_starts: 每一種組合的第一個結果是第幾個
+            comb_outcome_cnts: 每一種組合有幾個結果
+            assign_cnts: (結果數, 等級數) ，結果所屬組合每個等級的 worker 數
+            true_cnts: (結果數, 等級數) ，每個等級回答 true 的 worker 數
+            true_factors: 每個結果 true_conf_direct 要乘上的係數
+            false_factors: 每個結果 false_conf_direct 要乘上的係數
+    """
+    level_names = get_level_names(levels_dict)
+    level_qualities = np.array([levels_dict[level_name]['quality'] for level_name in level_names])
+    key = (tuple(zip(level_names, level_qualities.tolist())), max_assign_cnt)
+    if key in _OUTCOME_TABLES:
+        return _OUTCOME_TABLES[key]
+
+    level_combs, _ = gen_level_comb_table(levels_dict, max_assign_cnt)
+    comb_starts = list()
+    assign_cnts = list()
+    true_cnts = list()
     for level_comb in level_combs:
-        gte_threshold_cnt = int()
-        cost_sum = int()
-        for level_name in level_comb:
-            cost_sum += levels_dict[level_name]['cost']
-
-        for i in range(MAX_ITERATION):
-            true_conf_direct = task['pre-answer']['confidence']
-            false_conf_direct = 1 - true_conf_direct
-
-            for level_name in level_comb:
-                true_ratio = levels_dict[level_name]['true_ratio']
-                random_float = random.uniform(0, 1)
-                if random_float <= true_ratio:
-                    true_conf_direct = true_conf_direct * levels_dict[level_name]['quality']
-                    false_conf_direct = false_conf_direct * (1 - levels_dict[level_name]['quality'])
-                else:
-                    true_conf_direct = true_conf_direct * (1 - levels_dict[level_name]['quality'])
-                    false_conf_direct = false_conf_direct * levels_dict[level_name]['quality']
-
-            true_conf = true_conf_direct / (true_conf_direct + false_conf_direct)
-            if true_conf >= THRESHOLD:
-                gte_threshold_cnt += 1
-
-        expected_revenue = gte_threshold_cnt / MAX_ITERATION * task['revenue']
+        comb_starts.append(len(true_cnts))
+        comb_true_cnts = np.indices(tuple(level_comb + 1)).reshape(len(level_names), -1).T
+        true_cnts.extend(comb_true_cnts.tolist())
+        assign_cnts.extend([level_comb.tolist()] * len(comb_true_cnts))
+    assign_cnts = np.array(assign_cnts, dtype=np.int64).reshape(-1, len(level_names))
+    true_cnts = np.array(true_cnts, dtype=np.int64).reshape(-1, len(level_names))
+    false_cnts = assign_cnts - true_cnts
+
+    outcome_table = {
+        'comb_starts': np.array(comb_starts, dtype=np.int64),
+        'comb_outcome_cnts': np.prod(level_combs + 1, axis=1),
+        'assign_cnts': assign_cnts,
+        'true_cnts': true_cnts,
+        'true_factors': np.prod(level_qualities ** true_cnts * (1 - level_qualities) ** false_cnts, axis=1),
+        'false_factors': np.prod((1 - level_qualities) ** true_cnts * level_qualities ** false_cnts, axis=1)
+    }
+    _OUTCOME_TABLES[key] = outcome_table
+    return outcome_table
+
+def select_outcome_table(outcome_table, comb_indexes):
+    """
+    從 gen_outcome_table 的表取出 comb_indexes 這幾個組合的結果，組成一樣格式的表。
+
+    Args:
+        outcome_table (dict): gen_outcome_table 的結果
+        comb_indexes (numpy.ndarray): gen_level_comb_table 中的第幾個組合
+
+    Return:
+        dict: 跟 gen_outcome_table 相同格式，組合的順序跟 comb_indexes 相同
+    """
+    comb_outcome_cnts = outcome_table['comb_outcome_cnts'][comb_indexes]
+    comb_starts = np.concatenate(([0], np.cumsum(comb_outcome_cnts)[:-1])).astype(np.int64)
+    # 第 i 個組合的結果在原本的表是 comb_starts[comb_indexes[i]] 開始連續 comb_outcome_cnts[i] 個
+    outcome_indexes = np.repeat(outcome_table['comb_starts'][comb_indexes] - comb_starts, comb_outcome_cnts) + \
+        np.arange(comb_outcome_cnts.sum())
+    return {
+        'comb_starts': comb_starts,
+        'comb_outcome_cnts': comb_outcome_cnts,
+        'assign_cnts': outcome_table['assign_cnts'][outcome_indexes],
+        'true_cnts': outcome_table['true_cnts'][outcome_indexes],
+        'true_factors': outcome_table['true_factors'][outcome_indexes],
+        'false_factors': outcome_table['false_factors'][outcome_indexes]
+    }
+
+def gen_binomial_pmfs(true_ratios, max_comb_len):
+    """
+    每個 task 每個等級回答 true 人數的二項分布機率表。
+
+    Args:
+        true_ratios (numpy.ndarray): gen_true_ratios 算出來的每個等級回答 true 的機率
+        max_comb_len (int): 一個等級最多幾個 worker
+
+    Return:
+        numpy.ndarray: binomial_pmfs[task, level, n, k] 是 n 個 worker 中有 k 個回答 true 的機率
+    """
+    true_ratios = np.asarray(true_ratios)[:, :, np.newaxis]
+    binomial_pmfs = np.zeros(true_ratios.shape[:2] + (max_comb_len + 1, max_comb_len + 1))
+    binomial_pmfs[:, :, 0, 0] = 1
+    for n in range(1, max_comb_len + 1):
+        binomial_pmfs[:, :, n, :] = binomial_pmfs[:, :, n-1, :] * (1 - true_ratios)
+        binomial_pmfs[:, :, n, 1:] += binomial_pmfs[:, :, n-1, :-1] * true_ratios
+    return binomial_pmfs
+
+def gte_threshold_probs_exact(pre_confidences, true_ratios, levels_dict, max_assign_cnt, comb_indexes=None):
+    """
+    不做 Monte Carlo ，直接算出每一種 worker 組合的 confidence 大於等於 THRESHOLD 的機率。
+    組合最後的 confidence 只跟每個 level 有幾個 worker 回答 true 有關，
+    每個 level 回答 true 的人數是以 true_ratio 為機率的二項分布，
+    所以把所有 (每個 level 回答 true 的人數) 的情況列出來，把 confidence 大於等於 THRESHOLD 的機率加總即可。
+    每個 level 的二項分布機率表對所有組合只算一次，讓有相同人數的組合共用。
+
+    Args:
+        pre_confidences (numpy.ndarray): 每個 task 的 pre-confidence
+        true_ratios (numpy.ndarray): gen_true_ratios 算出來的每個等級回答 true 的機率
+        levels_dict (dict): worker 的等級，以及 quality ，可以參考 Exp-Data/levels.json
+        max_assign_cnt (int): 最多能指派多少 worker
+        comb_indexes (numpy.ndarray): 只算 gen_level_comb_table 中的這幾個組合，沒有給的話全部都算
+
+    Return:
+        numpy.ndarray: (task 數, 組合數) 的陣列，每一種 worker 組合的 confidence 大於等於 THRESHOLD 的機率
+    """
+    level_combs, _ = gen_level_comb_table(levels_dict, max_assign_cnt)
+    outcome_table = gen_outcome_table(levels_dict, max_assign_cnt)
+    if comb_indexes is not None:
+        level_combs = level_combs[comb_indexes]
+        outcome_table = select_outcome_table(outcome_table, comb_indexes)
+
+    gte_threshold_probs = np.zeros((len(pre_confidences), len(level_combs)))
+    if len(pre_confidences) == 0 or len(level_combs) == 0:
+        return gte_threshold_probs
+
+    max_comb_len = int(level_combs.sum(axis=1).max())
+    outcome_cnt = len(outcome_table['true_cnts'])
+
+    chunk_task_cnt = max(1, CHUNK_SIZE // outcome_cnt)
+    for start in range(0, len(pre_confidences), chunk_task_cnt):
+        end = min(start + chunk_task_cnt, len(pre_confidences))
+        pre_confidence = np.asarray(pre_confidences[start:end], dtype=float)[:, np.newaxis]
+
+        binomial_pmfs = gen_binomial_pmfs(true_ratios[start:end], max_comb_len)
+        outcome_probs = np.ones((end - start, outcome_cnt))
+        for level_index in range(level_combs.shape[1]):
+            outcome_probs *= binomial_pmfs[:, level_index, outcome_table['assign_cnts'][:, level_index], \
+                                           outcome_table['true_cnts'][:, level_index]]
+
+        true_conf_direct = pre_confidence * outcome_table['true_factors']
+        false_conf_direct = (1 - pre_confidence) * outcome_table['false_factors']
+        true_conf = true_conf_direct / (true_conf_direct + false_conf_direct)
+        gte_threshold_probs[start:end] = np.add.reduceat(
+            np.where(true_conf >= THRESHOLD, outcome_probs, 0), outcome_table['comb_starts'], axis=1)
+    return gte_threshold_probs
+
+def gte_threshold_probs_exact_pairs(pre_confidences, true_ratios, levels_dict, max_assign_cnt, comb_indexes):
+    """
+    跟 gte_threshold_probs_exact 一樣，但每個 task 只算一種組合：第 i 個 task 只算 comb_indexes[i] 。
+    每個 task 要的組合不一樣時 (像是 lazy_best_results) ，只要算一次，不用每種組合各算一次。
+
+    Args:
+        pre_confidences (numpy.ndarray): 每個 task 的 pre-confidence
+        true_ratios (numpy.ndarray): gen_true_ratios 算出來的每個等級回答 true 的機率
+        levels_dict (dict): worker 的等級，以及 quality ，可以參考 Exp-Data/levels.json
+        max_assign_cnt (int): 最多能指派多少 worker
+        comb_indexes (numpy.ndarray): 每個 task 要算 gen_level_comb_table 中的第幾個組合
+
+    Return:
+        numpy.ndarray: 每個 task 的組合 confidence 大於等於 THRESHOLD 的機率
+    """
+    level_combs, _ = gen_level_comb_table(levels_dict, max_assign_cnt)
+    outcome_table = gen_outcome_table(levels_dict, max_assign_cnt)
+    comb_indexes = np.asarray(comb_indexes, dtype=np.int64)
+    gte_threshold_probs = np.zeros(len(comb_indexes))
+    if len(comb_indexes) == 0:
+        return gte_threshold_probs
+
+    max_comb_len = int(level_combs.sum(axis=1).max())
+    comb_outcome_cnts = outcome_table['comb_outcome_cnts'][comb_indexes]
+    chunk_task_cnt = max(1, CHUNK_SIZE // int(comb_outcome_cnts.max()))
+    for start in range(0, len(comb_indexes), chunk_task_cnt):
+        end = min(start + chunk_task_cnt, len(comb_indexes))
+        chunk_outcome_cnts = comb_outcome_cnts[start:end]
+        outcome_starts = np.concatenate(([0], np.cumsum(chunk_outcome_cnts)[:-1]))
+        # 第 i 個 task 的結果在 outcome_table 是 comb_starts[comb_indexes[i]] 開始連續 chunk_outcome_cnts[i] 個
+        outcome_task_indexes = np.repeat(np.arange(end - start), chunk_outcome_cnts)
+        outcome_indexes = np.repeat(outcome_table['comb_starts'][comb_indexes[start:end]] - outcome_starts, \
+                                    chunk_outcome_cnts) + np.arange(chunk_outcome_cnts.sum())
+
+        binomial_pmfs = gen_binomial_pmfs(true_ratios[start:end], max_comb_len)
+        outcome_probs = np.ones(len(outcome_indexes))
+        for level_index in range(level_combs.shape[1]):
+            outcome_probs *= binomial_pmfs[outcome_task_indexes, level_index, \
+                                           outcome_table['assign_cnts'][outcome_indexes, level_index], \
+                                           outcome_table['true_cnts'][outcome_indexes, level_index]]
+
+        pre_confidence = np.asarray(pre_confidences[start:end], dtype=float)[outcome_task_indexes]
+        true_conf_direct = pre_confidence * outcome_table['true_factors'][outcome_indexes]
+        false_conf_direct = (1 - pre_confidence) * outcome_table['false_factors'][outcome_indexes]
+        true_conf = true_conf_direct / (true_conf_direct + false_conf_direct)
+        gte_threshold_probs[start:end] = np.add.reduceat(np.where(true_conf >= THRESHOLD, outcome_probs, 0), \
+                                                         outcome_starts)
+    return gte_threshold_probs
+
+GTE_THRESHOLD_CNTS_METHODS = {
+    'python': gte_threshold_cnts_python,
+    'numpy': gte_threshold_cnts_numpy
+}
+
+_THRESHOLD_TABLES = dict()
+
+def get_threshold_table_key(levels_dict, max_assign_cnt):
+    """
+    threshold table 只有在 worker 等級、 quality 、 cost 、 max_assign_cnt 、 ALPHA 以及 THRESHOLD 都相同時才能共用。
+
+    Args:
+        levels_dict (dict): worker 的等級，以及 quality ，可以參考 Exp-Data/levels.json
+        max_assign_cnt (int): 最多能指派多少 worker
+
+    Return:
+        tuple: 可以當作 dictionary key 的 tuple
+    """
+    return (tuple((level_name, levels_dict[level_name]['quality'], levels_dict[level_name]['cost'])
+                  for level_name in get_level_names(levels_dict)), max_assign_cnt, ALPHA, THRESHOLD)
+
+def register_threshold_table(levels_dict, max_assign_cnt, threshold_table, exact_cells=None):
+    """
+    登記 threshold table ，之後 method='table' 時會用它查表，請參考 threshold_table.py 。
+
+    Args:
+        levels_dict (dict): worker 的等級，以及 quality ，可以參考 Exp-Data/levels.json
+        max_assign_cnt (int): 最多能指派多少 worker
+        threshold_table (numpy.ndarray): (pre-confidence 格數, difficulty 格數, 組合數) 的機率表，
+            pre-confidence 跟 difficulty 都是 0 ~ 1 平均切割
+        exact_cells (numpy.ndarray): (pre-confidence 格數 - 1, difficulty 格數 - 1) 的 bool 陣列，
+            落在 True 的格子裡的 task 不內插，改用 gte_threshold_probs_exact ，沒有給的話全部都內插
+    """
+    level_combs, _ = gen_level_comb_table(levels_dict, max_assign_cnt)
+    if threshold_table.ndim != 3 or threshold_table.shape[2] != len(level_combs):
+        raise ValueError("threshold table shape %s does not match %d level combinations" % \
+                         (threshold_table.shape, len(level_combs)))
+    if exact_cells is None:
+        exact_cells = np.zeros((threshold_table.shape[0] - 1, threshold_table.shape[1] - 1), dtype=bool)
+    if exact_cells.shape != (threshold_table.shape[0] - 1, threshold_table.shape[1] - 1):
+        raise ValueError("exact cells shape %s does not match threshold table shape %s" % \
+                         (exact_cells.shape, threshold_table.shape))
+    _THRESHOLD_TABLES[get_threshold_table_key(levels_dict, max_assign_cnt)] = (threshold_table, exact_cells)
+
+def gen_grid_weights(values, grid_cnt):
+    """
+    0 ~ 1 平均切成 grid_cnt 個點時，每個值落在哪一格，以及內插時右邊那個點的權重。
+
+    Args:
+        values (numpy.ndarray): 0 ~ 1 之間的值
+        grid_cnt (int): 點的個數
+
+    Return:
+        lower_indexes (numpy.ndarray): 左邊的點，也就是第幾格
+        upper_indexes (numpy.ndarray): 右邊的點
+        upper_weights (numpy.ndarray): (值的個數, 1) ，右邊的點的權重
+    """
+    positions = np.clip(np.asarray(values, dtype=float), 0, 1) * (grid_cnt - 1)
+    lower_indexes = np.minimum(np.floor(positions).astype(np.int64), max(grid_cnt - 2, 0))
+    upper_weights = positions - lower_indexes
+    return lower_indexes, np.minimum(lower_indexes + 1, grid_cnt - 1), upper_weights[:, np.newaxis]
+
+def interpolate_threshold_table(threshold_table, pre_confidences, difficulties):
+    """
+    以 pre-confidence 跟 difficulty 在表上做雙線性內插。
+
+    Args:
+        threshold_table (numpy.ndarray): register_threshold_table 的表
+        pre_confidences (numpy.ndarray): 每個 task 的 pre-confidence
+        difficulties (numpy.ndarray): 每個 task 的 difficulty
+
+    Return:
+        numpy.ndarray: (task 數, 組合數) 的陣列，內插出來的機率
+    """
+    pre_lower, pre_upper, pre_weights = gen_grid_weights(pre_confidences, threshold_table.shape[0])
+    difficulty_lower, difficulty_upper, difficulty_weights = gen_grid_weights(difficulties, threshold_table.shape[1])
+    gte_threshold_probs = \
+        threshold_table[pre_lower, difficulty_lower] * (1 - pre_weights) * (1 - difficulty_weights) + \
+        threshold_table[pre_lower, difficulty_upper] * (1 - pre_weights) * difficulty_weights + \
+        threshold_table[pre_upper, difficulty_lower] * pre_weights * (1 - difficulty_weights) + \
+        threshold_table[pre_upper, difficulty_upper] * pre_weights * difficulty_weights
+    return np.asarray(gte_threshold_probs, dtype=float)
+
+def gte_threshold_probs_table(pre_confidences, difficulties, levels_dict, max_assign_cnt):
+    """
+    用 register_threshold_table 登記的表，以 pre-confidence 跟 difficulty 做雙線性內插，
+    查出每一種 worker 組合的 confidence 大於等於 THRESHOLD 的機率。
+    落在 exact_cells 的 task (格子裡有大的階梯，內插不準) 改用 gte_threshold_probs_exact 。
+
+    Args:
+        pre_confidences (numpy.ndarray): 每個 task 的 pre-confidence
+        difficulties (numpy.ndarray): 每個 task 的 difficulty
+        levels_dict (dict): worker 的等級，以及 quality ，可以參考 Exp-Data/levels.json
+        max_assign_cnt (int): 最多能指派多少 worker
+
+    Return:
+        numpy.ndarray: (task 數, 組合數) 的陣列，每一種 worker 組合的 confidence 大於等於 THRESHOLD 的機率
+    """
+    key = get_threshold_table_key(levels_dict, max_assign_cnt)
+    if key not in _THRESHOLD_TABLES:
+        raise KeyError("no threshold table registered for these levels and max_assign_cnt %d" % max_assign_cnt)
+    threshold_table, exact_cells = _THRESHOLD_TABLES[key]
+
+    pre_confidences = np.asarray(pre_confidences, dtype=float)
+    difficulties = np.asarray(difficulties, dtype=float)
+    gte_threshold_probs = interpolate_threshold_table(threshold_table, pre_confidences, difficulties)
+    is_exact = exact_cells[gen_grid_weights(pre_confidences, threshold_table.shape[0])[0], \
+                           gen_grid_weights(difficulties, threshold_table.shape[1])[0]]
+    if np.any(is_exact):
+        gte_threshold_probs[is_exact] = gte_threshold_probs_exact(pre_confidences[is_exact], \
+            gen_true_ratios(difficulties[is_exact], levels_dict), levels_dict, max_assign_cnt)
+    return gte_threshold_probs
+
+MICRO_METHOD = 'exact'
+
+def micro_optimization_batch(pre_confidences, revenues, difficulties, levels_dict, max_assign_cnt, \
+                             level_max_assign_cnts=None, method=None, comb_indexes=None, rng=None):
+    """
+    一次算出一整個回合所有 task 在每一種 worker 組合下的 revenue 期望值。
+    worker 組合跟花費由 gen_level_comb_table 產生，只會算一次。
+
+    Args:
+        pre_confidences (numpy.ndarray): 每個 task 的 pre-confidence
+        revenues (numpy.ndarray): 每個 task 的 revenue
+        difficulties (numpy.ndarray): 每個 task 的 difficulty ，可以用 gen_difficulties 產生
+        levels_dict (dict): worker 的等級，以及 quality ，可以參考 Exp-Data/levels.json
+        max_assign_cnt (int): 最多能指派多少 worker
+        level_max_assign_cnts (numpy.ndarray): get_level_max_assign_cnts 算出來每個 task 在每個等級最多能指派幾個 worker ，
+            沒有給的話就不限制
+        method (str): 'exact' 直接算出機率， 'numpy' 或 'python' 則是做 MAX_ITERATION 次 Monte Carlo ，
+            'adaptive' 則是用 gte_threshold_cnts_adaptive 自己決定模擬次數， 'table' 是查 register_threshold_table 登記的表，
+            沒有給的話使用 MICRO_METHOD
+        comb_indexes (numpy.ndarray): 只算 gen_level_comb_table 中的這幾個組合，沒有給的話全部都算
+        rng (numpy.random.Generator): Monte Carlo 用的亂數產生器，沒有給的話用全域狀態
+
+    Return:
+        dict: 包含
+            level_combs: (組合數, 等級數) ，所有的 worker 組合 (有給 comb_indexes 時只有那幾個)
+            costs: 每一種 worker 組合的總花費
+            is_available: (task 數, 組合數) ，task 是否有足夠的回答可以指派這個組合
+            gte_threshold_cnts: (task 數, 組合數) ，在 sample_cnts 次模擬中 confidence 大於等於 THRESHOLD 的次數，
+                'exact' 跟 'table' 是 MAX_ITERATION 次中的期望次數
+            gte_threshold_probs: (task 數, 組合數) ， confidence 大於等於 THRESHOLD 的機率
+            expected_revenues: (task 數, 組合數) ， revenue 期望值，不能指派的組合為 0
+            sample_cnts: (task 數, 組合數) ，模擬了幾次， 'exact' 跟 'table' 為 0
+            std_errors: (task 數, 組合數) ， expected_revenues 的標準誤， 'exact' 跟 'table' 為 0
+    """
+    if method is None:
+        method = MICRO_METHOD
+
+    pre_confidences = np.asarray(pre_confidences, dtype=float)
+    revenues = np.asarray(revenues, dtype=float)
+    level_combs, costs = gen_level_comb_table(levels_dict, max_assign_cnt)
+    if comb_indexes is not None:
+        level_combs = level_combs[comb_indexes]
+        costs = costs[comb_indexes]
+    true_ratios = gen_true_ratios(difficulties, levels_dict)
+    if level_max_assign_cnts is None:
+        is_available = np.ones((len(pre_confidences), len(level_combs)), dtype=bool)
+    else:
+        is_available = np.all(level_combs[np.newaxis, :, :] <= \
+                              np.asarray(level_max_assign_cnts)[:, np.newaxis, :], axis=2)
+
+    if method in ('exact', 'table'):
+        if method == 'exact':
+            gte_threshold_probs = gte_threshold_probs_exact(pre_confidences, true_ratios, levels_dict, \
+                                                            max_assign_cnt, comb_indexes)
+        else:
+            gte_threshold_probs = gte_threshold_probs_table(pre_confidences, difficulties, levels_dict, max_assign_cnt)
+            if comb_indexes is not None:
+                gte_threshold_probs = gte_threshold_probs[:, comb_indexes]
+        gte_threshold_cnts = gte_threshold_probs * MAX_ITERATION
+        sample_cnts = np.zeros(gte_threshold_probs.shape, dtype=np.int64)
+    else:
+        if method == 'adaptive':
+            gte_threshold_cnts, sample_cnts = gte_threshold_cnts_adaptive(
+                pre_confidences, true_ratios, level_combs, levels_dict, is_available, rng)
+        else:
+            gte_threshold_cnts = GTE_THRESHOLD_CNTS_METHODS[method](
+                pre_confidences, true_ratios, level_combs, levels_dict, is_available, rng)
+            sample_cnts = np.where(is_available, MAX_ITERATION, 0)
+        gte_threshold_probs = gte_threshold_cnts / np.maximum(sample_cnts, 1)
+
+    expected_revenues = np.where(is_available, gte_threshold_probs * revenues[:, np.newaxis], 0)
+    clipped_probs = np.clip(gte_threshold_probs, 0, 1)
+    std_errors = np.sqrt(clipped_probs * (1 - clipped_probs) / np.maximum(sample_cnts, 1)) * \
+        np.where(sample_cnts > 0, revenues[:, np.newaxis], 0)
+    return {
+        'level_combs': level_combs,
+        'costs': costs,
+        'is_available': is_available,
+        'gte_threshold_cnts': gte_threshold_cnts,
+        'gte_threshold_probs': gte_threshold_probs,
+        'expected_revenues': expected_revenues,
+        'sample_cnts': sample_cnts,
+        'std_errors': std_errors
+    }
+
+def batch_to_results(batch, task_index):
+    """
+    把 micro_optimization_batch 結果中的一個 task 轉成 micro_optimization 的格式，只會列出能指派的 worker 組合。
+
+    Args:
+        batch (dict): micro_optimization_batch 的結果
+        task_index (int): 第幾個 task
+
+    Return:
+        list of dictionary: 每一個 dictionary 都包含 level_comb, gte_threshold_cnt, gte_threshold_prob, expected_revenue,
+            cost, sample_cnt 以及 std_error
+    """
+    results = list()
+    comb_indexes = np.flatnonzero(batch['is_available'][task_index])
+    for level_comb, cost_sum, gte_threshold_cnt, gte_threshold_prob, expected_revenue, sample_cnt, std_error in zip(
+            map(tuple, batch['level_combs'][comb_indexes].tolist()),
+            batch['costs'][comb_indexes].tolist(),
+            batch['gte_threshold_cnts'][task_index, comb_indexes].tolist(),
+            batch['gte_threshold_probs'][task_index, comb_indexes].tolist(),
+            batch['expected_revenues'][task_index, comb_indexes].tolist(),
+            batch['sample_cnts'][task_index, comb_indexes].tolist(),
+            batch['std_errors'][task_index, comb_indexes].tolist()):
         result_dict = {
             "level_comb": level_comb,
             "gte_threshold_cnt": gte_threshold_cnt,
+            "gte_threshold_prob": gte_threshold_prob,
             "expected_revenue": expected_revenue,
-            "cost": cost_sum
+            "cost": cost_sum,
+            "sample_cnt": sample_cnt,
+            "std_error": std_error
         }
         results.append(result_dict)
     return results
 
+def batch_to_tasks_results(batch):
+    """
+    跟每個 task 各呼叫一次 batch_to_results 的結果相同，但每個欄位只轉換一次成 list ，task 多的時候快很多。
+
+    Args:
+        batch (dict): micro_optimization_batch 的結果
+
+    Return:
+        list: 每個 task 的 batch_to_results 結果
+    """
+    level_combs = list(map(tuple, batch['level_combs'].tolist()))
+    costs = batch['costs'].tolist()
+    tasks_results = list()
+    for is_available, gte_threshold_cnts, gte_threshold_probs, expected_revenues, sample_cnts, std_errors in zip(
+            batch['is_available'].tolist(),
+            batch['gte_threshold_cnts'].tolist(),
+            batch['gte_threshold_probs'].tolist(),
+            batch['expected_revenues'].tolist(),
+            batch['sample_cnts'].tolist(),
+            batch['std_errors'].tolist()):
+        tasks_results.append([
+            {
+                "level_comb": level_combs[comb_index],
+                "gte_threshold_cnt": gte_threshold_cnts[comb_index],
+                "gte_threshold_prob": gte_threshold_probs[comb_index],
+                "expected_revenue": expected_revenues[comb_index],
+                "cost": costs[comb_index],
+                "sample_cnt": sample_cnts[comb_index],
+                "std_error": std_errors[comb_index]
+            }
+            for comb_index in range(len(level_combs)) if is_available[comb_index]
+        ])
+    return tasks_results
+
+def gen_micro_cache():
+    """
+    給 gen_tasks_results 用的 cache ，在同一次模擬的每個回合之間共用。
+
+    Return:
+        dict: entries 以 task id 記錄 (pre-confidence, 沒有刪減的 micro_optimization 結果)，
+            hit_cnt 跟 miss_cnt 是沿用跟重算的 task 數
+    """
+    return {
+        'key': None,
+        'entries': dict(),
+        'hit_cnt': 0,
+        'miss_cnt': 0
+    }
+
+def copy_micro_cache(cache):
+    """
+    複製一份 cache ，共用已經算好的結果 (結果只會被讀取) ，但之後各自更新，計數從 0 開始。
+    同一次模擬要比較多個演算法時，先用一份 cache 算好第一回合，再複製給每個演算法。
+
+    Args:
+        cache (dict): gen_micro_cache 的結果
+
+    Return:
+        dict: 新的 cache
+    """
+    return {
+        'key': cache['key'],
+        'entries': dict(cache['entries']),
+        'hit_cnt': 0,
+        'miss_cnt': 0
+    }
+
+def pop_micro_cache_cnts(cache):
+    """
+    回傳 cache 的 hit_cnt 跟 miss_cnt ，並歸零，用來統計每個回合的數量。
+
+    Args:
+        cache (dict): gen_micro_cache 的結果
+
+    Return:
+        hit_cnt (int): 沿用的 task 數
+        miss_cnt (int): 重算的 task 數
+    """
+    hit_cnt, miss_cnt = cache['hit_cnt'], cache['miss_cnt']
+    cache['hit_cnt'] = 0
+    cache['miss_cnt'] = 0
+    return hit_cnt, miss_cnt
+
+def gen_tasks_results(tasks, levels_dict, max_assign_cnt, prune='pareto', method=None, cache=None, rng=None):
+    """
+    用 micro_optimization_batch 一次算完所有 task 的 worker 組合，再用 prune_results 刪減。
+    有給 cache 時， task 的結果只跟 pre-confidence 以及 difficulty 有關 (revenue 跟回答數不會變)，
+    所以 pre-confidence 跟上次一樣的 task 直接沿用上次的結果 (也就沿用上次抽到的 difficulty ，
+    把 difficulty 當成 task 固定的性質)，只有 pre-confidence 改變的 task 才重新抽 difficulty 並計算。
+    levels_dict 、 max_assign_cnt 或 method 跟上次不同時整個 cache 會清空。
+
+    Args:
+        tasks (list): 有 task 資訊的 dictonary ，可參考 Exp-Data/task.json.
+        levels_dict (dict): worker 的等級，以及 quality ，可以參考 Exp-Data/levels.json
+        max_assign_cnt (int): 最多能指派多少 worker
+        prune (str): 傳給 prune_results ，預設只留下 Pareto frontier 上的 worker 組合
+        method (str): 傳給 micro_optimization_batch ，沒有給的話使用 MICRO_METHOD
+        cache (dict): gen_micro_cache 的結果，沒有給的話每個 task 都重新計算
+        rng (numpy.random.Generator): 抽 difficulty 跟 Monte Carlo 用的亂數產生器，沒有給的話用全域狀態
+
+    Return:
+        list: 每個 task 的 micro_optimization 結果
+    """
+    if method is None:
+        method = MICRO_METHOD
+
+    tasks_results = [None] * len(tasks)
+    dirty_task_indexes = list(range(len(tasks)))
+    if cache is not None:
+        key = (get_threshold_table_key(levels_dict, max_assign_cnt), method)
+        if cache['key'] != key:
+            cache['key'] = key
+            cache['entries'] = dict()
+
+        dirty_task_indexes = list()
+        for task_index, task in enumerate(tasks):
+            entry = cache['entries'].get(task['id'])
+            if entry is not None and entry[0] == task['pre-answer']['confidence']:
+                tasks_results[task_index] = entry[1]
+            else:
+                dirty_task_indexes.append(task_index)
+        cache['hit_cnt'] += len(tasks) - len(dirty_task_indexes)
+        cache['miss_cnt'] += len(dirty_task_indexes)
+
+    dirty_tasks = [tasks[task_index] for task_index in dirty_task_indexes]
+    pre_confidences = [task['pre-answer']['confidence'] for task in dirty_tasks]
+    batch = micro_optimization_batch(pre_confidences, [task['revenue'] for task in dirty_tasks], \
+                                     gen_difficulties(pre_confidences, rng), levels_dict, max_assign_cnt, \
+                                     get_level_max_assign_cnts(dirty_tasks, levels_dict), method, rng=rng)
+    for batch_index, results in enumerate(batch_to_tasks_results(batch)):
+        task_index = dirty_task_indexes[batch_index]
+        tasks_results[task_index] = results
+        if cache is not None:
+            cache['entries'][tasks[task_index]['id']] = (pre_confidences[batch_index], results)
+    return [prune_results(results, prune) for results in tasks_results]
+
+def gen_expected_revenue_upper_bounds(pre_confidences, revenues, true_ratios, level_combs, levels_dict):
+    """
+    不做模擬，直接算出每一種 worker 組合 revenue 期望值的上界。
+    取 log 之後， confidence >= THRESHOLD 等於 S = sum(每個 level 回答 true 的人數 * w) >= needed ，
+    其中 w = log(quality / (1 - quality)) ，
+    needed = (logit(THRESHOLD) - logit(pre_confidence) + sum(每個 level 的人數 * w)) / 2 。
+    所有人都回答 true 也到不了 needed 的組合上界是 0 ；
+    w 都不是負的時 S >= 0 ，用 Markov 不等式 P(S >= needed) <= E[S] / needed ，
+    E[S] = sum(每個 level 的人數 * true_ratio * w) 。
+
+    Args:
+        pre_confidences (numpy.ndarray): 每個 task 的 pre-confidence
+        revenues (numpy.ndarray): 每個 task 的 revenue
+        true_ratios (numpy.ndarray): gen_true_ratios 算出來的每個等級回答 true 的機率
+        level_combs (numpy.ndarray): gen_level_comb_table 產生的 worker 組合
+        levels_dict (dict): worker 的等級，以及 quality ，可以參考 Exp-Data/levels.json
+
+    Return:
+        numpy.ndarray: (task 數, 組合數) 的陣列， revenue 期望值的上界
+    """
+    level_qualities = np.array([levels_dict[level_name]['quality'] for level_name in get_level_names(levels_dict)])
+    level_qualities = np.clip(level_qualities, 1e-12, 1 - 1e-12)
+    level_weights = np.log(level_qualities / (1 - level_qualities))
+    pre_confidences = np.asarray(pre_confidences, dtype=float)[:, np.newaxis]
+    with np.errstate(divide='ignore'):
+        pre_logits = np.log(pre_confidences) - np.log(1 - pre_confidences)
+    neededs = (np.log(THRESHOLD / (1 - THRESHOLD)) - pre_logits + level_combs.dot(level_weights)[np.newaxis, :]) / 2
+    max_sums = level_combs.dot(np.maximum(level_weights, 0))[np.newaxis, :]
+    expected_sums = (true_ratios * level_weights[np.newaxis, :]).dot(level_combs.T)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        markov_bounds = np.where(neededs > 0, expected_sums / neededs, 1)
+    if np.any(level_weights[np.any(level_combs > 0, axis=0)] < 0):
+        markov_bounds = np.ones(markov_bounds.shape)
+    gte_threshold_bounds = np.where(max_sums >= neededs - 1e-9, np.clip(markov_bounds, 0, 1), 0)
+    return gte_threshold_bounds * np.asarray(revenues, dtype=float)[:, np.newaxis]
+
+def gen_order_keys(gte_threshold_probs, costs):
+    """
+    order_results_by_expected_revenue 的順序換成一個整數，越小越前面： gte_threshold_prob 四捨五入到 1 / MAX_ITERATION
+    後越高越前面，一樣時 cost 低的在前面。
+
+    Args:
+        gte_threshold_probs (numpy.ndarray): confidence 大於等於 THRESHOLD 的機率 (或它的上界)
+        costs (numpy.ndarray): 每一種 worker 組合的總花費
+
+    Return:
+        numpy.ndarray: 跟 gte_threshold_probs 一樣大小的整數陣列
+    """
+    rounded_cnts = np.round(np.clip(gte_threshold_probs, 0, 1) * MAX_ITERATION).astype(np.int64)
+    return (MAX_ITERATION - rounded_cnts) * (int(costs.max()) + 1) + costs
+
+def gen_lazy_table(pre_confidences, revenues, difficulties, levels_dict, max_assign_cnt, level_max_assign_cnts=None):
+    """
+    lazy_best_results 用的表：先不模擬，用 gen_expected_revenue_upper_bounds 算出每個 task 每一種組合
+    gte_threshold_prob 的上界 (所有人都回答 true 也到不了 THRESHOLD 的組合是 0) ，換成 gen_order_keys 的上界，
+    模擬過的組合的結果之後都存在表裡。
+
+    Args:
+        pre_confidences (numpy.ndarray): 每個 task 的 pre-confidence
+        revenues (numpy.ndarray): 每個 task 的 revenue
+        difficulties (numpy.ndarray): 每個 task 的 difficulty ，可以用 gen_difficulties 產生
+        levels_dict (dict): worker 的等級，以及 quality ，可以參考 Exp-Data/levels.json
+        max_assign_cnt (int): 最多能指派多少 worker
+        level_max_assign_cnts (numpy.ndarray): get_level_max_assign_cnts 的結果，沒有給的話就不限制
+
+    Return:
+        dict: 包含輸入、每個 task 每一種組合的 bound_keys (不用模擬的組合是 -1) 、跟 micro_optimization_batch
+            一樣的結果欄位 (還沒模擬的是 0) 、 is_evaluated 、模擬過的組合數 evaluated_cnt ，
+            以及 lazy_task_results 存的每個 task 的 best_results
+    """
+    pre_confidences = np.asarray(pre_confidences, dtype=float)
+    revenues = np.asarray(revenues, dtype=float)
+    difficulties = np.asarray(difficulties, dtype=float)
+    level_combs, costs = gen_level_comb_table(levels_dict, max_assign_cnt)
+    gte_threshold_bounds = gen_expected_revenue_upper_bounds(pre_confidences, np.ones(len(pre_confidences)), \
+        gen_true_ratios(difficulties, levels_dict), level_combs, levels_dict)
+    is_candidate = (gte_threshold_bounds > 0) & (revenues[:, np.newaxis] > 0)
+    if level_max_assign_cnts is not None:
+        level_max_assign_cnts = np.asarray(level_max_assign_cnts)
+        is_candidate &= np.all(level_combs[np.newaxis, :, :] <= level_max_assign_cnts[:, np.newaxis, :], axis=2)
+
+    shape = gte_threshold_bounds.shape
+    return {
+        'pre_confidences': pre_confidences,
+        'revenues': revenues,
+        'difficulties': difficulties,
+        'levels_dict': levels_dict,
+        'max_assign_cnt': max_assign_cnt,
+        'level_max_assign_cnts': level_max_assign_cnts,
+        'bound_keys': np.where(is_candidate, gen_order_keys(gte_threshold_bounds, costs), -1),
+        'is_evaluated': np.zeros(shape, dtype=bool),
+        'gte_threshold_cnts': np.zeros(shape),
+        'gte_threshold_probs': np.zeros(shape),
+        'expected_revenues': np.zeros(shape),
+        'sample_cnts': np.zeros(shape, dtype=np.int64),
+        'std_errors': np.zeros(shape),
+        'evaluated_cnt': 0,
+        'best_results': dict()
+    }
+
+def evaluate_lazy_table(lazy_table, task_indexes, comb_indexes, method=None, rng=None):
+    """
+    模擬 (task_indexes[i], comb_indexes[i]) 這些組合，把結果存進 gen_lazy_table 的表。
+    'exact' 用 gte_threshold_probs_exact_pairs 一次算完， 'table' 查完表後取出需要的組合，
+    Monte Carlo 則是同一種組合的 task 一起呼叫一次 micro_optimization_batch 。
+
+    Args:
+        lazy_table (dict): gen_lazy_table 的結果
+        task_indexes (numpy.ndarray): 第幾個 task
+        comb_indexes (numpy.ndarray): gen_level_comb_table 中的第幾個組合
+        method (str): 傳給 micro_optimization_batch ，沒有給的話使用 MICRO_METHOD
+        rng (numpy.random.Generator): 傳給 micro_optimization_batch
+    """
+    if method is None:
+        method = MICRO_METHOD
+
+    levels_dict = lazy_table['levels_dict']
+    max_assign_cnt = lazy_table['max_assign_cnt']
+    if method in ('exact', 'table'):
+        pre_confidences = lazy_table['pre_confidences'][task_indexes]
+        difficulties = lazy_table['difficulties'][task_indexes]
+        if method == 'exact':
+            gte_threshold_probs = gte_threshold_probs_exact_pairs(pre_confidences, \
+                gen_true_ratios(difficulties, levels_dict), levels_dict, max_assign_cnt, comb_indexes)
+        else:
+            gte_threshold_probs = gte_threshold_probs_table(pre_confidences, difficulties, levels_dict, \
+                                                            max_assign_cnt)[np.arange(len(task_indexes)), comb_indexes]
+        lazy_table['gte_threshold_cnts'][task_indexes, comb_indexes] = gte_threshold_probs * MAX_ITERATION
+        lazy_table['gte_threshold_probs'][task_indexes, comb_indexes] = gte_threshold_probs
+        lazy_table['expected_revenues'][task_indexes, comb_indexes] = \
+            gte_threshold_probs * lazy_table['revenues'][task_indexes]
+    else:
+        for comb_index in np.unique(comb_indexes).tolist():
+            comb_task_indexes = task_indexes[comb_indexes == comb_index]
+            level_max_assign_cnts = lazy_table['level_max_assign_cnts']
+            batch = micro_optimization_batch(lazy_table['pre_confidences'][comb_task_indexes], \
+                lazy_table['revenues'][comb_task_indexes], lazy_table['difficulties'][comb_task_indexes], \
+                levels_dict, max_assign_cnt, \
+                level_max_assign_cnts[comb_task_indexes] if level_max_assign_cnts is not None else None, \
+                method, comb_indexes=np.array([comb_index]), rng=rng)
+            for key in ('gte_threshold_cnts', 'gte_threshold_probs', 'expected_revenues', 'sample_cnts', 'std_errors'):
+                lazy_table[key][comb_task_indexes, comb_index] = batch[key][:, 0]
+    lazy_table['is_evaluated'][task_indexes, comb_indexes] = True
+    lazy_table['evaluated_cnt'] += len(task_indexes)
+
+def lazy_best_results(lazy_table, task_indexes, max_cost, method=None, rng=None):
+    """
+    找出每個 task 在 cost 不超過 max_cost 、 expected_revenue 大於 0 的組合中，
+    order_results_by_expected_revenue 排在最前面的組合，只模擬需要的組合。
+    還沒模擬的組合依照 bound_keys 由小到大，每一輪所有還沒決定的 task 各模擬 LAZY_BLOCK_SIZE 個組合
+    (用 evaluate_lazy_table 一起算) ，模擬過的組合中最小的 key 比還沒模擬的組合的 bound_keys 都小時，
+    那個 task 就決定了。 key 一樣時選 expected_revenue 大的，跟 prune='pareto' 之後的順序相同。
+
+    Args:
+        lazy_table (dict): gen_lazy_table 的結果
+        task_indexes (numpy.ndarray): 要找的 task
+        max_cost (int): 組合最多的 cost
+        method (str): 傳給 micro_optimization_batch ，沒有給的話使用 MICRO_METHOD
+        rng (numpy.random.Generator): 傳給 micro_optimization_batch
+
+    Return:
+        list: 每個 task 的 micro_optimization 結果，沒有這樣的組合時是 None
+    """
+    level_combs, costs = gen_level_comb_table(lazy_table['levels_dict'], lazy_table['max_assign_cnt'])
+    no_key = np.iinfo(np.int64).max
+    task_indexes = np.asarray(task_indexes, dtype=np.int64)
+    is_affordable = costs <= max_cost
+    open_task_indexes = task_indexes
+    while len(open_task_indexes) > 0:
+        is_evaluated = lazy_table['is_evaluated'][open_task_indexes]
+        evaluated_keys = np.where(is_evaluated & is_affordable & \
+                                  (lazy_table['expected_revenues'][open_task_indexes] > 0), \
+                                  gen_order_keys(lazy_table['gte_threshold_probs'][open_task_indexes], costs), no_key)
+        bound_keys = lazy_table['bound_keys'][open_task_indexes]
+        bound_keys = np.where(~is_evaluated & is_affordable & (bound_keys >= 0), bound_keys, no_key)
+        min_bound_keys = bound_keys.min(axis=1)
+        is_open = (min_bound_keys < no_key) & (min_bound_keys <= evaluated_keys.min(axis=1))
+        open_task_indexes = open_task_indexes[is_open]
+        bound_keys = bound_keys[is_open]
+
+        block_size = min(LAZY_BLOCK_SIZE, len(costs))
+        block_comb_indexes = np.argpartition(bound_keys, block_size - 1, axis=1)[:, :block_size]
+        is_block = np.take_along_axis(bound_keys, block_comb_indexes, axis=1) < no_key
+        evaluate_lazy_table(lazy_table, np.repeat(open_task_indexes, block_size)[is_block.ravel()], \
+                            block_comb_indexes[is_block], method, rng)
+
+    best_results = list()
+    for task_index in task_indexes.tolist():
+        keys = np.where(lazy_table['is_evaluated'][task_index] & is_affordable & \
+                        (lazy_table['expected_revenues'][task_index] > 0), \
+                        gen_order_keys(lazy_table['gte_threshold_probs'][task_index], costs), no_key)
+        if keys.min() == no_key:
+            best_results.append(None)
+            continue
+        best_comb_indexes = np.flatnonzero(keys == keys.min())
+        comb_index = int(best_comb_indexes[np.argmax(lazy_table['expected_revenues'][task_index, best_comb_indexes])])
+        best_results.append({
+            "level_comb": tuple(level_combs[comb_index].tolist()),
+            "gte_threshold_cnt": float(lazy_table['gte_threshold_cnts'][task_index, comb_index]),
+            "gte_threshold_prob": float(lazy_table['gte_threshold_probs'][task_index, comb_index]),
+            "expected_revenue": float(lazy_table['expected_revenues'][task_index, comb_index]),
+            "cost": int(costs[comb_index]),
+            "sample_cnt": int(lazy_table['sample_cnts'][task_index, comb_index]),
+            "std_error": float(lazy_table['std_errors'][task_index, comb_index])
+        })
+    return best_results
+
+def lazy_task_results(lazy_table, task_index, remaining_budget, method=None, rng=None):
+    """
+    micro_greedy 跟 micro_cp 的 'lazy' ：依序處理 task 時，第 task_index 個 task 用 remaining_budget 買得起、
+    order_results_by_expected_revenue 排在最前面的組合。用 lazy_best_results 一次找好後面 LAZY_TASK_BLOCK_SIZE 個 task
+    在當時預算下的最佳組合，預算只會變少，所以存下來的組合之後還買得起的話仍然是最佳的；
+    買不起時，這個 task 跟後面 LAZY_TASK_BLOCK_SIZE 個 task 中存下來的組合也買不起的，
+    一起用剩下的預算重新找一次 (已經模擬的組合不會再模擬) 。
+
+    Args:
+        lazy_table (dict): gen_lazy_table 的結果， task 的順序就是處理的順序
+        task_index (int): 第幾個 task
+        remaining_budget (int): 剩下的預算
+        method (str): 傳給 micro_optimization_batch ，沒有給的話使用 MICRO_METHOD
+        rng (numpy.random.Generator): 傳給 micro_optimization_batch
+
+    Return:
+        list: 最佳的 micro_optimization 結果，沒有買得起的組合時是空的
+    """
+    best_results = lazy_table['best_results']
+    if task_index not in best_results or \
+            (best_results[task_index] is not None and best_results[task_index]['cost'] > remaining_budget):
+        task_indexes = [next_task_index for next_task_index in \
+                        range(task_index, min(task_index + LAZY_TASK_BLOCK_SIZE, len(lazy_table['pre_confidences']))) \
+                        if next_task_index not in best_results or (best_results[next_task_index] is not None and \
+                                                                   best_results[next_task_index]['cost'] > remaining_budget)]
+        best_results.update(zip(task_indexes, lazy_best_results(lazy_table, task_indexes, remaining_budget, method, rng)))
+    if best_results[task_index] is None:
+        return list()
+    return [best_results[task_index]]
+
+def micro_optimization(task, levels_dict, max_assign_cnt, method=None, difficulty=None, rng=None):
+    """
+    計算 task 在有作多能指派多少 worker 的數量限制下，每一種 worker 組合能得到的 revenue 期望值各是多少。
+    一次要算很多 task 時，請改用 micro_optimization_batch 。
+
+    Args:
+        task (dict): 有 task 資訊的 dictonary ，可參考 Exp-Data/task.json.
+        levels_dict (dict): worker 的等級，以及 quality ，可以參考 Exp-Data/levels.json
+        max_assign_cnt (int): 最多能指派多少 worker
+        method (str): 'exact' 直接算出機率， 'numpy' 或 'python' 則是做 MAX_ITERATION 次 Monte Carlo ，
+            'adaptive' 則是自己決定模擬次數， 'table' 是查表，沒有給的話使用 MICRO_METHOD
+        difficulty (float): task 的 difficulty ，沒有給的話用 gen_difficulty 產生
+        rng (numpy.random.Generator): 抽 difficulty 跟 Monte Carlo 用的亂數產生器，沒有給的話用全域狀態
+
+    Return:
+        list of dictionary: 每一個 dictionary 都包含 level_comb, gte_threshold_cnt, gte_threshold_prob, expected_revenue,
+            cost, sample_cnt 以及 std_error ， level_comb 是每個等級各有幾個 worker 的 tuple ，
+            gte_threshold_cnt 是 sample_cnt 次模擬中的次數 ('exact' 是 MAX_ITERATION 次中的期望次數)
+    """
+    if difficulty is None:
+        difficulty = gen_difficulty(task, rng)
+
+    batch = micro_optimization_batch([task['pre-answer']['confidence']], [task['revenue']], [difficulty], \
+                                     levels_dict, max_assign_cnt, get_level_max_assign_cnts([task], levels_dict), method, \
+                                     rng=rng)
+    return batch_to_results(batch, 0)
+
+def prune_results(results, prune='pareto'):
+    """
+    把被支配的 worker 組合去掉，剩下的組合由 cost 低到高排列。
+    'pareto' 只留下 cost 跟 expected_revenue 的 Pareto frontier ：
+    如果有另一個組合 cost 不比較高， expected_revenue 也不比較低，這個組合就不會被 micro_mckp 、
+    micro_greedy 或 micro_cp 選到 (expected_revenue 為 0 的組合也一樣)，所以去掉後結果不變。
+    'hull' 再進一步只留下 (0, 0) 出發的上凸包，也就是每多花一單位 cost 增加的 expected_revenue 遞減的組合，
+    會去掉一些 Pareto frontier 上的組合，所以 micro_mckp 不一定能找到最佳解。
+
+    Args:
+        results (list): micro_optimization 的結果
+        prune (str): 'pareto' 、 'hull' ，或是 None 代表不做任何刪減
+
+    Return:
+        list of dictionary: 刪減後的 micro_optimization 結果
+    """
+    if prune is None:
+        return results
+
+    # cost 相同時 expected_revenue 高的排前面， expected_revenue 也相同時保留原本的順序
+    results_order_by_cost = sorted(results, key=lambda k: (k['cost'], -k['expected_revenue']))
+    pareto_results = list()
+    max_expected_revenue = 0
+    for result in results_order_by_cost:
+        if result['expected_revenue'] > max_expected_revenue:
+            pareto_results.append(result)
+            max_expected_revenue = result['expected_revenue']
+
+    if prune == 'pareto':
+        return pareto_results
+
+    hull_results = list()
+    for result in pareto_results:
+        while len(hull_results) > 0:
+            last_result = hull_results[-1]
+            if len(hull_results) > 1:
+                prev_cost = hull_results[-2]['cost']
+                prev_expected_revenue = hull_results[-2]['expected_revenue']
+            else:
+                prev_cost = 0
+                prev_expected_revenue = 0
+            # last_result 在 prev 跟 result 連線的下方 (或線上) 時，就不在上凸包上
+            if (last_result['expected_revenue'] - prev_expected_revenue) * (result['cost'] - prev_cost) > \
+                    (result['expected_revenue'] - prev_expected_revenue) * (last_result['cost'] - prev_cost):
+                break
+            hull_results.pop()
+        hull_results.append(result)
+    return hull_results
+
+def order_results_by_expected_revenue(results):
+    """
+    micro_greedy 跟 micro_cp 挑組合的順序： gte_threshold_prob 四捨五入到 1 / MAX_ITERATION (Monte Carlo 的解析度)
+    後由高到低，一樣時 cost 低的在前面。 Monte Carlo 時很多組合都是 MAX_ITERATION 次全部到達 THRESHOLD ，
+    會選其中最便宜的；'exact' 的機率幾乎不會剛好相同，不四捨五入的話會為了多一點點機率選到最貴的組合，
+    兩種 method 的結果就不能比較。
+
+    Args:
+        results (list): 同一個 task 的 micro_optimization 結果
+
+    Return:
+        list of dictionary: 排好順序的 micro_optimization 結果
+    """
+    return sorted(results, key=lambda k: (-round(k['gte_threshold_prob'] * MAX_ITERATION), k['cost']))
+
 if __name__ == '__main__':
     task_file_path = sys.argv[1]
     worker_file_path = sys.argv[2]
@@ -149,9 +1426,15 @@ if __name__ == '__main__':
     with open(worker_file_path, "r") as myfile:
         levels_dict = json.load(myfile)
 
+    pre_confidences = [task['pre-answer']['confidence'] for task in tasks]
+    batch = micro_optimization_batch(pre_confidences, [task['revenue'] for task in tasks], \
+                                     gen_difficulties(pre_confidences), levels_dict, max_assign_cnt, \
+                                     get_level_max_assign_cnts(tasks, levels_dict))
     output_list = list()
-    for task in tasks:
-        results = micro_optimization(task, levels_dict, max_assign_cnt)
+    for task_index, task in enumerate(tasks):
+        results = batch_to_results(batch, task_index)
+        for result in results:
+            result['level_comb'] = level_comb_to_dict(result['level_comb'], levels_dict)
 
         output_dict = {
             "task_id": task['id'],
@@ -0,0 +1,88 @@
+import numpy as np
+
+from micro_optimization import get_level_max_assign_cnts
+
+
+def gen_task_table(tasks, levels_dict):
+    """
+    把 task 轉成每個欄位一個陣列的表，第 i 列是 tasks[i] 。模擬時只有 pre_confidences 、 is_solved 跟 is_active
+    會改變，其他欄位 (包括原本的 task 裡的 answers) 在所有模擬之間共用。
+
+    Args:
+        tasks (list): 有 task 資訊的 dictonary ，可參考 Exp-Data/task.json.
+        levels_dict (dict): worker 的等級，以及 quality ，可以參考 Exp-Data/levels.json
+
+    Return:
+        dict: ids 是 task id 的 list ， id_indexes 是 task id 對應到列， tasks 是原本的 task ，
+            revenues 跟 pre_confidences 是每個 task 的 revenue 跟 pre-confidence ，
+            level_max_assign_cnts 是 get_level_max_assign_cnts 的結果，
+            is_solved 是 confidence 有沒有到 THRESHOLD ， is_active 是下一回合還要不要做
+    """
+    return {
+        'ids': [task['id'] for task in tasks],
+        'id_indexes': dict([(task['id'], task_index) for task_index, task in enumerate(tasks)]),
+        'tasks': tasks,
+        'revenues': np.array([task['revenue'] for task in tasks]),
+        'level_max_assign_cnts': get_level_max_assign_cnts(tasks, levels_dict),
+        'pre_confidences': np.array([task['pre-answer']['confidence'] for task in tasks], dtype=float),
+        'is_solved': np.zeros(len(tasks), dtype=bool),
+        'is_active': np.ones(len(tasks), dtype=bool)
+    }
+
+def copy_task_table(task_table):
+    """
+    開始新的模擬：只複製會改變的 pre_confidences 、 is_solved 跟 is_active ，其他欄位共用。
+
+    Args:
+        task_table (dict): gen_task_table 的結果
+
+    Return:
+        dict: 新的表
+    """
+    new_task_table = dict(task_table)
+    for key in ['pre_confidences', 'is_solved', 'is_active']:
+        new_task_table[key] = task_table[key].copy()
+    return new_task_table
+
+def task_table_to_tasks(task_table, task_indexes):
+    """
+    給 micro 演算法用的 task ，每個 task 只有 id 、 revenue 、 answers (跟原本的 task 共用) 以及 pre-answer ，
+    micro 演算法改的是這些新的 dictonary ，不會改到表或原本的 task 。
+    macro_simulate 每次模擬只呼叫一次，之後每回合沿用同一批 dictonary 。
+
+    Args:
+        task_table (dict): gen_task_table 的結果
+        task_indexes (numpy.ndarray): 要轉換的列
+
+    Return:
+        list: 有 task 資訊的 dictonary
+    """
+    tasks = list()
+    for task_index, pre_confidence in zip(task_indexes.tolist(), task_table['pre_confidences'][task_indexes].tolist()):
+        tasks.append({
+            'id': task_table['ids'][task_index],
+            'revenue': task_table['tasks'][task_index]['revenue'],
+            'answers': task_table['tasks'][task_index]['answers'],
+            'pre-answer': {'confidence': pre_confidence}
+        })
+    return tasks
+
+def update_task_table(task_table, result_tasks):
+    """
+    把 micro 演算法回傳的 task 的 confidence 跟 is_solved 寫回表。
+
+    Args:
+        task_table (dict): gen_task_table 的結果
+        result_tasks (list): micro 演算法回傳的 task
+
+    Return:
+        task_indexes (numpy.ndarray): result_tasks 對應的列
+        pre_confidences (numpy.ndarray): 更新前的 pre-confidence
+        new_confidences (numpy.ndarray): 更新後的 pre-confidence
+    """
+    task_indexes = np.array([task_table['id_indexes'][task['id']] for task in result_tasks], dtype=np.int64)
+    pre_confidences = task_table['pre_confidences'][task_indexes]
+    new_confidences = np.array([task['pre-answer']['confidence'] for task in result_tasks], dtype=float)
+    task_table['pre_confidences'][task_indexes] = new_confidences
+    task_table['is_solved'][task_indexes] = [task['is_solved'] for task in result_tasks]
+    return task_indexes, pre_confidences, new_confidences
@@ -0,0 +1,32 @@
+import numpy as np
+import pytest
+
+from conftest import gen_random_tasks
+from micro_mckp import micro_mckp
+from macro_engine import keepup_policy, gte_threshold_policy, run_macro
+from macro_batch import run_macro_batch
+
+
+MAX_ASSIGN_CNT = 4
+BUDGET = 150
+SIMULATE_CNT = 200
+MAX_ROUND = 3
+
+
+@pytest.mark.parametrize("policy", [keepup_policy(), gte_threshold_policy(uniform_level_names=['level1'])])
+def test_batch_agrees_with_macro_simulate(levels_dict, policy):
+    # 兩邊用亂數的順序不同，同一個 seed 的結果不會完全一樣，但 exact 時模型相同，平均值要很接近
+    tasks, tasks_answer_dict = gen_random_tasks(np.random.default_rng(0), 40)
+    macro_result = run_macro(micro_mckp, policy, tasks, levels_dict, tasks_answer_dict, MAX_ASSIGN_CNT, BUDGET, \
+                             SIMULATE_CNT, MAX_ROUND, seed=1, method='exact')
+    batch_result = run_macro_batch('mckp', policy, tasks, levels_dict, tasks_answer_dict, MAX_ASSIGN_CNT, BUDGET, \
+                                   SIMULATE_CNT, MAX_ROUND, seed=1, method='exact')
+    assert batch_result == run_macro_batch('mckp', policy, tasks, levels_dict, tasks_answer_dict, MAX_ASSIGN_CNT, \
+                                           BUDGET, SIMULATE_CNT, MAX_ROUND, seed=1, method='exact')
+
+    assert batch_result['total_rev'] == pytest.approx(macro_result['total_rev'], rel=0.03)
+    assert batch_result['total_correct'] == pytest.approx(macro_result['total_correct'], rel=0.03)
+    assert batch_result['remaining_budget'] == pytest.approx(macro_result['remaining_budget'], abs=0.02 * BUDGET)
+    for batch_round_result, round_result in zip(batch_result['rounds'], macro_result['rounds']):
+        assert batch_round_result['round_rev'] == pytest.approx(round_result['round_rev'], \
+                                                                abs=0.03 * macro_result['total_rev'])
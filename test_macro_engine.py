@@ -0,0 +1,36 @@
+import numpy as np
+
+from conftest import gen_random_tasks
+from micro_optimization import THRESHOLD, gen_max_reachable_confidences, get_level_max_assign_cnts
+from micro_greedy import micro_greedy
+from task_table import gen_task_table
+from macro_engine import keepup_policy, gen_macro_result, add_macro_result, average_macro_result, macro_simulate
+
+
+MAX_ASSIGN_CNT = 2
+
+
+def test_dropped_tasks_recorded(levels_dict):
+    tasks, tasks_answer_dict = gen_random_tasks(np.random.default_rng(0), 100)
+    max_reachable_confidences = gen_max_reachable_confidences([task['pre-answer']['confidence'] for task in tasks], \
+        get_level_max_assign_cnts(tasks, levels_dict), levels_dict, MAX_ASSIGN_CNT)
+    hopeless_ids = set([task['id'] for task, max_reachable_confidence in zip(tasks, max_reachable_confidences) \
+                        if max_reachable_confidence < THRESHOLD - 1e-9])
+    assert len(hopeless_ids) > 0
+
+    macro_result = gen_macro_result(3)
+    for seed in range(2):
+        simulate_result = macro_simulate(micro_greedy, keepup_policy(), gen_task_table(tasks, levels_dict), levels_dict, \
+                                         tasks_answer_dict, MAX_ASSIGN_CNT, 200, 3, rng=np.random.default_rng(seed))
+        first_round = simulate_result['rounds'][0]
+        assert set(first_round['dropped_tasks'].keys()) == hopeless_ids
+        assert first_round['round_dropped'] == len(hopeless_ids)
+        for round_result in simulate_result['rounds']:
+            assert len(round_result['dropped_tasks']) == round_result['round_dropped']
+            for drop_reasons in round_result['dropped_tasks'].values():
+                assert drop_reasons[0].startswith("max reachable confidence")
+        add_macro_result(macro_result, simulate_result)
+
+    average_macro_result(macro_result, 2)
+    assert macro_result['rounds'][0]['round_dropped'] == len(hopeless_ids)
+    assert all([len(drop_reasons) == 2 for drop_reasons in macro_result['rounds'][0]['dropped_tasks'].values()])
@@ -0,0 +1,25 @@
+import numpy as np
+
+from conftest import gen_random_tasks_results, get_chosen_cost, get_chosen_expected_revenue
+from micro_bnb import mckp_bnb
+from micro_mckp import mckp_dp
+
+
+def test_bnb_optimal(small_instances):
+    for tasks_results, budget, opt in small_instances:
+        chosen_results, upper_bound = mckp_bnb(tasks_results, budget, time_limit=None)
+        assert get_chosen_cost(chosen_results) <= budget
+        assert abs(get_chosen_expected_revenue(chosen_results) - opt) <= 1e-6 * max(opt, 1)
+        assert upper_bound >= opt - 1e-9
+
+def test_bnb_core_optimal():
+    rng = np.random.default_rng(1)
+    for budget in [50, 500, 2000]:
+        tasks_results = gen_random_tasks_results(rng, 300, max_result_cnt=6, max_cost=40)
+        opt = float(np.max(mckp_dp(tasks_results, budget, record_choices=False)[0]))
+        chosen_results, upper_bound = mckp_bnb(tasks_results, budget, time_limit=None)
+        expected_revenue = get_chosen_expected_revenue(chosen_results)
+        assert get_chosen_cost(chosen_results) <= budget
+        assert expected_revenue >= opt - 1e-6 * opt
+        assert upper_bound >= opt - 1e-9
+        assert upper_bound - expected_revenue <= 1e-6 * upper_bound + 1e-9
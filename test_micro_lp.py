@@ -0,0 +1,28 @@
+import numpy as np
+import pytest
+
+from conftest import gen_random_tasks_results, get_chosen_cost, get_chosen_expected_revenue
+from micro_mckp import mckp_dp
+from micro_lp import mckp_lp, mckp_lp_bound
+
+
+def test_lp_bounds(small_instances):
+    for tasks_results, budget, best_expected_revenue in small_instances:
+        chosen_results, upper_bound = mckp_lp(tasks_results, budget)
+        expected_revenue = get_chosen_expected_revenue(chosen_results)
+        assert get_chosen_cost(chosen_results) <= budget
+        assert upper_bound >= best_expected_revenue - 1e-9
+        assert expected_revenue >= best_expected_revenue / 2 - 1e-9
+
+        lower_bound, upper_bound = mckp_lp_bound(tasks_results, budget)
+        assert lower_bound == pytest.approx(expected_revenue)
+        assert lower_bound <= best_expected_revenue + 1e-9 <= upper_bound + 2e-9
+
+def test_lp_bound_large():
+    rng = np.random.default_rng(3)
+    for _ in range(3):
+        tasks_results = gen_random_tasks_results(rng, 200)
+        budget = int(rng.integers(100, 800))
+        best_expected_revenue = mckp_dp(tasks_results, budget, record_choices=False)[0][-1]
+        lower_bound, upper_bound = mckp_lp_bound(tasks_results, budget)
+        assert lower_bound <= best_expected_revenue + 1e-9 <= upper_bound + 2e-9
@@ -0,0 +1,101 @@
+import copy
+import numpy as np
+import pytest
+
+import micro_mckp
+from conftest import gen_random_tasks_results, get_chosen_cost, get_chosen_expected_revenue
+from micro_mckp import mckp_dp, mckp_backtrack, mckp_linear, mckp_fptas, mckp_frontier, mckp_curve, \
+    mckp_curve_results
+
+
+EPSILONS = [0.5, 0.2, 0.05]
+
+
+def gen_large_instances():
+    """
+    暴力解不了，用 mckp_dp 算最佳解的 (tasks_results, budget, 最佳解) 。
+    """
+    rng = np.random.default_rng(2)
+    instances = list()
+    for _ in range(3):
+        tasks_results = gen_random_tasks_results(rng, 100)
+        budget = int(rng.integers(100, 400))
+        instances.append((tasks_results, budget, float(mckp_dp(tasks_results, budget, record_choices=False)[0][-1])))
+    return instances
+
+def scale_costs(tasks_results, cost_unit):
+    scaled_tasks_results = copy.deepcopy(tasks_results)
+    for results in scaled_tasks_results:
+        for result in results:
+            result['cost'] *= cost_unit
+    return scaled_tasks_results
+
+def test_dp_optimal(small_instances):
+    for tasks_results, budget, best_expected_revenue in small_instances:
+        budget_expected_revenue, budget_choices = mckp_dp(tasks_results, budget)
+        assert budget_expected_revenue[-1] == pytest.approx(best_expected_revenue)
+
+        chosen_results = mckp_backtrack(tasks_results, budget_choices, budget)
+        assert get_chosen_cost(chosen_results) <= budget
+        assert get_chosen_expected_revenue(chosen_results) == pytest.approx(best_expected_revenue)
+
+def test_dp_cost_unit_optimal(small_instances):
+    cost_unit = 3
+    for tasks_results, budget, best_expected_revenue in small_instances:
+        tasks_results = scale_costs(tasks_results, cost_unit)
+        budget = budget * cost_unit + cost_unit - 1
+        budget_expected_revenue, budget_choices = mckp_dp(tasks_results, budget, cost_unit)
+        assert budget_expected_revenue[-1] == pytest.approx(best_expected_revenue)
+
+        chosen_results = mckp_backtrack(tasks_results, budget_choices, budget // cost_unit, cost_unit)
+        assert get_chosen_cost(chosen_results) <= budget
+        assert get_chosen_expected_revenue(chosen_results) == pytest.approx(best_expected_revenue)
+
+def test_curve_optimal(small_instances):
+    for tasks_results, budget, best_expected_revenue in small_instances:
+        curve = mckp_curve(tasks_results, budget)
+        chosen_results = mckp_curve_results(curve, budget)
+        assert get_chosen_cost(chosen_results) <= budget
+        assert get_chosen_expected_revenue(chosen_results) == pytest.approx(best_expected_revenue)
+
+def test_linear_optimal(small_instances, monkeypatch):
+    monkeypatch.setattr(micro_mckp, 'LINEAR_DP_BASE_TASK_CNT', 1)
+    for tasks_results, budget, best_expected_revenue in small_instances:
+        chosen_results, expected_revenue = mckp_linear(tasks_results, budget)
+        assert expected_revenue == pytest.approx(best_expected_revenue)
+        assert get_chosen_cost(chosen_results) <= budget
+        assert get_chosen_expected_revenue(chosen_results) == pytest.approx(best_expected_revenue)
+
+def test_linear_same_as_dp():
+    rng = np.random.default_rng(1)
+    tasks_results = gen_random_tasks_results(rng, 300)
+    budget = 700
+    chosen_results, expected_revenue = mckp_linear(tasks_results, budget)
+    assert get_chosen_cost(chosen_results) <= budget
+    assert get_chosen_expected_revenue(chosen_results) == pytest.approx(expected_revenue)
+    assert expected_revenue == pytest.approx(mckp_dp(tasks_results, budget, record_choices=False)[0][-1])
+
+def test_fptas_approximation(small_instances):
+    for tasks_results, budget, best_expected_revenue in small_instances + gen_large_instances():
+        for epsilon in EPSILONS:
+            chosen_results, upper_bound = mckp_fptas(tasks_results, budget, epsilon)
+            expected_revenue = get_chosen_expected_revenue(chosen_results)
+            assert get_chosen_cost(chosen_results) <= budget
+            assert expected_revenue >= (1 - epsilon) * best_expected_revenue - 1e-9
+            assert upper_bound >= best_expected_revenue - 1e-9
+
+def test_frontier_optimal(small_instances):
+    for tasks_results, budget, best_expected_revenue in small_instances + gen_large_instances():
+        chosen_results, expected_revenue = mckp_frontier(tasks_results, budget)
+        assert expected_revenue == pytest.approx(best_expected_revenue)
+        assert get_chosen_cost(chosen_results) <= budget
+        assert get_chosen_expected_revenue(chosen_results) == pytest.approx(best_expected_revenue)
+
+def test_frontier_approximation(small_instances):
+    for tasks_results, budget, best_expected_revenue in small_instances + gen_large_instances():
+        for epsilon in EPSILONS:
+            chosen_results, upper_bound = mckp_frontier(tasks_results, budget, epsilon)
+            expected_revenue = get_chosen_expected_revenue(chosen_results)
+            assert get_chosen_cost(chosen_results) <= budget
+            assert expected_revenue >= (1 - epsilon) * best_expected_revenue - 1e-9
+            assert upper_bound >= best_expected_revenue - 1e-9
@@ -0,0 +1,43 @@
+import copy
+import numpy as np
+
+from conftest import gen_random_tasks
+from micro_optimization import gen_difficulties, get_level_max_assign_cnts, gen_tasks_results, \
+    order_results_by_expected_revenue, gen_lazy_table, lazy_best_results
+from micro_cp import micro_cp
+from micro_greedy import micro_greedy
+
+
+MAX_ASSIGN_CNT = 6
+
+
+def test_lazy_best_results_same_as_order(levels_dict):
+    tasks, _ = gen_random_tasks(np.random.default_rng(0), 200)
+    budget = 30
+    tasks_results = gen_tasks_results(tasks, levels_dict, MAX_ASSIGN_CNT, method='exact', rng=np.random.default_rng(1))
+
+    pre_confidences = [task['pre-answer']['confidence'] for task in tasks]
+    lazy_table = gen_lazy_table(pre_confidences, [task['revenue'] for task in tasks], \
+                                gen_difficulties(pre_confidences, np.random.default_rng(1)), levels_dict, \
+                                MAX_ASSIGN_CNT, get_level_max_assign_cnts(tasks, levels_dict))
+    best_results = lazy_best_results(lazy_table, np.arange(len(tasks)), budget, method='exact')
+
+    for results, best_result in zip(tasks_results, best_results):
+        order_results = [result for result in order_results_by_expected_revenue(results) \
+                         if result['cost'] <= budget and result['expected_revenue'] > 0]
+        if len(order_results) == 0:
+            assert best_result is None
+        else:
+            assert best_result['level_comb'] == order_results[0]['level_comb']
+    assert lazy_table['evaluated_cnt'] < sum([len(results) for results in \
+                                              gen_tasks_results(tasks, levels_dict, MAX_ASSIGN_CNT, prune=None)])
+
+def test_lazy_selection_same_as_order(levels_dict):
+    tasks, tasks_answer_dict = gen_random_tasks(np.random.default_rng(2), 300)
+    for alg in (micro_greedy, micro_cp):
+        outcomes = list()
+        for selection in ('order', 'lazy'):
+            result_tasks, outcome_dict = alg(copy.deepcopy(tasks), levels_dict, tasks_answer_dict, MAX_ASSIGN_CNT, 400, \
+                                             method='exact', selection=selection, rng=np.random.default_rng(3))
+            outcomes.append((outcome_dict, [task['pre-answer']['confidence'] for task in result_tasks]))
+        assert outcomes[0] == outcomes[1]
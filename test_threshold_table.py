@@ -0,0 +1,31 @@
+import json
+import numpy as np
+
+import micro_optimization
+from micro_optimization import gen_true_ratios, gte_threshold_probs_exact, gte_threshold_probs_table
+from threshold_table import EXACT_CELL_TOLERANCE, build_threshold_table, save_threshold_table, use_threshold_table
+
+
+LEVELS_DICT = {"level1": {"quality": 0.7, "cost": 2}, "level2": {"quality": 0.9, "cost": 6}}
+MAX_ASSIGN_CNT = 4
+
+
+def test_table_close_to_exact(tmp_path):
+    file_path = str(tmp_path / "threshold_table.npy")
+    threshold_table = build_threshold_table(LEVELS_DICT, MAX_ASSIGN_CNT, 51, 26)
+    error = save_threshold_table(threshold_table, LEVELS_DICT, MAX_ASSIGN_CNT, file_path)
+    assert error['max_error'] <= EXACT_CELL_TOLERANCE
+    assert error['max_interpolation_error'] > EXACT_CELL_TOLERANCE
+    with open(str(tmp_path / "threshold_table.json"), "r") as myfile:
+        assert json.load(myfile)['error'] == error
+
+    assert use_threshold_table(file_path, LEVELS_DICT, MAX_ASSIGN_CNT) == 'table'
+    assert micro_optimization.MICRO_METHOD == 'exact'
+
+    rng = np.random.default_rng(0)
+    pre_confidences = rng.random(2000)
+    difficulties = rng.random(2000)
+    exact_probs = gte_threshold_probs_exact(pre_confidences, gen_true_ratios(difficulties, LEVELS_DICT), \
+                                            LEVELS_DICT, MAX_ASSIGN_CNT)
+    table_probs = gte_threshold_probs_table(pre_confidences, difficulties, LEVELS_DICT, MAX_ASSIGN_CNT)
+    assert np.abs(exact_probs - table_probs).max() < 2 * EXACT_CELL_TOLERANCE
@@ -0,0 +1,196 @@
+import os
+import sys
+import json
+import numpy as np
+from pprint import pprint
+
+import micro_optimization
+from micro_optimization import get_level_names, gen_level_comb_table, \
+    gen_true_ratios, gte_threshold_probs_exact, register_threshold_table, interpolate_threshold_table
+
+PRE_CONFIDENCE_GRID_CNT = 201
+DIFFICULTY_GRID_CNT = 101
+# 內插誤差超過這個值的格子查表時改用 gte_threshold_probs_exact
+EXACT_CELL_TOLERANCE = 0.01
+# 檢查內插誤差時，每一格在 pre-confidence 方向取幾個點
+CHECK_POINT_CNT = 3
+
+
+def gen_threshold_table_meta(levels_dict, max_assign_cnt, pre_confidence_grid_cnt, difficulty_grid_cnt):
+    """
+    threshold table 的設定，跟表一起存起來，讀取時用來確認這張表可以用。
+
+    Args:
+        levels_dict (dict): worker 的等級，以及 quality ，可以參考 Exp-Data/levels.json
+        max_assign_cnt (int): 最多能指派多少 worker
+        pre_confidence_grid_cnt (int): pre-confidence 切成幾格
+        difficulty_grid_cnt (int): difficulty 切成幾格
+
+    Return:
+        dict: 表的設定
+    """
+    return {
+        "levels": [
+            {
+                "name": level_name,
+                "quality": levels_dict[level_name]['quality'],
+                "cost": levels_dict[level_name]['cost']
+            }
+            for level_name in get_level_names(levels_dict)
+        ],
+        "max_assign_cnt": max_assign_cnt,
+        "alpha": micro_optimization.ALPHA,
+        "threshold": micro_optimization.THRESHOLD,
+        "pre_confidence_grid_cnt": pre_confidence_grid_cnt,
+        "difficulty_grid_cnt": difficulty_grid_cnt
+    }
+
+def build_threshold_table(levels_dict, max_assign_cnt, \
+                          pre_confidence_grid_cnt=PRE_CONFIDENCE_GRID_CNT, difficulty_grid_cnt=DIFFICULTY_GRID_CNT):
+    """
+    把 pre-confidence 跟 difficulty 在 0 ~ 1 之間平均切格，用 gte_threshold_probs_exact 算出每一格、
+    每一種 worker 組合 (順序跟 gen_level_comb_table 相同) 的 confidence 大於等於 THRESHOLD 的機率。
+
+    Args:
+        levels_dict (dict): worker 的等級，以及 quality ，可以參考 Exp-Data/levels.json
+        max_assign_cnt (int): 最多能指派多少 worker
+        pre_confidence_grid_cnt (int): pre-confidence 切成幾格
+        difficulty_grid_cnt (int): difficulty 切成幾格
+
+    Return:
+        numpy.ndarray: (pre_confidence_grid_cnt, difficulty_grid_cnt, 組合數) 的機率表
+    """
+    level_combs, _ = gen_level_comb_table(levels_dict, max_assign_cnt)
+    pre_confidence_grid, difficulty_grid = np.meshgrid(np.linspace(0, 1, pre_confidence_grid_cnt), \
+                                                       np.linspace(0, 1, difficulty_grid_cnt), indexing='ij')
+    gte_threshold_probs = gte_threshold_probs_exact(pre_confidence_grid.ravel(), \
+                                                    gen_true_ratios(difficulty_grid.ravel(), levels_dict), \
+                                                    levels_dict, max_assign_cnt)
+    return gte_threshold_probs.reshape(pre_confidence_grid_cnt, difficulty_grid_cnt, len(level_combs))
+
+def check_threshold_table(threshold_table, levels_dict, max_assign_cnt, tolerance=EXACT_CELL_TOLERANCE):
+    """
+    找出內插不準的格子。每個組合的 confidence 只跟 pre-confidence 以及回答 true 的人數有關，
+    所以機率在 pre-confidence 方向是階梯函數 (某個回答結果剛好跨過 THRESHOLD 的地方會跳一階)，
+    difficulty 只會平滑地改變每個回答結果的機率。跨過一個大階梯的格子，內插的誤差可以接近整個階梯的高度。
+    每一格在 pre-confidence 方向取 CHECK_POINT_CNT 個點 (difficulty 取中間) ，跟 gte_threshold_probs_exact 比較，
+    任何一個組合的誤差超過 tolerance 的格子之後改用 gte_threshold_probs_exact 。
+
+    Args:
+        threshold_table (numpy.ndarray): build_threshold_table 的結果
+        levels_dict (dict): worker 的等級，以及 quality ，可以參考 Exp-Data/levels.json
+        max_assign_cnt (int): 最多能指派多少 worker
+        tolerance (float): 可以接受的內插誤差
+
+    Return:
+        exact_cells (numpy.ndarray): (pre-confidence 格數 - 1, difficulty 格數 - 1) 的 bool 陣列，要改用精確計算的格子
+        error (dict): 檢查點上量到的誤差， max_interpolation_error 是全部用內插時最大的誤差，
+            max_error 是不準的格子改用精確計算後最大的誤差， exact_cell_ratio 是要改用精確計算的格子比例
+    """
+    pre_confidence_cell_cnt = threshold_table.shape[0] - 1
+    difficulty_cell_cnt = threshold_table.shape[1] - 1
+    cell_errors = np.zeros((pre_confidence_cell_cnt, difficulty_cell_cnt))
+    difficulty_points = (np.arange(difficulty_cell_cnt) + 0.5) / difficulty_cell_cnt
+    for point_index in range(CHECK_POINT_CNT):
+        pre_confidence_points = (np.arange(pre_confidence_cell_cnt) + (point_index + 1) / (CHECK_POINT_CNT + 1)) / \
+            pre_confidence_cell_cnt
+        pre_confidence_grid, difficulty_grid = np.meshgrid(pre_confidence_points, difficulty_points, indexing='ij')
+        exact_probs = gte_threshold_probs_exact(pre_confidence_grid.ravel(), \
+                                                gen_true_ratios(difficulty_grid.ravel(), levels_dict), \
+                                                levels_dict, max_assign_cnt)
+        table_probs = interpolate_threshold_table(threshold_table, pre_confidence_grid.ravel(), difficulty_grid.ravel())
+        point_errors = np.abs(exact_probs - table_probs).max(axis=1).reshape(cell_errors.shape)
+        cell_errors = np.maximum(cell_errors, point_errors)
+
+    exact_cells = cell_errors > tolerance
+    error = {
+        "tolerance": tolerance,
+        "max_interpolation_error": float(cell_errors.max()),
+        "max_error": float(np.where(exact_cells, 0, cell_errors).max()),
+        "exact_cell_ratio": float(exact_cells.mean())
+    }
+    return exact_cells, error
+
+def get_exact_cells_path(file_path):
+    """
+    check_threshold_table 的 exact_cells 跟表存在一起的路徑。
+    """
+    return os.path.splitext(file_path)[0] + "_exact_cells.npy"
+
+def save_threshold_table(threshold_table, levels_dict, max_assign_cnt, file_path):
+    """
+    把表存成 file_path (.npy) ，用 check_threshold_table 找出的 exact_cells 存在 get_exact_cells_path ，
+    設定跟量到的誤差 (error) 存在同名的 .json 。
+
+    Args:
+        threshold_table (numpy.ndarray): build_threshold_table 的結果
+        levels_dict (dict): worker 的等級，以及 quality ，可以參考 Exp-Data/levels.json
+        max_assign_cnt (int): 最多能指派多少 worker
+        file_path (str): 要存的 .npy 檔路徑
+
+    Return:
+        dict: check_threshold_table 量到的誤差
+    """
+    exact_cells, error = check_threshold_table(threshold_table, levels_dict, max_assign_cnt)
+    np.save(file_path, threshold_table)
+    np.save(get_exact_cells_path(file_path), exact_cells)
+    meta = gen_threshold_table_meta(levels_dict, max_assign_cnt, threshold_table.shape[0], threshold_table.shape[1])
+    meta['error'] = error
+    with open(os.path.splitext(file_path)[0] + ".json", "w") as fd:
+        json.dump(meta, fd, indent=4)
+    return error
+
+def load_threshold_table(file_path, levels_dict, max_assign_cnt):
+    """
+    用 memory map 讀取 save_threshold_table 存的表跟 exact_cells ，確認設定相同後用 register_threshold_table 登記。
+    表只會被讀取，所以多個 process 讀同一個檔案時會共用 page cache ，
+    用 Pool 時只要在建立 Pool 之前讀取，子 process 也能直接使用。
+
+    Args:
+        file_path (str): .npy 檔路徑
+        levels_dict (dict): worker 的等級，以及 quality ，可以參考 Exp-Data/levels.json
+        max_assign_cnt (int): 最多能指派多少 worker
+
+    Return:
+        numpy.ndarray: 唯讀的機率表
+    """
+    threshold_table = np.load(file_path, mmap_mode='r')
+    exact_cells = np.load(get_exact_cells_path(file_path), mmap_mode='r')
+    with open(os.path.splitext(file_path)[0] + ".json", "r") as myfile:
+        meta = json.load(myfile)
+    meta.pop('error', None)
+
+    expected_meta = gen_threshold_table_meta(levels_dict, max_assign_cnt, \
+                                             threshold_table.shape[0], threshold_table.shape[1])
+    if meta != expected_meta:
+        raise ValueError("threshold table %s was built for %s, not %s" % (file_path, meta, expected_meta))
+
+    register_threshold_table(levels_dict, max_assign_cnt, threshold_table, exact_cells)
+    return threshold_table
+
+def use_threshold_table(file_path, levels_dict, max_assign_cnt):
+    """
+    讀取並登記表，回傳要傳給 micro 演算法的 method 。不會改 MICRO_METHOD ，
+    只有明確用 method='table' 的呼叫才會查表。
+
+    Args:
+        file_path (str): .npy 檔路徑
+        levels_dict (dict): worker 的等級，以及 quality ，可以參考 Exp-Data/levels.json
+        max_assign_cnt (int): 最多能指派多少 worker
+
+    Return:
+        str: 'table'
+    """
+    load_threshold_table(file_path, levels_dict, max_assign_cnt)
+    return 'table'
+
+if __name__ == '__main__':
+    worker_file_path = sys.argv[1]
+    max_assign_cnt = int(sys.argv[2])
+    dest_file_path = sys.argv[3]
+
+    with open(worker_file_path, "r") as myfile:
+        levels_dict = json.load(myfile)
+
+    threshold_table = build_threshold_table(levels_dict, max_assign_cnt)
+    pprint(save_threshold_table(threshold_table, levels_dict, max_assign_cnt, dest_file_path))